@@ -0,0 +1,275 @@
+import asyncio
+import logging
+import os
+from quart import Blueprint, abort, current_app, jsonify, make_response, render_template, request
+from bson import errors
+from pymongo.errors import PyMongoError
+from api.common import (
+    TEST_CATEGORIES, batch_request, home_page_etag, parse_image_urls, preferences_document,
+    profile_city, rating_document, ratings_request, search_city, search_request, selection_city,
+    selection_page_etag, selection_request, string_ids, top_restaurants_args, update_selection_request
+)
+from api.metrics_routes import LOCAL_ADDRESSES
+from database.connection import db_connection
+from database.repositories.async_restaurant_repository import async_restaurant_repository
+from database.repositories.async_user_repository import async_user_repository
+from services.async_recommendation_service import async_recommendation_engine
+from services.async_restaurant_service import async_restaurant_service
+from services.async_user_service import async_user_service
+from services.recommendation_service import REC_FIELD
+from utils.http_cache import conditional_get, not_modified
+from utils.metrics import metrics
+from utils.render_cache import page_response
+from utils.search_index import search_backend
+
+async_bp = Blueprint('async_bp', __name__)
+logger = logging.getLogger(__name__)
+
+"""
+Async views of the API for the ASGI app (see async_app).
+
+Serves the same endpoints, with the same parameters and responses, as user_routes,
+restaurant_routes, recommendations and metrics_routes, with the same request handling
+(api.common), awaiting MongoDB on the async client so a worker serves other requests while its queries are in flight. Independent
+queries of a request run concurrently, e.g. /api/test_recommendations fetches the user's
+profile and preferences together, then fetches its 4 picks while it saves the
+recommendations.
+
+Usage:
+Register the async_bp blueprint in the Quart app.
+"""
+
+@async_bp.route('/api/submit_selection', methods=['POST'])
+async def submit_selection():
+    """
+    Submit the selected restaurants for a user and create a user profile.
+
+    Returns:
+        Response: JSON with status and user profile or error message.
+    """
+    user_id, selected_restaurants = selection_request(await request.get_json(silent=True))
+
+    try:
+        user_preferences = await async_user_repository.get_user_preferences(user_id)
+    except errors.InvalidId:
+        return jsonify({'error': 'Invalid user ID format'}), 400
+    except Exception as e:
+        return jsonify({'error': f'Preferences retrieval error: {e}'}), 400
+    city = selection_city(user_preferences)
+
+    try:
+        profile = await async_user_service.submit_selection(user_id, selected_restaurants, city)
+        return jsonify({"status": "success", "user_profile": profile}), 200
+    except Exception as e:
+        logger.error("Error saving selection or creating profile: %s", e)
+        return jsonify({"error": "Failed to save selection"}), 500
+
+@async_bp.route('/api/update_selection', methods=['POST'])
+async def update_selection():
+    """
+    Add restaurants to or remove restaurants from a user's selection, updating the profile incrementally.
+
+    Returns:
+        Response: JSON with status and the number of changed selections, or error message.
+    """
+    user_id, add, remove = update_selection_request(await request.get_json(silent=True))
+
+    try:
+        user = await async_user_repository.get_user(user_id, {"profile.city": 1})
+    except errors.InvalidId:
+        return jsonify({'error': 'Invalid user ID format'}), 400
+    city = profile_city(user)
+
+    try:
+        changed = await async_user_service.update_selection(user_id, city, add, remove)
+    except Exception as e:
+        logger.error("Error updating selection: %s", e)
+        return jsonify({"error": "Failed to update selection"}), 500
+    return jsonify({"status": "success", "changed": changed}), 200
+
+@async_bp.route('/api/submit', methods=['POST'])
+async def submit_preferences():
+    """
+    Submit user preferences and create a new user.
+
+    Returns:
+        Response: JSON with status and user ID or error message.
+    """
+    user_data = preferences_document(await request.get_json(silent=True))
+    result = await async_user_repository.save_user_preferences(user_data)
+    return jsonify({'status': 'success', 'user_id': str(result.inserted_id)}), 200
+
+@async_bp.route('/api/restaurant_selection/<user_id>')
+async def restaurant_selection(user_id):
+    """
+    Render the restaurant selection page for a user based on their preferences.
+
+    The offered restaurants are stored while the page is rendered.
+
+    Args:
+        user_id (str): The user ID from the database.
+
+    Returns:
+        Response: Rendered HTML template with top restaurant recommendations, or a 304 if
+        the page the client has is current (see restaurant_routes).
+    """
+    try:
+        user_preferences = await async_user_repository.get_user_preferences(user_id)
+    except errors.InvalidId:
+        return jsonify({'error': 'Invalid user ID format'}), 400
+
+    if not user_preferences:
+        return jsonify({'error': 'User preferences not found'}), 404
+
+    city = selection_city(user_preferences)
+    # The offered restaurants of a current page were already selected and stored when it was rendered
+    versions = await asyncio.gather(
+        async_restaurant_repository.data_version(city), async_restaurant_repository.combinations_version(city)
+    )
+    etag = selection_page_etag(current_app.jinja_env, user_id, city, tuple(versions), user_preferences)
+    matched = not_modified(request, etag)
+    if matched is not None:
+        return page_response(current_app.response_class(status=304), matched)
+
+    top_restaurants = await async_restaurant_service.get_top_restaurants(city, *top_restaurants_args(user_preferences))
+    # The offered restaurants are stored as they were fetched, before the image lists are parsed.
+    # The write is scheduled right away and awaited on every way out, so it is never dropped.
+    offered = asyncio.ensure_future(async_user_repository.add_offered_restaurants(
+        user_id, user_preferences.get("nickname"), [dict(restaurant) for restaurant in top_restaurants]
+    ))
+    try:
+        string_ids(top_restaurants)
+        parse_image_urls(top_restaurants, lambda urls: [urls])
+        page = await render_template('restaurant_selection.html', restaurants=top_restaurants, user_id=user_id, city=city)
+    finally:
+        await offered
+    return page_response(await make_response(page), etag)
+
+@async_bp.route('/api/home/<user_id>')
+async def home(user_id):
+    """
+    Render the home page for a user.
+
+    Args:
+        user_id (str): The user ID from the database.
+
+    Returns:
+        Response: Rendered HTML template with user data or error message, or a 304 if the
+        page the client has is current (see restaurant_routes).
+    """
+    try:
+        user_data = await async_user_repository.get_user(user_id)
+    except errors.InvalidId:
+        return "Invalid user ID", 400
+
+    if not user_data:
+        return "User not found", 404
+
+    version = await async_restaurant_repository.data_version(user_data.get("profile", {}).get("city"))
+    etag = home_page_etag(current_app.jinja_env, version, user_data)
+    matched = not_modified(request, etag)
+    if matched is not None:
+        return page_response(current_app.response_class(status=304), matched)
+
+    # The precomputed recommendations are stored as restaurant IDs and scores
+    user_data[REC_FIELD] = await async_recommendation_engine.saved_recommendations(user_data)
+    page = await render_template('home.html', user_data=user_data)
+    return page_response(await make_response(page), etag)
+
+@async_bp.route('/api/search', methods=['GET'])
+@conditional_get(lambda args: async_restaurant_repository.data_version(search_city(args)), extra=search_backend)
+async def search_restaurants():
+    """
+    Search for restaurants by name and city, for search-as-you-type.
+
+    Responses carry an ETag; a repeated search is answered with a 304 (see utils.http_cache).
+
+    Query parameters: `q` (the typed text), `city` (defaults to Rome) and `limit`
+    (defaults to 10, at most MAX_SEARCH_RESULTS).
+
+    Returns:
+        Response: JSON list of matching restaurants, best match first, or an error message.
+    """
+    query, city, limit = search_request(request.args)
+    try:
+        restaurants = await async_restaurant_service.search(city, query, limit)
+    except ValueError as ve:
+        return jsonify({'error': str(ve)}), 404
+    return jsonify(restaurants)
+
+@async_bp.route('/api/test_recommendations/<user_id>', methods=['GET'])
+async def test_recommendations(user_id):
+    """
+    Generate the 4 test restaurants and render the test page.
+    """
+    try:
+        matching_restaurants = await async_recommendation_engine.test_restaurants(user_id)
+        if matching_restaurants is None:
+            return jsonify({'error': 'User profile not found'}), 404
+
+        # The restaurants were sanitized when they were fetched
+        parse_image_urls(matching_restaurants, lambda urls: [])
+        return await render_template(
+            'rating_page.html',
+            restaurants=matching_restaurants,
+            categories=TEST_CATEGORIES,
+            user_id=user_id
+        )
+    except errors.InvalidId:
+        return jsonify({'error': 'Invalid user ID format'}), 400
+    except ValueError as ve:
+        return jsonify({'error': str(ve)}), 400
+    except Exception as e:
+        logger.exception("Error generating test recommendations: %s", e)
+        return jsonify({'error': 'An unexpected error occurred'}), 500
+
+@async_bp.route('/api/recommendations/batch', methods=['POST'])
+async def batch_recommendations():
+    """
+    Recommend restaurants for many users in one call.
+
+    Expects a JSON body {"user_ids": [...], "k": 4, "save": false}.
+
+    Returns:
+        Response: JSON with the recommendations per user ID and the user IDs that could not
+        be scored, or an error message.
+    """
+    user_ids, k, save = batch_request(await request.get_json(silent=True))
+    try:
+        recommendations, missing = await async_recommendation_engine.recommend_many(user_ids, k, save=save)
+    except (errors.InvalidId, TypeError):
+        return jsonify({'error': 'Invalid user ID format'}), 400
+    except PyMongoError as e:
+        logger.error("Error generating batch recommendations: %s", e)
+        return jsonify({'error': 'An unexpected error occurred'}), 500
+    return jsonify({'recommendations': recommendations, 'missing': missing})
+
+@async_bp.route('/api/submit_ratings', methods=['POST'])
+async def submit_ratings():
+    """
+    Store the user's ratings of their test restaurants.
+
+    Returns:
+        Response: JSON with status or error message.
+    """
+    user_id, rankings = ratings_request(await request.get_json(silent=True))
+    user = await async_user_repository.get_user(user_id, {"profile.city": 1})
+    await async_user_repository.add_rating(rating_document(user_id, rankings, user))
+    return jsonify({'status': 'success'})
+
+@async_bp.route('/metrics', methods=['GET'])
+async def get_metrics():
+    """
+    Return the metrics recorded since startup, or since the last reset (see metrics_routes).
+
+    Returns:
+        Response: JSON with 'routes', 'timers', 'mongo' and 'pool' sections.
+    """
+    if request.remote_addr not in LOCAL_ADDRESSES and os.getenv('METRICS_PUBLIC') != '1':
+        abort(404)
+    snapshot = metrics.snapshot()
+    # Pool gauges describe the current state, so they are not cleared by a reset
+    snapshot['pool'] = db_connection.pool_stats()
+    if request.args.get('reset') == '1':
+        metrics.reset()
+    return jsonify(snapshot)
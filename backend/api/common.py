@@ -0,0 +1,377 @@
+from datetime import datetime, timezone
+import bson
+from config.cities import city_config
+from utils.literal_parser import parse_list
+from utils.render_cache import page_etag, template_version
+
+"""
+Request handling shared by the Flask views (user_routes, restaurant_routes, recommendations)
+and the async views of the ASGI app (async_routes).
+
+Validates request bodies and query parameters, builds the documents and service arguments
+the views pass on, and shapes their results, so both apps answer the same requests the same
+way and only differ in how they await MongoDB. Invalid requests raise RequestError, which
+both apps answer with a JSON {"error": message} and its status code.
+
+Usage:
+    app.register_error_handler(RequestError, request_error_response)
+    user_id, selected_restaurants = selection_request(request.get_json(silent=True))
+"""
+
+# Maximum number of restaurants per search
+MAX_SEARCH_RESULTS = 50
+
+# Maximum number of users per batch recommendation request
+MAX_BATCH_SIZE = 1000
+
+# Categories of the test page picks (see RecommendationEngine.pick_test_rows)
+TEST_CATEGORIES = ["our_recommendation", "our_recommendation", "random", "high_rated"]
+
+class RequestError(Exception):
+    """
+    An invalid request, answered with a JSON error message and a 4xx status code.
+    """
+    def __init__(self, message, status=400):
+        """
+        Args:
+            message (str): The error message returned to the client.
+            status (int): The HTTP status code.
+        """
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+def request_error_response(error):
+    """
+    Answer a RequestError; registered as an error handler by both apps.
+
+    Args:
+        error (RequestError): The error.
+
+    Returns:
+        tuple: (JSON body, status code), serialized by the app's JSON provider.
+    """
+    return {'error': error.message}, error.status
+
+def _preferences_city_name(preferences):
+    city = preferences.get('city')
+    if isinstance(city, list):
+        city = city[0] if city else None
+    return city.strip() if isinstance(city, str) else None
+
+def preferences_city(preferences):
+    """
+    Return the city a user's preferences apply to.
+
+    Args:
+        preferences (dict): The user's preference document.
+
+    Returns:
+        str or None: The registered city name (see CityConfig.normalize), or None if it is
+        missing or unknown.
+    """
+    return city_config.normalize(_preferences_city_name(preferences))
+
+def preferences_document(data):
+    """
+    Build the preference document of a new user from the submitted form.
+
+    Args:
+        data (dict or None): The JSON body.
+
+    Returns:
+        dict: The preference document to store.
+
+    Raises:
+        RequestError: If the body is missing.
+    """
+    if not data:
+        raise RequestError('Invalid or missing JSON data')
+    return {
+        'nickname': data.get('nickname', ''),
+        'city': data.get('city', ''),
+        'dietary_preferences': [data.get('dietary')] if data.get('dietary') and data.get('dietary') != 'None' else [],
+        'cuisine_preferences': data.get('cuisines', []),
+        'price_range': data.get('price', []),
+        'dining_priority': {item: i + 1 for i, item in enumerate(data.get('priorities', []))},
+        'restaurant_type': data.get('restaurantType', []),
+        'wifi': ['Wifi'] if data.get('wifiRequired') is True else []
+    }
+
+def top_restaurants_args(preferences):
+    """
+    Return the get_top_restaurants arguments of a user's preferences.
+
+    Args:
+        preferences (dict): The user's preference document.
+
+    Returns:
+        tuple: (cuisine types, diets, features, rating priorities).
+    """
+    return (
+        preferences.get('cuisine_preferences', []),
+        preferences.get('dietary_preferences', []),
+        preferences.get('wifi', []),
+        preferences.get('dining_priority', {}),
+    )
+
+def selection_request(data):
+    """
+    Validate a /api/submit_selection body.
+
+    Args:
+        data (dict or None): The JSON body.
+
+    Returns:
+        tuple: (user_id, selected_restaurants).
+
+    Raises:
+        RequestError: If the user ID or the selection is missing.
+    """
+    data = data or {}
+    user_id = data.get('user_id')
+    selected_restaurants = data.get('selected_restaurants', [])
+    if not user_id or not selected_restaurants:
+        raise RequestError('Missing user ID or selected restaurants')
+    return user_id, selected_restaurants
+
+def selection_city(preferences):
+    """
+    Return the city of a user's preferences, for their selection page and profile.
+
+    Args:
+        preferences (dict or None): The user's preference document.
+
+    Returns:
+        str: The registered city name.
+
+    Raises:
+        RequestError: If the preferences or their city are missing (404 and 400), or the
+            city is unknown (404).
+    """
+    if not preferences:
+        raise RequestError('User preferences not found for city retrieval', 404)
+    name = _preferences_city_name(preferences)
+    if not name:
+        raise RequestError('City not found in user preferences')
+    city = city_config.normalize(name)
+    if city is None:
+        raise RequestError(f'No restaurants available for city: {name}', 404)
+    return city
+
+def update_selection_request(data):
+    """
+    Validate a /api/update_selection body.
+
+    Args:
+        data (dict or None): The JSON body.
+
+    Returns:
+        tuple: (user_id, add, remove).
+
+    Raises:
+        RequestError: If the user ID is missing or there is nothing to add or remove.
+    """
+    data = data or {}
+    user_id = data.get('user_id')
+    add = data.get('add', [])
+    remove = data.get('remove', [])
+    if not user_id or not isinstance(add, list) or not isinstance(remove, list) or not (add or remove):
+        raise RequestError('Missing user ID or restaurants to add or remove')
+    return user_id, add, remove
+
+def profile_city(user):
+    """
+    Return the city of a user's profile.
+
+    Args:
+        user (dict or None): The user document, with at least `profile.city`.
+
+    Returns:
+        str: The registered city name.
+
+    Raises:
+        RequestError: If the user or their profile is missing, or the profile's city is unknown.
+    """
+    city = city_config.normalize((user or {}).get('profile', {}).get('city'))
+    if city is None:
+        raise RequestError('User profile not found', 404)
+    return city
+
+def search_city(args):
+    """
+    Return the city of a search request.
+
+    Args:
+        args (MultiDict): The query parameters.
+
+    Returns:
+        str: The registered city name; Rome by default.
+
+    Raises:
+        RequestError: If the city is unknown (404).
+    """
+    name = args.get('city', 'Rome')
+    city = city_config.normalize(name)
+    if city is None:
+        raise RequestError(f'No restaurants available for city: {name}', 404)
+    return city
+
+def search_request(args):
+    """
+    Validate the query parameters of a /api/search request.
+
+    Args:
+        args (MultiDict): The query parameters `q`, `city` and `limit`.
+
+    Returns:
+        tuple: (query, city, limit), the limit capped at MAX_SEARCH_RESULTS.
+
+    Raises:
+        RequestError: If the limit is not positive or the city is unknown.
+    """
+    limit = args.get('limit', 10, type=int)
+    if limit <= 0:
+        raise RequestError('limit must be a positive integer')
+    return args.get('q', ''), search_city(args), min(limit, MAX_SEARCH_RESULTS)
+
+def batch_request(data):
+    """
+    Validate a /api/recommendations/batch body.
+
+    Args:
+        data (dict or None): The JSON body {"user_ids": [...], "k": 4, "save": false}.
+
+    Returns:
+        tuple: (user_ids, k, save).
+
+    Raises:
+        RequestError: If the user IDs are missing or too many, or k is not a positive integer.
+    """
+    data = data or {}
+    user_ids = data.get('user_ids')
+    k = data.get('k', 4)
+    if not isinstance(user_ids, list) or not user_ids:
+        raise RequestError('Missing user_ids')
+    if len(user_ids) > MAX_BATCH_SIZE:
+        raise RequestError(f'At most {MAX_BATCH_SIZE} user_ids per request')
+    if not isinstance(k, int) or k <= 0:
+        raise RequestError('k must be a positive integer')
+    return user_ids, k, bool(data.get('save'))
+
+def ratings_request(data):
+    """
+    Validate a /api/submit_ratings body.
+
+    Args:
+        data (dict or None): The JSON body.
+
+    Returns:
+        tuple: (user_id, rankings).
+
+    Raises:
+        RequestError: If the user ID or the rankings are missing.
+    """
+    data = data or {}
+    user_id = data.get('user_id')
+    rankings = data.get('rankings')
+    if not user_id or not rankings:
+        raise RequestError('Missing user_id or rankings')
+    return user_id, rankings
+
+def rating_document(user_id, rankings, user):
+    """
+    Build the stored ratings of a user, with the city and time the evaluation breaks them down by.
+
+    Args:
+        user_id (str): The user ID.
+        rankings: The submitted rankings.
+        user (dict or None): The user document, with at least `profile.city`.
+
+    Returns:
+        dict: The rating document.
+
+    Raises:
+        RequestError: If the user is not found.
+    """
+    if not user:
+        raise RequestError('User not found', 404)
+    return {
+        "user_id": user_id,
+        "rated_restaurants": rankings,
+        "city": user.get("profile", {}).get("city"),
+        "created_at": datetime.now(timezone.utc)
+    }
+
+def parse_image_urls(restaurants, fallback):
+    """
+    Parse the stringified `image_urls` lists of restaurants in place.
+
+    Args:
+        restaurants (list): Restaurant documents.
+        fallback (callable): Called with a value that cannot be parsed; returns the list to use.
+
+    Returns:
+        list: The restaurants.
+    """
+    for restaurant in restaurants:
+        if isinstance(restaurant.get('image_urls'), str):
+            try:
+                restaurant['image_urls'] = parse_list(restaurant['image_urls'])
+            except ValueError:
+                restaurant['image_urls'] = fallback(restaurant['image_urls'])
+    return restaurants
+
+def string_ids(restaurants):
+    """
+    Convert the `_id` of restaurant documents to strings in place.
+
+    Args:
+        restaurants (list): Restaurant documents.
+
+    Returns:
+        list: The restaurants.
+    """
+    for restaurant in restaurants:
+        if '_id' in restaurant:
+            restaurant['_id'] = str(restaurant['_id'])
+    return restaurants
+
+def selection_page_etag(env, user_id, city, versions, preferences):
+    """
+    Build the ETag of a restaurant selection page (see utils.render_cache).
+
+    The offered restaurants are selected deterministically from the user's preferences and
+    the city's restaurants and combinations, so the ETag is built from those before they are
+    selected.
+
+    Args:
+        env (Environment): The app's Jinja environment.
+        user_id (str): The user ID.
+        city (str): The city.
+        versions (tuple): The city's restaurant and combinations data versions.
+        preferences (dict): The user's preference document.
+
+    Returns:
+        str: The ETag value.
+    """
+    return page_etag(
+        template_version(env, 'restaurant_selection.html'), user_id, city, versions, bson.encode(preferences)
+    )
+
+def home_page_etag(env, version, user):
+    """
+    Build the ETag of a home page (see utils.render_cache).
+
+    The page is rendered from the user document and the saved recommendations' restaurants,
+    so it is current if neither changed.
+
+    Args:
+        env (Environment): The app's Jinja environment.
+        version (int or None): The data version of the user's city.
+        user (dict): The user document.
+
+    Returns:
+        str: The ETag value.
+    """
+    return page_etag(template_version(env, 'home.html'), version, bson.encode(user))
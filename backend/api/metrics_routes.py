@@ -0,0 +1,39 @@
+import os
+from flask import Blueprint, abort, jsonify, request
+from database.connection import db_connection
+from utils.metrics import metrics
+
+metrics_bp = Blueprint('metrics_bp', __name__)
+
+"""
+API route exposing the in-process request metrics.
+
+Key Endpoints:
+- /metrics: Per-route latency histograms and MongoDB counters, timed sections,
+  MongoDB commands and connection pool utilization (see utils.metrics). Only served
+  to local clients unless METRICS_PUBLIC=1.
+
+Usage:
+Register the metrics_bp blueprint in your Flask app.
+"""
+
+LOCAL_ADDRESSES = ('127.0.0.1', '::1')
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Return the metrics recorded since startup, or since the last reset.
+
+    Query parameters: `reset=1` clears the metrics after reading them.
+
+    Returns:
+        Response: JSON with 'routes', 'timers', 'mongo' and 'pool' sections.
+    """
+    if request.remote_addr not in LOCAL_ADDRESSES and os.getenv('METRICS_PUBLIC') != '1':
+        abort(404)
+    snapshot = metrics.snapshot()
+    # Pool gauges describe the current state, so they are not cleared by a reset
+    snapshot['pool'] = db_connection.pool_stats()
+    if request.args.get('reset') == '1':
+        metrics.reset()
+    return jsonify(snapshot)
@@ -1,8 +1,17 @@
-from flask import Blueprint, jsonify, render_template
-from bson import ObjectId, errors
+from flask import Blueprint, current_app, jsonify, make_response, render_template, request
+from bson import errors
+from api.common import (
+    home_page_etag, parse_image_urls, search_city, search_request, selection_city, selection_page_etag,
+    string_ids, top_restaurants_args
+)
+from database.repositories.restaurant_repository import restaurant_repository
 from services.restaurant_service import restaurant_service
+from services.recommendation_service import recommendation_engine, REC_FIELD
+from services.search_service import search_service
 from database.repositories.user_repository import user_repository
-import ast
+from utils.http_cache import conditional_get, not_modified
+from utils.render_cache import page_response
+from utils.search_index import search_backend
 
 restaurant_bp = Blueprint('restaurant_bp', __name__)
 
@@ -14,6 +23,8 @@ Key Endpoints:
 - /api/home/<user_id>: Render home page for a user.
 - /api/search: Search for restaurants by name and city.
 
+The two pages answer If-None-Match with a 304 before doing any work (see utils.render_cache).
+
 Usage:
 Register the restaurant_bp blueprint in your Flask app.
 """
@@ -27,7 +38,8 @@ def restaurant_selection(user_id):
         user_id (str): The user ID from the database.
 
     Returns:
-        Response: Rendered HTML template with top restaurant recommendations.
+        Response: Rendered HTML template with top restaurant recommendations, or a 304 if
+        the page the client has is current.
     """
     try:
         user_preferences = user_repository.get_user_preferences(user_id)
@@ -37,30 +49,20 @@ def restaurant_selection(user_id):
     if not user_preferences:
         return jsonify({'error': 'User preferences not found'}), 404
 
-    city = user_preferences.get('city', '')
-    if isinstance(city, list):
-        city = city[0].strip()
-    city = city.capitalize()
-    
-    top_restaurants = restaurant_service.get_top_restaurants(
-        city,
-        user_preferences.get('cuisine_preferences', []),
-        user_preferences.get('dietary_preferences', []),
-        user_preferences.get('wifi', []),
-        user_preferences.get('dining_priority', {})
-    )
+    city = selection_city(user_preferences)
+    # The offered restaurants of a current page were already selected and stored when it was rendered
+    versions = (restaurant_repository.data_version(city), restaurant_repository.combinations_version(city))
+    etag = selection_page_etag(current_app.jinja_env, user_id, city, versions, user_preferences)
+    matched = not_modified(request, etag)
+    if matched is not None:
+        return page_response(current_app.response_class(status=304), matched)
 
+    top_restaurants = restaurant_service.get_top_restaurants(city, *top_restaurants_args(user_preferences))
     user_repository.add_offered_restaurants(user_id, user_preferences.get("nickname"), top_restaurants)
-
-    for restaurant in top_restaurants:
-        if '_id' in restaurant:
-            restaurant['_id'] = str(restaurant['_id'])
-        if 'image_urls' in restaurant and isinstance(restaurant['image_urls'], str):
-            try:
-                restaurant['image_urls'] = ast.literal_eval(restaurant['image_urls'])
-            except (SyntaxError, ValueError, TypeError):
-                restaurant['image_urls'] = [restaurant['image_urls']]
-    return render_template('restaurant_selection.html', restaurants=top_restaurants, user_id=user_id, city=city)
+    string_ids(top_restaurants)
+    parse_image_urls(top_restaurants, lambda urls: [urls])
+    page = render_template('restaurant_selection.html', restaurants=top_restaurants, user_id=user_id, city=city)
+    return page_response(make_response(page), etag)
 
 @restaurant_bp.route('/api/home/<user_id>')
 def home(user_id):
@@ -71,43 +73,46 @@ def home(user_id):
         user_id (str): The user ID from the database.
 
     Returns:
-        Response: Rendered HTML template with user data or error message.
+        Response: Rendered HTML template with user data or error message, or a 304 if the
+        page the client has is current.
     """
-    # This route needs to be refactored to use services and repositories
-    # For now, I'm moving it as is
     try:
-        user_object_id = ObjectId(user_id)
+        user_data = user_repository.get_user(user_id)
     except errors.InvalidId:
         return "Invalid user ID", 400
 
-    user_data = user_repository.users_collection.find_one({"_id": user_object_id})
-
     if not user_data:
         return "User not found", 404
 
-    return render_template('home.html', user_data=user_data)
+    version = restaurant_repository.data_version(user_data.get("profile", {}).get("city"))
+    etag = home_page_etag(current_app.jinja_env, version, user_data)
+    matched = not_modified(request, etag)
+    if matched is not None:
+        return page_response(current_app.response_class(status=304), matched)
+
+    # The precomputed recommendations are stored as restaurant IDs and scores
+    user_data[REC_FIELD] = recommendation_engine.saved_recommendations(user_data)
+    page = render_template('home.html', user_data=user_data)
+    return page_response(make_response(page), etag)
 
 @restaurant_bp.route('/api/search', methods=['GET'])
+@conditional_get(lambda args: restaurant_repository.data_version(search_city(args)), extra=search_backend)
 def search_restaurants():
     """
-    Search for restaurants by name and city.
+    Search for restaurants by name and city, for search-as-you-type.
+
+    Results only change with the city's data, so responses carry an ETag and a repeated
+    search is answered with a 304 without querying MongoDB (see utils.http_cache).
+
+    Query parameters: `q` (the typed text), `city` (defaults to Rome) and `limit`
+    (defaults to 10, at most MAX_SEARCH_RESULTS).
 
     Returns:
-        Response: JSON list of matching restaurants.
+        Response: JSON list of matching restaurants, best match first, or an error message.
     """
-    # This route needs to be refactored to use services and repositories
-    # For now, I'm moving it as is
-    query = request.args.get('q', '')
-    city = request.args.get('city', 'Rome').capitalize()
-    
-    restaurants_collection = db.get_collection(f"{city.lower()}_restaurants")
-    
-    restaurants = list(restaurants_collection.find(
-        {"restaurant_name": {"$regex": query, "$options": "i"}},
-        limit=10
-    ))
-    
-    for r in restaurants:
-        r['_id'] = str(r['_id'])
-
-    return jsonify(restaurants) 
\ No newline at end of file
+    query, city, limit = search_request(request.args)
+    try:
+        restaurants = search_service.search(city, query, limit)
+    except ValueError as ve:
+        return jsonify({'error': str(ve)}), 404
+    return jsonify(restaurants)
@@ -6,9 +6,22 @@ Initializes the app, database, and registers all API blueprints.
 Usage:
     python app.py
 """
+import logging
+import os
 from flask import Flask
 from flask_cors import CORS
 from database.connection import db_connection
+from database.indexes import ensure_indexes
+from utils.positive_feedback import materialize_all
+from utils.ingest import ingest_command
+from utils.snapshot import snapshot_command
+from utils.precompute_recommendations import precompute_command
+from utils.calculate_results import evaluate_command
+from utils.http_cache import init_compression
+from utils.json_provider import FastJSONProvider
+from utils.metrics import init_metrics
+from api.common import RequestError, request_error_response
+from api.metrics_routes import metrics_bp
 from api.user_routes import user_bp
 from api.restaurant_routes import restaurant_bp
 from recommendations import recommendations_bp, init_recommendations
@@ -20,19 +33,50 @@ def create_app():
     Returns:
         Flask: The configured Flask app instance.
     """
+    # Debug output is only logged with LOG_LEVEL=DEBUG
+    logging.basicConfig(
+        level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+        format='%(asctime)s %(levelname)s %(name)s: %(message)s'
+    )
+
     app = Flask(__name__)
     CORS(app)
 
+    # Per-route latency histograms and MongoDB counters, served at /metrics
+    init_metrics(app)
+
+    # Encode ObjectId, NaN, NumPy and datetime values in a single pass when serializing responses
+    app.json = FastJSONProvider(app)
+
+    # Compress large JSON and HTML responses for clients that accept brotli or gzip
+    init_compression(app)
+
     # Initialize database
     db = db_connection.get_db()
 
+    # Create the indexes backing the server-side preference filters
+    ensure_indexes(db)
+
+    # Parse review pairs once into positive_count for restaurants that don't have it yet
+    materialize_all(db)
+
     # Initialize recommendations blueprint
     init_recommendations(db)
 
+    # Invalid requests are answered with a JSON error message (see api.common)
+    app.register_error_handler(RequestError, request_error_response)
+
     # Register blueprints
     app.register_blueprint(user_bp)
     app.register_blueprint(restaurant_bp)
     app.register_blueprint(recommendations_bp)
+    app.register_blueprint(metrics_bp)
+
+    # CLI commands (flask ingest, flask snapshot, flask precompute, flask evaluate)
+    app.cli.add_command(ingest_command)
+    app.cli.add_command(snapshot_command)
+    app.cli.add_command(precompute_command)
+    app.cli.add_command(evaluate_command)
 
     return app
 
@@ -0,0 +1,83 @@
+"""
+ASGI application entry point for the restaurant recommendation system.
+
+Serves the same endpoints as app.create_app with async views (api.async_routes) on Quart and
+pymongo's AsyncMongoClient, so each worker process serves many concurrent requests while
+their MongoDB queries are in flight, instead of one request per blocked thread. Scoring,
+sampling and name search still use the in-process feature stores and indexes, which are
+loaded at startup as in the Flask app.
+
+Requires Quart 0.19 or later and pymongo 4.9 or later. The CLI commands stay on the Flask app.
+
+Usage:
+    hypercorn "async_app:create_async_app()"
+    uvicorn --factory async_app:create_async_app
+    python async_app.py
+"""
+import logging
+import os
+from quart import Quart, request
+from database.async_connection import async_db_connection
+from database.connection import db_connection
+from database.indexes import ensure_indexes
+from utils.positive_feedback import materialize_all
+from utils.http_cache import init_async_compression
+from utils.json_provider import FastJSONProvider
+from utils.metrics import init_async_metrics
+from api.async_routes import async_bp
+from api.common import RequestError, request_error_response
+from recommendations import init_recommendations
+
+def create_async_app():
+    """
+    Create and configure the Quart application.
+
+    Returns:
+        Quart: The configured Quart app instance.
+    """
+    # Debug output is only logged with LOG_LEVEL=DEBUG
+    logging.basicConfig(
+        level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+        format='%(asctime)s %(levelname)s %(name)s: %(message)s'
+    )
+
+    app = Quart(__name__)
+
+    @app.after_request
+    async def allow_cross_origin(response):
+        # Same policy as CORS(app) in the Flask app: any origin, answering preflight requests
+        response.headers.setdefault('Access-Control-Allow-Origin', '*')
+        if request.method == 'OPTIONS':
+            response.headers.setdefault('Access-Control-Allow-Methods', ', '.join(sorted(response.allow)))
+            if 'Access-Control-Request-Headers' in request.headers:
+                response.headers.setdefault('Access-Control-Allow-Headers', request.headers['Access-Control-Request-Headers'])
+        return response
+
+    # Per-route latency histograms and MongoDB counters, served at /metrics
+    init_async_metrics(app)
+
+    # Encode ObjectId, NaN, NumPy and datetime values in a single pass when serializing responses
+    app.json = FastJSONProvider(app)
+
+    # Compress large JSON and HTML responses for clients that accept brotli or gzip
+    init_async_compression(app)
+
+    # The startup work runs once on the blocking client, before requests are served
+    db = db_connection.get_db()
+    ensure_indexes(db)
+    materialize_all(db)
+    init_recommendations(db)
+
+    # Invalid requests are answered with a JSON error message (see api.common)
+    app.register_error_handler(RequestError, request_error_response)
+    app.register_blueprint(async_bp)
+
+    @app.after_serving
+    async def close_database():
+        await async_db_connection.close()
+
+    return app
+
+if __name__ == '__main__':
+    app = create_async_app()
+    app.run(debug=True)
@@ -0,0 +1,340 @@
+"""
+End-to-end benchmark of the recommendation backend against a local MongoDB stand-in.
+
+Seeds an in-memory mongomock database (or a scratch database on a real server with
+--mongodb-uri) with each city's restaurants and clustering combinations from the shipped
+spreadsheets, grown to --scale restaurants per city by copying real restaurants with
+jittered ratings, creates --users users per city through the API routes, and then times:
+
+- filter_restaurants_by_preferences(user_id)
+- get_positive_restaurants(10, city)
+- select_top_restaurants(...) with the combination cache cleared before each call (cold)
+  and kept (warm)
+- user_service.create_user_profile(user_id, selected, city)
+- GET /api/test_recommendations/<user_id> through the Flask test client
+
+For every operation and city it reports p50/p95/p99 latency over --iterations calls, then
+the peak and retained Python allocations per call measured with tracemalloc over
+--alloc-iterations further calls. Results are written as JSON together with the commit
+and the run parameters, and --compare prints the latency ratios against an earlier result
+file. mongomock latencies include its own document copying, so only compare results
+obtained with the same backend.
+
+Usage:
+    python -m benchmarks.bench_backend [--city rome] [--scale 10000] [--users 20] [--iterations 200]
+                                       [--output results.json] [--compare baseline.json]
+                                       [--mongodb-uri mongodb://localhost:27017/]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+
+# Used when the application templates are not available, so the rendering cost stays comparable
+FALLBACK_TEMPLATES = {
+    "rating_page.html": (
+        "{% for restaurant in restaurants %}<div class=\"card {{ categories[loop.index0] }}\">"
+        "<h3>{{ restaurant.restaurant_name }}</h3><p>{{ restaurant.location }}</p>"
+        "{% for url in restaurant.image_urls or [] %}<img src=\"{{ url }}\">{% endfor %}</div>{% endfor %}"
+    ),
+}
+
+def connect(mongodb_uri):
+    """
+    Point the application at the benchmark database. Must run before the app modules are imported.
+
+    Args:
+        mongodb_uri (str or None): Server to use, or None for an in-memory mongomock database.
+
+    Returns:
+        tuple: (client, database, backend name).
+    """
+    from database.connection import db_connection
+    if mongodb_uri:
+        from pymongo import MongoClient
+        from utils.metrics import query_listener
+        client = MongoClient(mongodb_uri, event_listeners=[query_listener])
+        name, backend = f"bench_{os.getpid()}", "mongodb"
+    else:
+        try:
+            import mongomock
+        except ImportError:
+            sys.exit("mongomock is not installed: pip install mongomock, or pass --mongodb-uri")
+        client = mongomock.MongoClient()
+        name, backend = "restaurant_db", "mongomock"
+    db_connection.use_client(client, name)
+    return client, client[name], backend
+
+def scale_rows(rows, count, rng):
+    """
+    Take or grow a city's restaurants to `count` rows.
+
+    Copies get a numbered name and link and ratings jittered by N(0, 0.05), so they are
+    distinct restaurants to the filters, the search index and the feature store.
+    """
+    if count <= len(rows):
+        return [dict(row) for row in rows[:count]]
+    scaled = []
+    for i in range(count):
+        row = dict(rows[i % len(rows)])
+        copy = i // len(rows)
+        if copy:
+            row["restaurant_name"] = f"{row.get('restaurant_name') or ''} {copy}"
+            row["restaurant_link"] = f"{row.get('restaurant_link') or ''}?copy={copy}"
+            for column in row:
+                if column.endswith("_rating_norm") and isinstance(row[column], float):
+                    row[column] = float(np.clip(row[column] + rng.normal(0, 0.05), 0, 1))
+        scaled.append(row)
+    return scaled
+
+def seed_city(db, city, scale, rng, batch_size=5000):
+    """
+    Load a city's restaurants and combinations into the benchmark database.
+
+    Returns:
+        list: The combination documents.
+    """
+    from utils.ingest import SOURCES, coerce_row, iter_rows
+    paths = {kind: os.path.join(BACKEND_DIR, source["path"].format(city=city)) for kind, source in SOURCES.items()}
+    restaurants = scale_rows([coerce_row(row) for row in iter_rows(paths["restaurants"])], scale, rng)
+    combinations = [coerce_row(row) for row in iter_rows(paths["combinations"])]
+    for kind, documents in (("restaurants", restaurants), ("combinations", combinations)):
+        collection = db[SOURCES[kind]["collection"](city)]
+        for start in range(0, len(documents), batch_size):
+            collection.insert_many(documents[start:start + batch_size])
+    return combinations
+
+def combination_choices(combination):
+    """
+    Convert a stored combination key back into the user choices that produce it.
+
+    Returns:
+        tuple: (types, diets, features, ranking) as passed to select_top_restaurants.
+    """
+    from utils.literal_parser import parse_literal
+    key = parse_literal(combination["combination"])
+    types = key["types"].split(", ")
+    diets = [] if key["diets"] == "None" else key["diets"].split(", ")
+    features = [] if key["features"] == "None" else ["Wifi" if f == "Free Wifi" else f for f in key["features"].split(", ")]
+    ranking = {name: int(rank) for name, rank in (item.split(":") for item in key["ranking"].split(","))}
+    return types, diets, features, ranking
+
+def create_users(client, city, combinations, count, rng):
+    """
+    Create users of a city through the API routes, with preferences taken from stored combinations.
+
+    Returns:
+        list: Per user, a dict with its id, selected restaurant ids and combination choices.
+    """
+    from config.cities import city_config
+    from recommendations import filter_restaurants_by_preferences
+    users = []
+    for index in rng.choice(len(combinations), size=count, replace=len(combinations) < count):
+        types, diets, features, ranking = combination_choices(combinations[index])
+        response = client.post("/api/submit", json={
+            "nickname": f"bench-{len(users)}",
+            "city": city_config.normalize(city),
+            "cuisines": types,
+            "dietary": diets[0] if diets else "None",
+            "priorities": sorted(ranking, key=ranking.get),
+            "wifiRequired": "Wifi" in features,
+        })
+        user_id = response.get_json()["user_id"]
+        candidates = [r["_id"] for r in filter_restaurants_by_preferences(user_id, fields=["_id"])]
+        selected = [str(r) for r in rng.choice(candidates, size=min(3, len(candidates)), replace=False)]
+        client.post("/api/submit_selection", json={"user_id": user_id, "selected_restaurants": selected})
+        users.append({"id": user_id, "selected": selected, "choices": (types, diets, features, ranking)})
+    return users
+
+def measure(call, iterations, warmup, alloc_iterations):
+    """
+    Time a call and measure its allocations.
+
+    Args:
+        call (Callable[[int], Any]): The operation, given the iteration number.
+        iterations (int): Timed calls.
+        warmup (int): Untimed calls made first.
+        alloc_iterations (int): Further calls made under tracemalloc.
+
+    Returns:
+        dict: Latency percentiles and mean in milliseconds, calls per second, and mean peak
+        and retained allocations per call in KiB.
+    """
+    for i in range(warmup):
+        call(i)
+    samples = np.empty(iterations)
+    for i in range(iterations):
+        start = time.perf_counter()
+        call(i)
+        samples[i] = time.perf_counter() - start
+
+    peaks, retained = [], []
+    tracemalloc.start()
+    for i in range(alloc_iterations):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        call(i)
+        current, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+        retained.append(current - before)
+    tracemalloc.stop()
+
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99]) * 1e3
+    return {
+        "iterations": iterations,
+        "p50_ms": round(p50, 4),
+        "p95_ms": round(p95, 4),
+        "p99_ms": round(p99, 4),
+        "mean_ms": round(samples.mean() * 1e3, 4),
+        "ops_per_s": round(iterations / samples.sum(), 1),
+        "alloc_peak_kib": round(np.mean(peaks) / 1024, 1) if peaks else None,
+        "alloc_retained_kib": round(np.mean(retained) / 1024, 1) if retained else None,
+    }
+
+def operations(client, city, users):
+    """
+    Build the benchmarked operations of a city.
+
+    Returns:
+        dict: Operation name to a callable taking the iteration number.
+    """
+    from bson import ObjectId
+    from config.cities import city_config
+    from recommendations import filter_restaurants_by_preferences, get_positive_restaurants
+    from services.user_service import user_service
+    from utils.clustering import invalidate_combination_cache, select_top_restaurants
+    city_name = city_config.normalize(city)
+
+    def user(i):
+        return users[i % len(users)]
+
+    def select_top_cold(i):
+        invalidate_combination_cache(city_name)
+        return select_top_restaurants(city_name, *user(i)["choices"])
+
+    def test_recommendations(i):
+        response = client.get(f"/api/test_recommendations/{user(i)['id']}")
+        if response.status_code != 200:
+            raise RuntimeError(f"test_recommendations returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        return response
+
+    return {
+        "filter_restaurants_by_preferences": lambda i: filter_restaurants_by_preferences(user(i)["id"]),
+        "get_positive_restaurants": lambda i: get_positive_restaurants(10, city_name),
+        "select_top_restaurants (cold)": select_top_cold,
+        "select_top_restaurants (warm)": lambda i: select_top_restaurants(city_name, *user(i)["choices"]),
+        "create_user_profile": lambda i: user_service.create_user_profile(
+            ObjectId(user(i)["id"]), user(i)["selected"], city_name
+        ),
+        "GET /api/test_recommendations": test_recommendations,
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline_path):
+    """
+    Print the latency ratios of the results to an earlier result file (below 1 is faster).
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nCompared to {baseline_path} (commit {baseline['meta'].get('commit')}):")
+    for key in ("backend", "scale", "users"):
+        if baseline["meta"].get(key) != results["meta"][key]:
+            print(f"  warning: {key} differs ({baseline['meta'].get(key)} vs {results['meta'][key]})")
+    for city, ops in results["results"].items():
+        for name, result in ops.items():
+            before = baseline["results"].get(city, {}).get(name)
+            if before:
+                print(f"  {city:<8}{name:<36}p50 x{result['p50_ms'] / before['p50_ms']:.2f}  "
+                      f"p95 x{result['p95_ms'] / before['p95_ms']:.2f}  p99 x{result['p99_ms'] / before['p99_ms']:.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--city", action="append", help="City to benchmark (repeatable). Defaults to rome.")
+    parser.add_argument("--scale", type=int, default=1000, help="Restaurants per city, e.g. 1000, 10000, 100000.")
+    parser.add_argument("--users", type=int, default=20, help="Users created per city.")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--alloc-iterations", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Result file. Defaults to benchmarks/results/bench_backend-<time>-<commit>.json.")
+    parser.add_argument("--compare", help="Earlier result file to compare against.")
+    parser.add_argument("--mongodb-uri", help="Use a scratch database on this server instead of mongomock.")
+    args = parser.parse_args()
+
+    # Keep feature snapshots and debug output of the benchmark out of the way
+    os.environ.setdefault("SNAPSHOT_DIR", tempfile.mkdtemp(prefix="bench_snapshots_"))
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    mongo_client, db, backend = connect(args.mongodb_uri)
+    rng = np.random.default_rng(args.seed)
+    cities = [city.lower() for city in args.city or ["rome"]]
+    from config.cities import city_config
+    unknown = [city for city in cities if city_config.normalize(city) is None]
+    if unknown:
+        parser.error(f"unknown city: {', '.join(unknown)} (see CITIES)")
+
+    try:
+        seed_start = time.perf_counter()
+        combinations = {city: seed_city(db, city, args.scale, rng) for city in cities}
+
+        from jinja2 import ChoiceLoader, DictLoader
+        from app import create_app
+        app = create_app()
+        app.jinja_env.loader = ChoiceLoader([app.jinja_env.loader, DictLoader(FALLBACK_TEMPLATES)])
+        client = app.test_client()
+        users = {city: create_users(client, city, combinations[city], args.users, rng) for city in cities}
+        print(f"Seeded {', '.join(cities)} with {args.scale} restaurants and {args.users} users each "
+              f"({backend}) in {time.perf_counter() - seed_start:.1f}s")
+
+        results = {
+            "meta": {
+                "commit": git_commit(),
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "backend": backend,
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "platform": platform.platform(),
+                **{key: value for key, value in vars(args).items() if key not in ("output", "compare", "mongodb_uri")},
+            },
+            "results": {},
+        }
+        for city in cities:
+            results["results"][city] = {}
+            for name, call in operations(client, city, users[city]).items():
+                # Warm up with every user, so the warm cache and query plans cover all of them
+                result = measure(call, args.iterations, max(args.warmup, len(users[city])), args.alloc_iterations)
+                results["results"][city][name] = result
+                print(f"  {city:<8}{name:<36}p50 {result['p50_ms']:9.3f} ms  p95 {result['p95_ms']:9.3f} ms  "
+                      f"p99 {result['p99_ms']:9.3f} ms  peak {result['alloc_peak_kib']:9.1f} KiB")
+    finally:
+        if backend == "mongodb":
+            mongo_client.drop_database(db.name)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"bench_backend-{datetime.now():%Y%m%d-%H%M%S}-{results['meta']['commit'] or 'nogit'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
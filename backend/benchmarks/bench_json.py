@@ -0,0 +1,67 @@
+"""
+Throughput benchmark of JSON responses of restaurant documents.
+
+Loads a city's restaurants from the FeatureExtraction spreadsheet as `flask ingest` stores
+them, with ObjectId `_id`s as they have when fetched from MongoDB, and times building the
+JSON response of the list through the previous path (sanitize_data, then Flask's default
+provider) and through FastJSONProvider with each installed backend. It reports the median
+time and the encoded bytes per second.
+
+Usage:
+    python -m benchmarks.bench_json [--city rome] [--limit 1000] [--repeat 20]
+"""
+import argparse
+import os
+import time
+import numpy as np
+from bson import ObjectId
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from utils import json_provider
+from utils.data_sanitizer import sanitize_data
+from utils.ingest import BACKEND_DIR, SOURCES, coerce_row, iter_rows
+from utils.json_provider import FastJSONProvider
+
+def load_documents(city, limit):
+    """
+    Read a city's restaurants as MongoDB-like documents.
+    """
+    path = os.path.join(BACKEND_DIR, SOURCES["restaurants"]["path"].format(city=city))
+    documents = [{**coerce_row(row), "_id": ObjectId()} for row in iter_rows(path)]
+    return documents[:limit] if limit else documents
+
+def measure(label, encode, repeat):
+    """
+    Print the median time and throughput of an encoding function.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = encode()
+        timings.append(time.perf_counter() - start)
+    median = np.median(timings)
+    print(f"  {label:<28}{median * 1e3:8.2f} ms  {len(body) / median / 1e6:8.1f} MB/s  ({len(body)} bytes)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--city", default="rome")
+    parser.add_argument("--limit", type=int, default=0, help="Documents per response. Defaults to all.")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    documents = load_documents(args.city.lower(), args.limit)
+    print(f"{args.city}: {len(documents)} restaurants")
+
+    default_provider = DefaultJSONProvider(app)
+    measure("sanitize_data + jsonify", lambda: default_provider.response(sanitize_data(documents)).get_data(), args.repeat)
+
+    backends = ["json"] + [name for name, module in (("simplejson", json_provider.simplejson),
+                                                     ("orjson", json_provider.orjson)) if module is not None]
+    for backend in backends:
+        provider = FastJSONProvider(app)
+        provider.backend = backend
+        measure(f"FastJSONProvider[{backend}]", lambda: provider.response(documents).get_data(), args.repeat)
+
+if __name__ == "__main__":
+    main()
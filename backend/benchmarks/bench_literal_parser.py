@@ -0,0 +1,129 @@
+"""
+Microbenchmark for utils.literal_parser against the previous parsing paths.
+
+Loads the `top_pairs_total` and `image_urls` columns from the real
+`*_with_reviews_pairs.xlsx` spreadsheets and times, per parse:
+
+- legacy: the old sanitize_top_pairs chain of str.replace passes followed by eval,
+- literal_eval: ast.literal_eval, as used by get_positive_restaurants and clustering,
+- parser (cold): utils.literal_parser with an empty cache,
+- parser (warm): utils.literal_parser over CACHE_SIZE values that are all already cached.
+
+It also checks that the parser agrees with ast.literal_eval wherever the latter succeeds.
+
+Usage:
+    python -m benchmarks.bench_literal_parser [--repeat N]
+"""
+import argparse
+import ast
+import glob
+import os
+import time
+import openpyxl
+from utils.literal_parser import CACHE_SIZE, parse_literal, clear_cache
+
+DATA_GLOB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         "data", "data from WebScrap", "*", "*_with_reviews_pairs.xlsx")
+COLUMNS = ("top_pairs_total", "image_urls")
+
+def load_columns():
+    """
+    Read the string values of the benchmarked columns from every city spreadsheet.
+
+    Returns:
+        dict: Mapping of column name to a list of string values.
+    """
+    values = {column: [] for column in COLUMNS}
+    for path in sorted(glob.glob(DATA_GLOB)):
+        workbook = openpyxl.load_workbook(path, read_only=True)
+        rows = workbook.active.iter_rows(values_only=True)
+        header = list(next(rows))
+        indexes = {column: header.index(column) for column in COLUMNS}
+        for row in rows:
+            for column, index in indexes.items():
+                if isinstance(row[index], str):
+                    values[column].append(row[index])
+        workbook.close()
+    return values
+
+def legacy_parse(text):
+    """
+    Parse review pairs the way the old sanitize_top_pairs did.
+    """
+    sanitized_string = text \
+        .replace("None", "null") \
+        .replace("none", "null") \
+        .replace("'", '"') \
+        .replace("(", "[") \
+        .replace(")", "]")
+    return eval(sanitized_string, {"null": None, "NaN": None, "none": None, "nan": None})
+
+def time_per_parse(parse, values, repeat, before_round=None):
+    """
+    Return the best average seconds per parse over `repeat` rounds, plus the failure count.
+    """
+    best = float("inf")
+    failures = 0
+    for _ in range(repeat):
+        if before_round:
+            before_round()
+        failures = 0
+        start = time.perf_counter()
+        for value in values:
+            try:
+                parse(value)
+            except Exception:
+                failures += 1
+        best = min(best, (time.perf_counter() - start) / len(values))
+    return best, failures
+
+def normalize(value):
+    """
+    Normalize parsed values for comparison (sequences as tuples, NaN as None).
+    """
+    if isinstance(value, (list, tuple)):
+        return tuple(normalize(item) for item in value)
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+def check_agreement(values):
+    """
+    Count the values where the parser disagrees with ast.literal_eval.
+    """
+    mismatches = 0
+    for value in values:
+        try:
+            expected = normalize(ast.literal_eval(value))
+        except (ValueError, SyntaxError):
+            continue
+        if normalize(parse_literal(value)) != expected:
+            mismatches += 1
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    columns = load_columns()
+    for column, values in columns.items():
+        print(f"{column}: {len(values)} values, {sum(map(len, values)) / max(len(values), 1):.0f} chars on average")
+        warm_values = values[:CACHE_SIZE]
+        paths = [
+            ("literal_eval", ast.literal_eval, values, None),
+            ("parser (cold)", parse_literal, values, clear_cache),
+            ("parser (warm)", parse_literal, warm_values, None),
+        ]
+        if column == "top_pairs_total":
+            paths.insert(0, ("legacy replace+eval", legacy_parse, values, None))
+        for name, parse, path_values, before_round in paths:
+            if path_values is warm_values:
+                for value in warm_values:
+                    parse_literal(value)
+            seconds, failures = time_per_parse(parse, path_values, args.repeat, before_round)
+            print(f"  {name:<22}{seconds * 1e6:10.1f} us/parse  {failures} failures")
+        print(f"  parser vs literal_eval mismatches: {check_agreement(values)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Recall and latency benchmark of the retrieval index backends against the exact path.
+
+Builds each city's feature store from the FeatureExtraction spreadsheets (optionally grown
+to --scale rows by jittering copies of the real restaurants, to model larger catalogs) and
+runs realistic queries: each user profile is the average of a few random restaurants, and
+half of the queries carry the cuisine preference filter of one of them. For every backend
+it reports build time, recall@k against ExactIndex and per-query p50/p95 latency, with and
+without the filter.
+
+Usage:
+    python -m benchmarks.bench_retrieval [--city rome] [--scale 100000] [--queries 200] [--k 4]
+"""
+import argparse
+import os
+import time
+import numpy as np
+from config.features import binary_float_columns
+from utils.feature_store import CityFeatureStore, normalize_rows
+from utils.ingest import BACKEND_DIR, CITIES, SOURCES, iter_rows
+from utils.preference_filter import FLAG_BITS, FLAG_FIELDS, match_rows
+from utils.retrieval_index import build_index
+
+CONFIGS = [
+    ("exact", {}),
+    ("lsh", {"n_bits": 8, "n_tables": 8}),
+    ("lsh", {"n_bits": 10, "n_tables": 24, "n_probes": 3}),
+    ("lsh", {"n_bits": 10, "n_tables": 24, "n_probes": 3, "filter_mode": "post"}),
+    ("ivf", {"n_probe": 8}),
+    ("ivf", {"n_probe": 24}),
+    ("ivf", {"n_probe": 24, "filter_mode": "post"}),
+]
+
+CUISINE_BITS = [FLAG_BITS[field] for field in FLAG_FIELDS if field not in
+                ("is_vegan_options", "is_vegetarian_friendly", "is_gluten_free_options", "is_free_wifi")]
+
+def load_store(city):
+    """
+    Build a city's feature store from its FeatureExtraction spreadsheet.
+    """
+    path = os.path.join(BACKEND_DIR, SOURCES["restaurants"]["path"].format(city=city))
+    documents = ({**row, "_id": index} for index, row in enumerate(iter_rows(path)))
+    return CityFeatureStore.from_documents(city, documents)
+
+def scale_up(store, rows, rng):
+    """
+    Grow a store's raw features and masks to `rows` rows by jittering copies of real restaurants.
+    """
+    source = rng.integers(len(store), size=rows)
+    features = store.matrix[source] + rng.normal(0, 0.05, size=(rows, store.matrix.shape[1])).astype(np.float32)
+    return normalize_rows(np.clip(features, 0, None)), store.masks[source]
+
+def make_queries(matrix, masks, count, rng):
+    """
+    Build query vectors (averages of 3-6 random restaurants) and preference filters.
+    """
+    queries = []
+    for i in range(count):
+        picks = rng.integers(matrix.shape[0], size=rng.integers(3, 7))
+        vector = normalize_rows(matrix[picks].mean(axis=0, keepdims=True))[0]
+        rows = None
+        if i % 2:
+            cuisine_bits = int(masks[picks[0]]) & sum(CUISINE_BITS) or int(rng.choice(CUISINE_BITS))
+            rows = match_rows(masks, cuisine_bits, 0)
+        queries.append((vector, rows))
+    return queries
+
+def run(matrix, queries, k):
+    """
+    Print build time, recall@k and latency percentiles of every backend configuration.
+    """
+    exact = build_index("exact", matrix)
+    truth = [set(exact.search(vector, k, rows)[0].tolist()) for vector, rows in queries]
+    for kind, params in CONFIGS:
+        start = time.perf_counter()
+        index = build_index(kind, matrix, **params)
+        build_seconds = time.perf_counter() - start
+        for label, filtered in (("unfiltered", False), ("filtered", True)):
+            recalls, latencies = [], []
+            for (vector, rows), expected in zip(queries, truth):
+                if (rows is not None) != filtered:
+                    continue
+                start = time.perf_counter()
+                found, _ = index.search(vector, k, rows)
+                latencies.append(time.perf_counter() - start)
+                recalls.append(len(expected & set(found.tolist())) / len(expected) if expected else 1.0)
+            name = kind + ("(" + ",".join(f"{key}={value}" for key, value in params.items()) + ")" if params else "")
+            print(f"  {name:<56}{label:<12}build {build_seconds * 1e3:8.1f} ms  recall@{k} {np.mean(recalls):.3f}  "
+                  f"p50 {np.percentile(latencies, 50) * 1e3:7.3f} ms  p95 {np.percentile(latencies, 95) * 1e3:7.3f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--city", action="append", help="City to benchmark (repeatable). Defaults to all.")
+    parser.add_argument("--scale", type=int, default=0, help="Grow each catalog to this many rows.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    for city in args.city or CITIES:
+        store = load_store(city.lower())
+        matrix, masks = store.matrix, store.masks
+        if args.scale:
+            matrix, masks = scale_up(store, args.scale, rng)
+        print(f"{city}: {matrix.shape[0]} restaurants x {len(binary_float_columns)} features")
+        run(matrix, make_queries(matrix, masks, args.queries, rng), args.k)
+
+if __name__ == "__main__":
+    main()
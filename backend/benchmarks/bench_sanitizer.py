@@ -0,0 +1,55 @@
+"""
+Throughput benchmark of sanitize_data on restaurant documents.
+
+Loads a city's restaurants from the FeatureExtraction spreadsheet, gives them ObjectId
+`_id`s as they have when fetched from MongoDB, and times sanitizing the whole list in
+copy mode, with the restaurant schema, and in place (on fresh copies, as callers sanitize
+freshly fetched documents).
+
+Usage:
+    python -m benchmarks.bench_sanitizer [--city rome] [--repeat 20]
+"""
+import argparse
+import copy
+import os
+import time
+import numpy as np
+from bson import ObjectId
+from utils.data_sanitizer import RESTAURANT_CLEAN_FIELDS, sanitize_data
+from utils.ingest import BACKEND_DIR, SOURCES, iter_rows
+
+def load_documents(city):
+    """
+    Read a city's restaurants as MongoDB-like documents.
+    """
+    path = os.path.join(BACKEND_DIR, SOURCES["restaurants"]["path"].format(city=city))
+    return [{**row, "_id": ObjectId()} for row in iter_rows(path)]
+
+def measure(label, documents, repeat, **options):
+    """
+    Print the median time of sanitizing the documents with the given options.
+    """
+    in_place = options.get("in_place", False)
+    timings = []
+    for _ in range(repeat):
+        data = copy.deepcopy(documents) if in_place else documents
+        start = time.perf_counter()
+        sanitize_data(data, **options)
+        timings.append(time.perf_counter() - start)
+    median = np.median(timings)
+    print(f"  {label:<10}{median * 1e3:8.2f} ms  {len(documents) / median:10.0f} docs/s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--city", default="rome")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    documents = load_documents(args.city.lower())
+    print(f"{args.city}: {len(documents)} restaurants")
+    measure("copy", documents, args.repeat)
+    measure("schema", documents, args.repeat, clean_fields=RESTAURANT_CLEAN_FIELDS)
+    measure("in place", documents, args.repeat, clean_fields=RESTAURANT_CLEAN_FIELDS, in_place=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import os
+
+"""
+City registry of the restaurant recommendation system.
+
+Lists the cities the app serves and names their MongoDB collections, so every module wires
+the same `<city>_restaurants` and `<city>_combinations` collections. Adding a city is a
+matter of setting CITIES (and ingesting its spreadsheets).
+
+Usage:
+Import city_config to resolve city names and collection names:
+    city_config.normalize("rome")                 # "Rome"
+    city_config.restaurants_collection("Rome")    # "rome_restaurants"
+"""
+
+class CityConfig:
+    """
+    Configuration class for the served cities.
+    """
+    # Comma-separated city names, e.g. "Rome,Paris,London,Milan"
+    CITIES = [city.strip().capitalize() for city in os.getenv('CITIES', 'Rome,Paris,London').split(',') if city.strip()]
+
+    def __init__(self):
+        self._by_key = {city.lower(): city for city in self.CITIES}
+
+    def normalize(self, city):
+        """
+        Return the registered name of a city, matched case-insensitively and ignoring
+        surrounding whitespace.
+
+        Args:
+            city (str): City name, e.g. as stored in a user profile or given in a query.
+
+        Returns:
+            str or None: The registered city name, or None for an unknown city.
+        """
+        if not isinstance(city, str):
+            return None
+        return self._by_key.get(city.strip().lower())
+
+    def restaurants_collection(self, city):
+        """
+        Return the name of a city's restaurants collection.
+
+        Args:
+            city (str): City name.
+
+        Returns:
+            str: The collection name.
+        """
+        return f"{city.lower()}_restaurants"
+
+    def combinations_collection(self, city):
+        """
+        Return the name of a city's clustering combinations collection.
+
+        Args:
+            city (str): City name.
+
+        Returns:
+            str: The collection name.
+        """
+        return f"{city.lower()}_combinations"
+
+city_config = CityConfig()
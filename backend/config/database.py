@@ -1,19 +1,103 @@
 import os
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
 
 """
 Database configuration for MongoDB connection.
 
-Provides configuration values for MongoDB URI and database name.
+Provides configuration values for MongoDB URI and database name, the connection pool and
+timeouts of each process's client, wire compression, and the read preference of read-only
+restaurant data queries.
 
 Usage:
-Import db_config to access database settings.
+Import db_config to access database settings:
+    MongoClient(db_config.MONGODB_URI, **db_config.client_options())
 """
 
+READ_PREFERENCES = {
+    'primary': Primary,
+    'primaryPreferred': PrimaryPreferred,
+    'secondary': Secondary,
+    'secondaryPreferred': SecondaryPreferred,
+    'nearest': Nearest,
+}
+
+def _int_env(name):
+    value = os.getenv(name)
+    return int(value) if value else None
+
 class DatabaseConfig:
     """
     Configuration class for MongoDB connection settings.
+
+    Settings left unset keep the driver defaults (or the options given in MONGODB_URI).
     """
     MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
     DATABASE_NAME = os.getenv('DB_NAME', 'restaurant_db')
 
-db_config = DatabaseConfig() 
\ No newline at end of file
+    # Connection pool of each process (driver defaults: 100 and 0 connections, no idle limit)
+    MAX_POOL_SIZE = _int_env('MONGODB_MAX_POOL_SIZE')
+    MIN_POOL_SIZE = _int_env('MONGODB_MIN_POOL_SIZE')
+    MAX_IDLE_TIME_MS = _int_env('MONGODB_MAX_IDLE_TIME_MS')
+    # Maximum time a request waits for a free pooled connection
+    WAIT_QUEUE_TIMEOUT_MS = _int_env('MONGODB_WAIT_QUEUE_TIMEOUT_MS')
+
+    # Timeouts (driver defaults: no socket timeout, 20 s to connect, 30 s to select a server)
+    SOCKET_TIMEOUT_MS = _int_env('MONGODB_SOCKET_TIMEOUT_MS')
+    CONNECT_TIMEOUT_MS = _int_env('MONGODB_CONNECT_TIMEOUT_MS')
+    SERVER_SELECTION_TIMEOUT_MS = _int_env('MONGODB_SERVER_SELECTION_TIMEOUT_MS')
+
+    # Wire compression, in order of preference, e.g. "zstd,snappy,zlib" (zstd and snappy
+    # need the zstandard and python-snappy packages)
+    COMPRESSORS = os.getenv('MONGODB_COMPRESSORS') or None
+    ZLIB_COMPRESSION_LEVEL = _int_env('MONGODB_ZLIB_COMPRESSION_LEVEL')
+
+    # Read preference of the read-only restaurant and clustering data, which only changes
+    # through ingestion, e.g. "secondaryPreferred" to serve it from secondaries. User
+    # documents are always read from the primary.
+    READ_ONLY_READ_PREFERENCE = os.getenv('MONGODB_READ_ONLY_READ_PREFERENCE', 'primary')
+    # Skip secondaries lagging more than this (at least 90 seconds); unset for no limit
+    READ_ONLY_MAX_STALENESS_S = _int_env('MONGODB_READ_ONLY_MAX_STALENESS_S')
+
+    def client_options(self):
+        """
+        Return the MongoClient keyword arguments of the configured settings.
+
+        Returns:
+            dict: The options that are set.
+        """
+        options = {
+            'maxPoolSize': self.MAX_POOL_SIZE,
+            'minPoolSize': self.MIN_POOL_SIZE,
+            'maxIdleTimeMS': self.MAX_IDLE_TIME_MS,
+            'waitQueueTimeoutMS': self.WAIT_QUEUE_TIMEOUT_MS,
+            'socketTimeoutMS': self.SOCKET_TIMEOUT_MS,
+            'connectTimeoutMS': self.CONNECT_TIMEOUT_MS,
+            'serverSelectionTimeoutMS': self.SERVER_SELECTION_TIMEOUT_MS,
+            'compressors': self.COMPRESSORS,
+            'zlibCompressionLevel': self.ZLIB_COMPRESSION_LEVEL,
+        }
+        return {name: value for name, value in options.items() if value is not None}
+
+    def read_only_read_preference(self):
+        """
+        Return the read preference of read-only restaurant data queries.
+
+        Returns:
+            ServerMode or None: The read preference, or None to read from the primary like
+            every other query.
+
+        Raises:
+            ValueError: If MONGODB_READ_ONLY_READ_PREFERENCE is not a read preference mode.
+        """
+        mode = READ_PREFERENCES.get(self.READ_ONLY_READ_PREFERENCE)
+        if mode is None:
+            raise ValueError(
+                f"Unknown read preference {self.READ_ONLY_READ_PREFERENCE!r}, expected one of {', '.join(READ_PREFERENCES)}"
+            )
+        if mode is Primary:
+            return None
+        if self.READ_ONLY_MAX_STALENESS_S is not None:
+            return mode(max_staleness=self.READ_ONLY_MAX_STALENESS_S)
+        return mode()
+
+db_config = DatabaseConfig()
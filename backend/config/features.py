@@ -0,0 +1,62 @@
+"""
+Restaurant feature schema shared by the recommendation code.
+
+Provides the ordered list of numeric feature columns used for similarity scoring
+and the mapping from user preference labels to restaurant flag fields.
+
+Usage:
+Import binary_float_columns or FIELD_MAPPING wherever the feature schema is needed.
+"""
+
+# Binary and normalized float fields, in the order used for feature vectors
+binary_float_columns = [
+    "food_rating_norm",
+    "service_rating_norm",
+    "value_rating_norm",
+    "atmosphere_rating_norm",
+    "is_price_$",
+    "is_price_$$",
+    "is_price_$$$",
+    "is_price_$$$$",
+    "is_british",
+    "is_asian",
+    "is_italian",
+    "is_indian",
+    "is_mediterranean",
+    "is_fast_food",
+    "is_seafood",
+    "is_cafe",
+    "is_french",
+    "is_steakhouse",
+    "is_mexican",
+    "is_middle_eastern",
+    "is_vegan_options",
+    "is_gluten_free_options",
+    "is_vegetarian_friendly",
+    "is_free_wifi"
+]
+
+# Mapping dictionary for user preferences to restaurant fields
+FIELD_MAPPING = {
+    # Cuisine preferences
+    "British": "is_british",
+    "Mediterranean": "is_mediterranean",
+    "French": "is_french",
+    "Asian": "is_asian",
+    "FastFood": "is_fast_food",
+    "Cafe": "is_cafe",
+    "Seafood": "is_seafood",
+    "Italian": "is_italian",
+    "Indian": "is_indian",
+    "Steakhouse": "is_steakhouse",
+    "Mexican": "is_mexican",
+    "MiddleEastern": "is_middle_eastern",
+
+    # Dietary preferences
+    "Vegan": "is_vegan_options",
+    "Vegetarian": "is_vegetarian_friendly",
+    "GlutenFree": "is_gluten_free_options",
+
+    # WiFi preference
+    "Wifi": "is_free_wifi"
+}
@@ -0,0 +1,91 @@
+from config.database import db_config
+from utils.metrics import pool_listener, query_listener
+
+try:
+    from pymongo import AsyncMongoClient
+except ImportError:  # pymongo < 4.9
+    AsyncMongoClient = None
+
+"""
+Async database connection singleton for the ASGI app (see async_app).
+
+Provides a single shared pymongo AsyncMongoClient, with the same settings as the blocking
+client (see config.database), whose operations are awaited instead of blocking a worker
+thread. The client is created on first use and is bound to the event loop it first runs on,
+so the app closes it when it stops serving.
+
+Usage:
+Import and use async_db_connection.get_db() to access the database, and
+async_db_connection.get_read_db() for read-only restaurant data.
+"""
+
+class AsyncDBConnection:
+    _instance = None
+
+    def __new__(cls):
+        """
+        Create or return the singleton instance of AsyncDBConnection.
+
+        Returns:
+            AsyncDBConnection: The singleton instance.
+        """
+        if cls._instance is None:
+            cls._instance = super(AsyncDBConnection, cls).__new__(cls)
+            cls._instance.client = None
+            cls._instance.db = None
+        return cls._instance
+
+    def get_db(self):
+        """
+        Get the async MongoDB database instance, creating the client on first use.
+
+        Returns:
+            AsyncDatabase: The MongoDB database object.
+
+        Raises:
+            RuntimeError: If the installed pymongo has no AsyncMongoClient.
+        """
+        if self.db is None:
+            if AsyncMongoClient is None:
+                raise RuntimeError("The async app requires pymongo 4.9 or later (pymongo.AsyncMongoClient)")
+            # The listeners count each request's queries and the pool utilization (see utils.metrics)
+            self.use_client(AsyncMongoClient(
+                db_config.MONGODB_URI,
+                event_listeners=[query_listener, pool_listener],
+                **db_config.client_options()
+            ))
+        return self.db
+
+    def get_read_db(self):
+        """
+        Get the async database for read-only restaurant and clustering data queries.
+
+        Returns:
+            AsyncDatabase: The database with the read-only read preference (see
+            DBConnection.get_read_db).
+        """
+        read_preference = db_config.read_only_read_preference()
+        db = self.get_db()
+        return db.with_options(read_preference=read_preference) if read_preference else db
+
+    def use_client(self, client, database_name=None):
+        """
+        Replace the shared client, e.g. with a local stand-in for tests.
+
+        Must be called before the async repositories are first used.
+
+        Args:
+            client (AsyncMongoClient): The client to use.
+            database_name (str, optional): Database name. Defaults to the configured one.
+        """
+        self.client = client
+        self.db = client[database_name or db_config.DATABASE_NAME]
+
+    async def close(self):
+        """
+        Close the shared client, if one was created. It reopens if it is used again.
+        """
+        if self.client is not None:
+            await self.client.close()
+
+async_db_connection = AsyncDBConnection()
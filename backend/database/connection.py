@@ -1,15 +1,91 @@
+import os
+import threading
 from pymongo import MongoClient
 from config.database import db_config
+from utils.metrics import pool_listener, query_listener
 
 """
 Database connection singleton for MongoDB.
 
-Provides a single shared MongoClient and database instance for the application.
+Provides a shared MongoClient per process and database handles for the application. The
+client is created on first use with the pool, timeout and compression settings of
+db_config, and again in a child process after a fork (e.g. gunicorn workers forked from a
+preloaded app), since a client must not be used across fork(). Modules keep the handles
+returned by get_db() and get_read_db() from import time; they resolve to the current
+process's client when they are used.
 
 Usage:
-Import and use db_connection.get_db() to access the database.
+Import and use db_connection.get_db() to access the database, db_connection.get_read_db()
+for read-only restaurant data, and db_connection.pool_stats() for the pool utilization.
 """
 
+class DatabaseHandle:
+    """
+    Database handle resolving to the current process's client when it is used.
+
+    Collections taken from it with `db[name]` are CollectionHandles; other attributes are
+    those of the resolved pymongo Database.
+    """
+    def __init__(self, connection, read_preference=None):
+        self._connection = connection
+        self._read_preference = read_preference
+        self._generation = None
+        self._database = None
+
+    def resolve(self):
+        """
+        Return the pymongo Database of the current process's client.
+
+        Returns:
+            Database: The database, with the handle's read preference.
+        """
+        connection = self._connection
+        if self._generation != connection.generation:
+            database = connection.client[connection.database_name]
+            if self._read_preference is not None:
+                database = database.with_options(read_preference=self._read_preference)
+            self._database = database
+            self._generation = connection.generation
+        return self._database
+
+    def __getitem__(self, name):
+        return CollectionHandle(self, name)
+
+    def __getattr__(self, name):
+        return getattr(self.resolve(), name)
+
+    def __repr__(self):
+        return f"DatabaseHandle({self._connection.database_name!r}, read_preference={self._read_preference!r})"
+
+class CollectionHandle:
+    """
+    Collection handle resolving to the current process's client when it is used.
+    """
+    def __init__(self, database, name):
+        self._database_handle = database
+        self._name = name
+        self._database = None
+        self._collection = None
+
+    def resolve(self):
+        """
+        Return the pymongo Collection of the current process's client.
+
+        Returns:
+            Collection: The collection.
+        """
+        database = self._database_handle.resolve()
+        if database is not self._database:
+            self._collection = database[self._name]
+            self._database = database
+        return self._collection
+
+    def __getattr__(self, name):
+        return getattr(self.resolve(), name)
+
+    def __repr__(self):
+        return f"CollectionHandle({self._name!r})"
+
 class DBConnection:
     _instance = None
 
@@ -21,18 +97,86 @@ class DBConnection:
             DBConnection: The singleton instance.
         """
         if cls._instance is None:
-            cls._instance = super(DBConnection, cls).__new__(cls)
-            cls._instance.client = MongoClient(db_config.MONGODB_URI)
-            cls._instance.db = cls._instance.client[db_config.DATABASE_NAME]
+            instance = cls._instance = super(DBConnection, cls).__new__(cls)
+            instance._client = None
+            instance._lock = threading.Lock()
+            instance.generation = 0
+            instance.database_name = db_config.DATABASE_NAME
+            instance.db = DatabaseHandle(instance)
+            read_preference = db_config.read_only_read_preference()
+            instance.read_db = DatabaseHandle(instance, read_preference) if read_preference else instance.db
+            os.register_at_fork(after_in_child=instance._after_fork)
         return cls._instance
 
+    @property
+    def client(self):
+        """
+        The MongoClient of the current process, created on first use.
+        """
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    # The listeners count each request's queries and the pool utilization (see utils.metrics)
+                    self._client = MongoClient(
+                        db_config.MONGODB_URI,
+                        event_listeners=[query_listener, pool_listener],
+                        **db_config.client_options()
+                    )
+        return self._client
+
+    def _after_fork(self):
+        # The parent's client and its sockets are left alone; the child creates its own on first use
+        self._client = None
+        self._lock = threading.Lock()
+        self.generation += 1
+        pool_listener.reset()
+
     def get_db(self):
         """
-        Get the MongoDB database instance.
+        Get the MongoDB database handle.
 
         Returns:
-            Database: The MongoDB database object.
+            DatabaseHandle: The database, resolved to the current process's client when used.
         """
         return self.db
 
-db_connection = DBConnection() 
\ No newline at end of file
+    def get_read_db(self):
+        """
+        Get the database handle for read-only restaurant and clustering data queries.
+
+        Reads through it use MONGODB_READ_ONLY_READ_PREFERENCE (e.g. secondaryPreferred), so
+        it must not be used for user documents, which are read right after being written.
+
+        Returns:
+            DatabaseHandle: The database with the read-only read preference, or the same
+            handle as get_db() when reads go to the primary.
+        """
+        return self.read_db
+
+    def use_client(self, client, database_name=None):
+        """
+        Replace the shared client, e.g. with a local stand-in for benchmarks.
+
+        Args:
+            client (MongoClient): The client to use.
+            database_name (str, optional): Database name. Defaults to the configured one.
+        """
+        with self._lock:
+            self._client = client
+            self.database_name = database_name or db_config.DATABASE_NAME
+            self.generation += 1
+
+    def pool_stats(self):
+        """
+        Return the connection pool utilization of this process's client.
+
+        Returns:
+            dict: Per server, the open, in-use and waiting connections and their peaks,
+            checkouts, checkout failures, the checkout wait histogram and the in-use
+            fraction of maxPoolSize (see utils.metrics.PoolListener).
+        """
+        options = getattr(self._client, 'options', None)
+        max_pool_size = options.pool_options.max_pool_size if options is not None else db_config.MAX_POOL_SIZE
+        return pool_listener.snapshot(max_pool_size)
+
+db_connection = DBConnection()
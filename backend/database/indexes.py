@@ -0,0 +1,67 @@
+import logging
+from pymongo import ASCENDING, DESCENDING, TEXT
+from pymongo.errors import PyMongoError
+from utils.search_index import search_backend
+
+"""
+Index bootstrap for the restaurant and user collections.
+
+Creates the indexes backing the server-side preference filter (on its most selective
+flags), the positive-feedback ranking and the link lookups on every `*_restaurants`
+collection (plus a text index on the names when SEARCH_BACKEND=text), the per-city lookup
+of users with stale recommendations and the per-city lookup of user ratings. Index
+creation is idempotent, so this is safe to run on every application start.
+
+Usage:
+Call ensure_indexes(db) from create_app.
+"""
+
+logger = logging.getLogger(__name__)
+
+# Preference flags indexed for the server-side preference filter (see database.queries).
+# Gluten-free and vegan options are the most selective flags a query requires (typically 10-50%
+# of a city); the other dietary and WiFi flags match most restaurants. Cuisines are not
+# indexed: the query matches them with an $or, which only uses indexes if every branch has
+# one, and the common cuisine of a city matches most of its restaurants anyway.
+PREFERENCE_INDEX_FIELDS = ["is_gluten_free_options", "is_vegan_options"]
+
+def restaurant_index_specs():
+    """
+    Return the index key lists to create on each restaurant collection.
+
+    Returns:
+        list: Lists of (field, direction) tuples.
+    """
+    specs = [
+        [("general_rating", DESCENDING)],
+        [("positive_count", DESCENDING)],
+        [("restaurant_link", ASCENDING)],
+    ]
+    if search_backend() == "text":
+        specs.append([("restaurant_name", TEXT)])
+    specs.extend([(field, ASCENDING)] for field in PREFERENCE_INDEX_FIELDS)
+    return specs
+
+def ensure_indexes(db):
+    """
+    Create the supporting indexes on all `*_restaurants` collections and the users collection.
+
+    Args:
+        db (Database): The MongoDB database object.
+
+    Returns:
+        dict: Mapping of collection name to the created index names.
+    """
+    created = {}
+    try:
+        collection_names = [name for name in db.list_collection_names() if name.endswith("_restaurants")]
+        for name in collection_names:
+            collection = db[name]
+            created[name] = [collection.create_index(keys) for keys in restaurant_index_specs()]
+        # Used by the recommendation precompute job to find a city's stale users
+        created["users"] = [db["users"].create_index([("profile.city", ASCENDING), ("recs_data_version", ASCENDING)])]
+        # Used by the rating evaluation to select a city's ratings in a date range
+        created["user_ratings"] = [db["user_ratings"].create_index([("city", ASCENDING), ("_id", ASCENDING)])]
+    except PyMongoError as e:
+        logger.error("Error creating restaurant indexes: %s", e)
+    return created
@@ -0,0 +1,142 @@
+import bson
+from pymongo.errors import PyMongoError
+from utils.preference_filter import preference_fields
+
+"""
+MongoDB query builders for pushing restaurant filters down to the server.
+
+Used when the in-process feature store isn't loaded (cold workers, admin tools), so
+callers fetch only the matching documents and only the fields they need instead of
+scanning whole city collections.
+
+Usage:
+Call build_preference_query for a user's preferences and fetch_with_report to run it.
+"""
+
+# Cached (documents, bytes) of each collection, used to compare against a full scan
+_collection_sizes = {}
+
+def build_preference_query(user_preferences):
+    """
+    Build a MongoDB filter matching a user's cuisine, dietary and WiFi preferences.
+
+    Args:
+        user_preferences (dict): User preferences document.
+
+    Returns:
+        dict or None: The filter document, or None if no restaurant can match
+        (no known cuisine preference was given).
+    """
+    cuisine_fields, required_fields = preference_fields(user_preferences)
+    if not cuisine_fields:
+        return None
+
+    clauses = [{"$or": [{field: 1} for field in sorted(cuisine_fields)]}]
+    clauses.extend({field: 1} for field in sorted(required_fields))
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+def build_projection(fields):
+    """
+    Build a projection document limited to the given fields.
+
+    Args:
+        fields (Iterable[str] or None): Field names to include. `_id` is always included.
+
+    Returns:
+        dict or None: The projection, or None to fetch whole documents.
+    """
+    if fields is None:
+        return None
+    return {field: 1 for field in fields}
+
+class FetchReport:
+    """
+    Documents and bytes fetched by a query, compared with a full collection scan.
+    """
+    def __init__(self, collection_name, documents, bytes_fetched, full_scan_documents, full_scan_bytes):
+        self.collection_name = collection_name
+        self.documents = documents
+        self.bytes_fetched = bytes_fetched
+        self.full_scan_documents = full_scan_documents
+        self.full_scan_bytes = full_scan_bytes
+
+    def __str__(self):
+        full_scan_bytes = self.full_scan_bytes if self.full_scan_bytes is not None else "?"
+        return (
+            f"{self.collection_name}: fetched {self.documents} docs / {self.bytes_fetched} bytes "
+            f"(full scan: {self.full_scan_documents} docs / {full_scan_bytes} bytes)"
+        )
+
+def collection_size(collection):
+    """
+    Return the document count and data size of a collection, cached per collection.
+
+    Args:
+        collection (Collection): The MongoDB collection.
+
+    Returns:
+        tuple: (documents, bytes); bytes is None if $collStats is unavailable.
+    """
+    name = collection.full_name
+    if name not in _collection_sizes:
+        try:
+            # The $collStats stage replaces the collStats command, deprecated since MongoDB 6.2
+            stats = next(collection.aggregate([{"$collStats": {"storageStats": {}}}]), {}).get("storageStats", {})
+            _collection_sizes[name] = (stats.get("count", 0), stats.get("size"))
+        except (PyMongoError, NotImplementedError):
+            _collection_sizes[name] = (collection.estimated_document_count(), None)
+    return _collection_sizes[name]
+
+def fetch_with_report(collection, query, projection=None, measure=True, **kwargs):
+    """
+    Run a find query and report how much was fetched compared with a full scan.
+
+    Measuring re-encodes every fetched document to BSON, so callers only measure when the
+    report is logged (e.g. `measure=logger.isEnabledFor(logging.DEBUG)`).
+
+    Args:
+        collection (Collection): The MongoDB collection.
+        query (dict): The filter document.
+        projection (dict, optional): The projection document.
+        measure (bool): Whether to build the report.
+        **kwargs: Extra arguments passed to find (sort, limit, ...).
+
+    Returns:
+        tuple: (documents, FetchReport), the report None if not measured.
+    """
+    documents = list(collection.find(query, projection, **kwargs))
+    if not measure:
+        return documents, None
+    bytes_fetched = sum(len(bson.encode(document)) for document in documents)
+    full_scan_documents, full_scan_bytes = collection_size(collection)
+    report = FetchReport(collection.name, len(documents), bytes_fetched, full_scan_documents, full_scan_bytes)
+    return documents, report
+
+def stored_restaurant_links(restaurant_links):
+    """
+    Format restaurant links the way the restaurant documents store them.
+
+    Args:
+        restaurant_links (list): Restaurant links.
+
+    Returns:
+        list: The links wrapped in single quotes.
+    """
+    # Add single quotes around the links to match the database's stored format
+    return [f"'{link}'" for link in restaurant_links]
+
+def order_by_links(restaurants, stored_links):
+    """
+    Order fetched restaurants like their links, keeping the first document of each link.
+
+    Args:
+        restaurants (Iterable[dict]): Restaurant documents with their `restaurant_link`.
+        stored_links (list): Links as returned by stored_restaurant_links, in ranking order.
+
+    Returns:
+        list: The restaurants in link order; links without a matching restaurant are skipped.
+    """
+    restaurants_by_link = {}
+    for restaurant in restaurants:
+        restaurants_by_link.setdefault(restaurant["restaurant_link"], restaurant)
+    return [restaurants_by_link[link] for link in stored_links if link in restaurants_by_link]
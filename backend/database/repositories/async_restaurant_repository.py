@@ -0,0 +1,148 @@
+from config.cities import city_config
+from database.async_connection import async_db_connection
+from database.queries import order_by_links, stored_restaurant_links
+from database.repositories.restaurant_repository import CityCollections
+from utils.data_version import COMBINATIONS, get_data_version_async
+from utils.search_index import text_query
+
+"""
+Async repository for restaurant data access, used by the ASGI app.
+
+Provides the lookups of RestaurantRepository as coroutines on the async client, over the
+same city registry. The async client is created on first use, not when this module is
+imported.
+
+Usage:
+Import and use the async_restaurant_repository singleton for database operations.
+"""
+
+class AsyncRestaurantRepository(CityCollections):
+    def __init__(self):
+        super().__init__(async_db_connection)
+
+    async def data_version(self, city):
+        """
+        Return the current data version of a city's restaurants (see utils.data_version).
+
+        Args:
+            city (str): City name.
+
+        Returns:
+            int or None: The version, or None if it was never versioned or the city is unknown.
+        """
+        collection = self.collection(city)
+        if collection is None:
+            return None
+        return await get_data_version_async(collection.database, city_config.normalize(city))
+
+    async def combinations_version(self, city):
+        """
+        Return the current version of a city's clustering combinations (see utils.data_version).
+
+        Args:
+            city (str): City name.
+
+        Returns:
+            int or None: The version, or None if it was never versioned or the city is unknown.
+        """
+        collection = self.combinations_collection(city)
+        if collection is None:
+            return None
+        return await get_data_version_async(collection.database, city_config.normalize(city), COMBINATIONS)
+
+    async def find_by_ids(self, restaurant_ids, city, projection=None):
+        """
+        Find restaurants by a list of IDs for a specific city, in no particular order.
+
+        Args:
+            restaurant_ids (list): List of restaurant ID strings.
+            city (str): City name.
+            projection (dict, optional): Projection limiting the returned fields.
+
+        Returns:
+            list: List of restaurant documents.
+
+        Raises:
+            ValueError: If the city is unknown.
+        """
+        if not restaurant_ids:
+            return []
+        cursor = self.require_collection(city).find(self.ids_query(restaurant_ids), projection)
+        return await cursor.to_list(None)
+
+    async def find_many_by_ids(self, restaurant_ids, city, projection=None):
+        """
+        Find restaurants by a list of IDs with one query, keeping the IDs' order.
+
+        Args:
+            restaurant_ids (list): List of restaurant ID strings, e.g. in ranking order.
+            city (str): City name.
+            projection (dict, optional): Projection limiting the returned fields.
+
+        Returns:
+            list: Restaurant documents in the order of `restaurant_ids`.
+
+        Raises:
+            ValueError: If the city is unknown.
+        """
+        return self.order_by_ids(await self.find_by_ids(restaurant_ids, city, projection), restaurant_ids)
+
+    async def find_by_links(self, city, restaurant_links, projection=None):
+        """
+        Fetch the restaurants for a list of links with a single query, keeping the links' order.
+
+        Args:
+            city (str): City name.
+            restaurant_links (list): Restaurant links, in ranking order.
+            projection (dict, optional): Projection limiting the returned fields.
+
+        Returns:
+            list: Restaurant documents in the order of `restaurant_links`.
+
+        Raises:
+            ValueError: If the city is unknown.
+        """
+        if not restaurant_links:
+            return []
+        stored_links = stored_restaurant_links(restaurant_links)
+        query, projection = self.links_query(stored_links, projection)
+        cursor = self.require_collection(city).find(query, projection)
+        return order_by_links(await cursor.to_list(None), stored_links)
+
+    async def find_combination(self, city, key):
+        """
+        Find the document of a combination key in a city's clustering results.
+
+        Args:
+            city (str): City name.
+            key (str): The combination key (see utils.clustering.combination_key).
+
+        Returns:
+            dict or None: The combination document, or None if there is none or the city is unknown.
+        """
+        collection = self.combinations_collection(city)
+        if collection is None:
+            return None
+        return await collection.find_one({"combination": key})
+
+    async def search_text(self, city, query, limit, projection=None):
+        """
+        Search a city's restaurants with the MongoDB text index on their names.
+
+        Args:
+            city (str): City name.
+            query (str): The text typed by the user.
+            limit (int): Maximum number of restaurants.
+            projection (dict, optional): Projection limiting the returned fields.
+
+        Returns:
+            list: Restaurant documents, best match first.
+
+        Raises:
+            ValueError: If the city is unknown.
+        """
+        query, projection, sort = text_query(query, projection)
+        cursor = self.require_collection(city).find(query, projection).sort(sort).limit(limit)
+        return await cursor.to_list(None)
+
+async_restaurant_repository = AsyncRestaurantRepository()
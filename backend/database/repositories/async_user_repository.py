@@ -0,0 +1,213 @@
+from bson import ObjectId
+from pymongo import UpdateOne
+from database.async_connection import async_db_connection
+from database.repositories.user_repository import selection_update
+
+"""
+Async repository for user data access, used by the ASGI app.
+
+Provides the methods of UserRepository as coroutines on the async client.
+
+Usage:
+Import and use the async_user_repository singleton for database operations.
+"""
+
+class AsyncUserRepository:
+    def __init__(self):
+        self._db = None
+
+    @property
+    def db(self):
+        """
+        The async database, resolved on first use so importing the repository performs no I/O.
+        """
+        if self._db is None:
+            self._db = async_db_connection.get_db()
+        return self._db
+
+    @property
+    def users_collection(self):
+        return self.db['users']
+
+    @property
+    def user_preferences_collection(self):
+        return self.db['preferences']
+
+    @property
+    def user_ratings_collection(self):
+        return self.db['user_ratings']
+
+    async def get_user(self, user_id, projection=None):
+        """
+        Retrieve a user document by user ID.
+
+        Args:
+            user_id (str): The user's unique identifier.
+            projection (dict, optional): Projection limiting the returned fields.
+
+        Returns:
+            dict or None: User document or None if not found.
+        """
+        return await self.users_collection.find_one({"_id": ObjectId(user_id)}, projection)
+
+    async def get_user_preferences(self, user_id):
+        """
+        Retrieve user preferences by user ID.
+
+        Args:
+            user_id (str): The user's unique identifier.
+
+        Returns:
+            dict or None: User preferences document or None if not found.
+        """
+        return await self.user_preferences_collection.find_one({"_id": ObjectId(user_id)})
+
+    async def save_user_preferences(self, data):
+        """
+        Save user preferences to the database.
+
+        Args:
+            data (dict): User preferences data.
+
+        Returns:
+            InsertOneResult: Result of the insert operation.
+        """
+        return await self.user_preferences_collection.insert_one(data)
+
+    async def update_user(self, user_id, data):
+        """
+        Update a user document with new data.
+
+        Args:
+            user_id (str): The user's unique identifier.
+            data (dict): Data to update in the user document.
+
+        Returns:
+            UpdateResult: Result of the update operation.
+        """
+        return await self.users_collection.update_one({"_id": ObjectId(user_id)}, {"$set": data}, upsert=True)
+
+    async def add_offered_restaurants(self, user_id, nickname, restaurants):
+        """
+        Add offered restaurants to a user document.
+
+        Args:
+            user_id (str): The user's unique identifier.
+            nickname (str): User's nickname.
+            restaurants (list): List of offered restaurant documents.
+
+        Returns:
+            UpdateResult: Result of the update operation.
+        """
+        return await self.users_collection.update_one(
+            {"_id": ObjectId(user_id)},
+            {
+                "$set": {
+                    "nickname": nickname,
+                    "offered_restaurants": restaurants
+                },
+                "$setOnInsert": {
+                    "selected_restaurants": []
+                }
+            },
+            upsert=True
+        )
+
+    async def add_selected_restaurants(self, user_id, restaurant_ids, city):
+        """
+        Add selected restaurants and city to a user document.
+
+        Args:
+            user_id (str): The user's unique identifier.
+            restaurant_ids (list): List of selected restaurant IDs.
+            city (str): City name.
+
+        Returns:
+            UpdateResult: Result of the update operation.
+        """
+        return await self.users_collection.update_one(
+            {"_id": ObjectId(user_id)},
+            {
+                "$set": {
+                    "selected_restaurants": restaurant_ids,
+                    "city": city,
+                }
+            },
+            upsert=True
+        )
+
+    async def update_selection(self, user_id, add, remove, sum_deltas, count_delta, updated_at=None):
+        """
+        Atomically apply selection changes to a profile's selection and running sums.
+
+        See selection_update.
+
+        Args:
+            user_id (str): The user's unique identifier.
+            add (list): Distinct restaurant IDs to add.
+            remove (list): Distinct restaurant IDs to remove.
+            sum_deltas (dict): Column to the change of its running sum.
+            count_delta (int): Change of the selection count.
+            updated_at (datetime, optional): New `profile.updated_at`.
+
+        Returns:
+            int: 1 if the profile was updated, 0 otherwise.
+        """
+        query, update = selection_update(user_id, add, remove, sum_deltas, count_delta, updated_at)
+        return (await self.users_collection.update_one(query, update)).modified_count
+
+    async def get_users_by_ids(self, user_ids, projection=None):
+        """
+        Retrieve several user documents with one query.
+
+        Args:
+            user_ids (list): User ID strings.
+            projection (dict, optional): Projection limiting the returned fields.
+
+        Returns:
+            list: User documents, in no particular order.
+        """
+        cursor = self.users_collection.find({"_id": {"$in": [ObjectId(uid) for uid in user_ids]}}, projection)
+        return await cursor.to_list(None)
+
+    async def get_preferences_by_ids(self, user_ids):
+        """
+        Retrieve the preferences of several users with one query.
+
+        Args:
+            user_ids (list): User ID strings.
+
+        Returns:
+            list: Preference documents, in no particular order.
+        """
+        cursor = self.user_preferences_collection.find({"_id": {"$in": [ObjectId(uid) for uid in user_ids]}})
+        return await cursor.to_list(None)
+
+    async def update_users(self, updates):
+        """
+        Set per-user fields on several users with one unordered bulk write.
+
+        Args:
+            updates (dict): Mapping of user ID string to the fields to set.
+
+        Returns:
+            int: Number of users modified.
+        """
+        if not updates:
+            return 0
+        requests = [UpdateOne({"_id": ObjectId(uid)}, {"$set": fields}) for uid, fields in updates.items()]
+        return (await self.users_collection.bulk_write(requests, ordered=False)).modified_count
+
+    async def add_rating(self, rating):
+        """
+        Store a user's ratings of their test restaurants.
+
+        Args:
+            rating (dict): The rating document.
+
+        Returns:
+            InsertOneResult: Result of the insert operation.
+        """
+        return await self.user_ratings_collection.insert_one(rating)
+
+async_user_repository = AsyncUserRepository()
@@ -1,39 +1,247 @@
 from bson import ObjectId
+from config.cities import city_config
 from database.connection import db_connection
+from database.queries import order_by_links, stored_restaurant_links
+from utils.data_version import COMBINATIONS, get_data_version
+from utils.search_index import text_query
 
 """
 Repository for restaurant data access.
 
-Provides methods to retrieve restaurant documents by IDs and city.
+Wires the restaurant and clustering combination collections of every city in the city
+registry (see config.cities) and provides the batch lookups the services use: documents by
+IDs or by restaurant links with one `$in` query, combination documents and name text search.
+The database is resolved on first use, so importing the repository performs no I/O.
 
 Usage:
 Import and use the restaurant_repository singleton for database operations.
 """
 
-class RestaurantRepository:
+class CityCollections:
+    """
+    Lazily wired per-city restaurant and combination collections of a connection.
+
+    Restaurant data only changes through ingestion, so it is read through the connection's
+    read-only database, which may be served by secondaries (see config.database).
+    """
+    def __init__(self, connection):
+        self.connection = connection
+        self._db = None
+        self._restaurants = {}
+        self._combinations = {}
+
+    @property
+    def db(self):
+        """
+        The read-only database of the connection, resolved on first use.
+        """
+        if self._db is None:
+            self._db = self.connection.get_read_db()
+        return self._db
+
+    @property
+    def cities(self):
+        """
+        The registered city names.
+        """
+        return city_config.CITIES
+
+    def collection(self, city):
+        """
+        Return the restaurants collection of a city.
+
+        Args:
+            city (str): City name, matched case-insensitively.
+
+        Returns:
+            Collection or None: The collection, or None for an unknown city.
+        """
+        name = city_config.normalize(city)
+        if name is None:
+            return None
+        collection = self._restaurants.get(name)
+        if collection is None:
+            collection = self._restaurants[name] = self.db[city_config.restaurants_collection(name)]
+        return collection
+
+    def combinations_collection(self, city):
+        """
+        Return the clustering combinations collection of a city.
+
+        Args:
+            city (str): City name, matched case-insensitively.
+
+        Returns:
+            Collection or None: The collection, or None for an unknown city.
+        """
+        name = city_config.normalize(city)
+        if name is None:
+            return None
+        collection = self._combinations.get(name)
+        if collection is None:
+            collection = self._combinations[name] = self.db[city_config.combinations_collection(name)]
+        return collection
+
+    def require_collection(self, city):
+        """
+        Return the restaurants collection of a city that must be known.
+
+        Args:
+            city (str): City name.
+
+        Returns:
+            Collection: The collection.
+
+        Raises:
+            ValueError: If the city is unknown.
+        """
+        collection = self.collection(city)
+        if collection is None:
+            raise ValueError(f"No restaurants available for city: {city}")
+        return collection
+
+    @staticmethod
+    def ids_query(restaurant_ids):
+        return {"_id": {"$in": [ObjectId(rid) for rid in restaurant_ids]}}
+
+    @staticmethod
+    def links_query(stored_links, projection=None):
+        if projection is not None:
+            projection = {**projection, "restaurant_link": 1}
+        return {"restaurant_link": {"$in": stored_links}}, projection
+
+    @staticmethod
+    def order_by_ids(restaurants, restaurant_ids):
+        position = {str(rid): i for i, rid in enumerate(restaurant_ids)}
+        restaurants.sort(key=lambda restaurant: position[str(restaurant["_id"])])
+        return restaurants
+
+class RestaurantRepository(CityCollections):
     def __init__(self):
-        self.db = db_connection.get_db()
-        self.restaurants_collections = {
-            'Rome': self.db['rome_restaurants'],
-            'Paris': self.db['paris_restaurants'],
-            'London': self.db['london_restaurants'],
-        }
+        super().__init__(db_connection)
+
+    def data_version(self, city):
+        """
+        Return the current data version of a city's restaurants (see utils.data_version).
+
+        Args:
+            city (str): City name.
+
+        Returns:
+            int or None: The version, or None if it was never versioned or the city is unknown.
+        """
+        collection = self.collection(city)
+        if collection is None:
+            return None
+        return get_data_version(collection.database, city_config.normalize(city))
+
+    def combinations_version(self, city):
+        """
+        Return the current version of a city's clustering combinations (see utils.data_version).
+
+        Args:
+            city (str): City name.
 
-    def find_by_ids(self, restaurant_ids, city):
+        Returns:
+            int or None: The version, or None if it was never versioned or the city is unknown.
         """
-        Find restaurants by a list of IDs for a specific city.
+        collection = self.combinations_collection(city)
+        if collection is None:
+            return None
+        return get_data_version(collection.database, city_config.normalize(city), COMBINATIONS)
+
+    def find_by_ids(self, restaurant_ids, city, projection=None):
+        """
+        Find restaurants by a list of IDs for a specific city, in no particular order.
 
         Args:
             restaurant_ids (list): List of restaurant ID strings.
             city (str): City name.
+            projection (dict, optional): Projection limiting the returned fields.
 
         Returns:
             list: List of restaurant documents.
+
+        Raises:
+            ValueError: If the city is unknown.
+        """
+        if not restaurant_ids:
+            return []
+        return list(self.require_collection(city).find(self.ids_query(restaurant_ids), projection))
+
+    def find_many_by_ids(self, restaurant_ids, city, projection=None):
+        """
+        Find restaurants by a list of IDs with one query, keeping the IDs' order.
+
+        Args:
+            restaurant_ids (list): List of restaurant ID strings, e.g. in ranking order.
+            city (str): City name.
+            projection (dict, optional): Projection limiting the returned fields.
+
+        Returns:
+            list: Restaurant documents in the order of `restaurant_ids`; IDs without a
+            matching restaurant are skipped.
+
+        Raises:
+            ValueError: If the city is unknown.
+        """
+        return self.order_by_ids(self.find_by_ids(restaurant_ids, city, projection), restaurant_ids)
+
+    def find_by_links(self, city, restaurant_links, projection=None):
+        """
+        Fetch the restaurants for a list of links with a single query, keeping the links' order.
+
+        Args:
+            city (str): City name.
+            restaurant_links (list): Restaurant links, in ranking order.
+            projection (dict, optional): Projection limiting the returned fields.
+
+        Returns:
+            list: Restaurant documents in the order of `restaurant_links`; links without a
+            matching restaurant are skipped.
+
+        Raises:
+            ValueError: If the city is unknown.
+        """
+        if not restaurant_links:
+            return []
+        stored_links = stored_restaurant_links(restaurant_links)
+        query, projection = self.links_query(stored_links, projection)
+        return order_by_links(self.require_collection(city).find(query, projection), stored_links)
+
+    def find_combination(self, city, key):
+        """
+        Find the document of a combination key in a city's clustering results.
+
+        Args:
+            city (str): City name.
+            key (str): The combination key (see utils.clustering.combination_key).
+
+        Returns:
+            dict or None: The combination document, or None if there is none or the city is unknown.
+        """
+        collection = self.combinations_collection(city)
+        if collection is None:
+            return None
+        return collection.find_one({"combination": key})
+
+    def search_text(self, city, query, limit, projection=None):
+        """
+        Search a city's restaurants with the MongoDB text index on their names.
+
+        Args:
+            city (str): City name.
+            query (str): The text typed by the user.
+            limit (int): Maximum number of restaurants.
+            projection (dict, optional): Projection limiting the returned fields.
+
+        Returns:
+            list: Restaurant documents, best match first.
+
+        Raises:
+            ValueError: If the city is unknown.
         """
-        return list(
-            self.restaurants_collections.get(city).find(
-                {"_id": {"$in": [ObjectId(rid) for rid in restaurant_ids]}}
-            )
-        )
+        query, projection, sort = text_query(query, projection)
+        return list(self.require_collection(city).find(query, projection).sort(sort).limit(limit))
 
-restaurant_repository = RestaurantRepository() 
\ No newline at end of file
+restaurant_repository = RestaurantRepository()
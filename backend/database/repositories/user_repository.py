@@ -1,20 +1,83 @@
 from bson import ObjectId
+from pymongo import UpdateOne
 from database.connection import db_connection
 
 """
 Repository for user data access.
 
-Provides methods to retrieve, save, and update user and preference documents.
+Provides methods to retrieve, save, and update user and preference documents, individually
+or in batches, and to store users' ratings.
 
 Usage:
 Import and use the user_repository singleton for database operations.
 """
 
+def _without(path, restaurant_ids):
+    # Array elements not in restaurant_ids; a missing array counts as empty
+    return {"$filter": {
+        "input": {"$ifNull": [path, []]},
+        "cond": {"$eq": [{"$in": ["$$this", {"$literal": restaurant_ids}]}, False]},
+    }}
+
+def selection_update(user_id, add, remove, sum_deltas, count_delta, updated_at=None):
+    """
+    Build the update applying selection changes to a profile in one atomic operation.
+
+    The update only applies if the profile has running sums, none of the added restaurants
+    is selected and all of the removed ones are, so a change is never counted twice. It is
+    an update pipeline (MongoDB 4.2+), since MongoDB rejects `$addToSet` and `$pull` on the
+    same array in one update.
+
+    Args:
+        user_id (str): The user's unique identifier.
+        add (list): Distinct restaurant IDs to add.
+        remove (list): Distinct restaurant IDs to remove, none of them in `add`.
+        sum_deltas (dict): Column to the change of its running sum.
+        count_delta (int): Change of the selection count.
+        updated_at (datetime, optional): New `profile.updated_at`.
+
+    Returns:
+        tuple: (query, update pipeline).
+    """
+    selection = {}
+    if add:
+        selection["$nin"] = add
+    if remove:
+        selection["$all"] = remove
+    query = {"_id": ObjectId(user_id), "profile.sums": {"$exists": True}}
+    if selection:
+        query["profile.selected_restaurants"] = selection
+
+    fields = {
+        f"profile.sums.{col}": {"$add": [{"$ifNull": [f"$profile.sums.{col}", 0]}, delta]}
+        for col, delta in sum_deltas.items() if delta
+    }
+    fields["profile.count"] = {"$add": [{"$ifNull": ["$profile.count", 0]}, count_delta]}
+    for path in ("profile.selected_restaurants", "selected_restaurants"):
+        fields[path] = {"$concatArrays": [_without(f"${path}", remove), {"$literal": add}]}
+    if updated_at is not None:
+        fields["profile.updated_at"] = {"$literal": updated_at}
+    return query, [{"$set": fields}]
+
 class UserRepository:
     def __init__(self):
         self.db = db_connection.get_db()
         self.users_collection = self.db['users']
         self.user_preferences_collection = self.db['preferences']
+        self.user_ratings_collection = self.db['user_ratings']
+
+    def get_user(self, user_id, projection=None):
+        """
+        Retrieve a user document by user ID.
+
+        Args:
+            user_id (str): The user's unique identifier.
+            projection (dict, optional): Projection limiting the returned fields.
+
+        Returns:
+            dict or None: User document or None if not found.
+        """
+        return self.users_collection.find_one({"_id": ObjectId(user_id)}, projection)
 
     def get_user_preferences(self, user_id):
         """
@@ -102,4 +165,77 @@ class UserRepository:
             upsert=True
         )
 
-user_repository = UserRepository() 
\ No newline at end of file
+
+    def update_selection(self, user_id, add, remove, sum_deltas, count_delta, updated_at=None):
+        """
+        Atomically apply selection changes to a profile's selection and running sums.
+
+        See selection_update.
+
+        Args:
+            user_id (str): The user's unique identifier.
+            add (list): Distinct restaurant IDs to add.
+            remove (list): Distinct restaurant IDs to remove.
+            sum_deltas (dict): Column to the change of its running sum.
+            count_delta (int): Change of the selection count.
+            updated_at (datetime, optional): New `profile.updated_at`.
+
+        Returns:
+            int: 1 if the profile was updated, 0 otherwise.
+        """
+        query, update = selection_update(user_id, add, remove, sum_deltas, count_delta, updated_at)
+        return self.users_collection.update_one(query, update).modified_count
+
+    def get_users_by_ids(self, user_ids, projection=None):
+        """
+        Retrieve several user documents with one query.
+
+        Args:
+            user_ids (list): User ID strings.
+            projection (dict, optional): Projection limiting the returned fields.
+
+        Returns:
+            list: User documents, in no particular order.
+        """
+        return list(self.users_collection.find({"_id": {"$in": [ObjectId(uid) for uid in user_ids]}}, projection))
+
+    def get_preferences_by_ids(self, user_ids):
+        """
+        Retrieve the preferences of several users with one query.
+
+        Args:
+            user_ids (list): User ID strings.
+
+        Returns:
+            list: Preference documents, in no particular order.
+        """
+        return list(self.user_preferences_collection.find({"_id": {"$in": [ObjectId(uid) for uid in user_ids]}}))
+
+    def update_users(self, updates):
+        """
+        Set per-user fields on several users with one unordered bulk write.
+
+        Args:
+            updates (dict): Mapping of user ID string to the fields to set.
+
+        Returns:
+            int: Number of users modified.
+        """
+        if not updates:
+            return 0
+        requests = [UpdateOne({"_id": ObjectId(uid)}, {"$set": fields}) for uid, fields in updates.items()]
+        return self.users_collection.bulk_write(requests, ordered=False).modified_count
+
+    def add_rating(self, rating):
+        """
+        Store a user's ratings of their test restaurants.
+
+        Args:
+            rating (dict): The rating document.
+
+        Returns:
+            InsertOneResult: Result of the insert operation.
+        """
+        return self.user_ratings_collection.insert_one(rating)
+
+user_repository = UserRepository()
\ No newline at end of file
@@ -0,0 +1,185 @@
+import asyncio
+from bson import ObjectId
+from database.repositories.async_user_repository import async_user_repository
+from database.repositories.async_restaurant_repository import async_restaurant_repository
+from services.recommendation_service import REC_FIELD, TEST_USER_PROJECTION, recommendation_engine, restaurants_by_id
+from utils.data_sanitizer import sanitize_data
+
+"""
+Async service layer for profile-based restaurant recommendations, used by the ASGI app.
+
+Scores with the same in-memory feature stores and ranking code as RecommendationEngine, but
+awaits its queries on the async client and runs the independent ones concurrently: the
+profiles and preferences of a batch are fetched together, and the ranked restaurants of
+every city are fetched while the rankings are saved.
+
+Usage:
+Import and use the async_recommendation_engine singleton:
+    await async_recommendation_engine.recommend_many(user_ids, k=4, save=True)
+    await async_recommendation_engine.test_restaurants(user_id)
+    await async_recommendation_engine.saved_recommendations(user)
+"""
+
+class AsyncRecommendationEngine:
+    def __init__(self):
+        self.engine = recommendation_engine
+        self.user_repository = async_user_repository
+        self.restaurant_repository = async_restaurant_repository
+
+    async def fetch_restaurants(self, store, rows):
+        """
+        Fetch the sanitized documents of feature-store rows with one query.
+
+        Args:
+            store (CityFeatureStore): The city's feature store.
+            rows (Iterable[int]): Row indices to fetch.
+
+        Returns:
+            dict: Mapping of restaurant ID string to sanitized document with a string `_id`.
+        """
+        row_ids = [store.ids[row] for row in rows]
+        if not row_ids:
+            return {}
+        return restaurants_by_id(await self.restaurant_repository.find_by_ids(row_ids, store.city))
+
+    async def save_rankings(self, rankings):
+        """
+        Store rankings as each user's `4_rec_restaurants` restaurant IDs and scores.
+
+        Args:
+            rankings (dict): Mapping of user ID to a (store, rows, scores) tuple, as returned by rank_many.
+
+        Returns:
+            int: Number of users modified.
+        """
+        return await self.user_repository.update_users(self.engine.ranking_updates(rankings))
+
+    async def rank_users(self, user_ids, users, preferences, k=4):
+        """
+        Rank the k closest restaurants to the profiles of users whose documents are already fetched.
+
+        Ranking runs in a worker thread: it may reload a city's feature store whose data
+        version changed (see RecommendationEngine.get_store), which reads MongoDB on the
+        blocking client and can rebuild the store.
+
+        Args:
+            user_ids (list): Distinct user ID strings.
+            users (Iterable[dict]): The users' documents, with at least their `profile`.
+            preferences (Iterable[dict]): The users' preference documents.
+            k (int): Number of restaurants per user.
+
+        Returns:
+            tuple: (rankings, missing), as returned by RecommendationEngine.rank_many.
+        """
+        return await asyncio.to_thread(self.engine.rank_users, user_ids, users, preferences, k)
+
+    async def rank_many(self, user_ids, k=4):
+        """
+        Rank the k closest restaurants to the profiles of several users, without fetching them.
+
+        Args:
+            user_ids (list): User ID strings.
+            k (int): Number of restaurants per user.
+
+        Returns:
+            tuple: (rankings, missing), as returned by RecommendationEngine.rank_many.
+
+        Raises:
+            bson.errors.InvalidId: If a user ID is not a valid ObjectId.
+        """
+        user_ids = list(dict.fromkeys(str(ObjectId(uid)) for uid in user_ids))
+        users, preferences = await asyncio.gather(
+            self.user_repository.get_users_by_ids(user_ids, {"profile": 1}),
+            self.user_repository.get_preferences_by_ids(user_ids),
+        )
+        return await self.rank_users(user_ids, users, preferences, k)
+
+    async def recommend_many(self, user_ids, k=4, save=False):
+        """
+        Recommend the k closest restaurants to the profiles of several users.
+
+        Args:
+            user_ids (list): User ID strings.
+            k (int): Number of restaurants per user.
+            save (bool): Store the restaurant IDs and scores as each user's `4_rec_restaurants`.
+
+        Returns:
+            tuple: (recommendations, missing), as returned by RecommendationEngine.recommend_many.
+
+        Raises:
+            bson.errors.InvalidId: If a user ID is not a valid ObjectId.
+        """
+        rankings, missing = await self.rank_many(user_ids, k)
+        fetches = asyncio.gather(*(
+            self.fetch_restaurants(store, rows) for store, rows in self.engine.rows_by_city(rankings)
+        ))
+        if save:
+            fetched, _ = await asyncio.gather(fetches, self.save_rankings(rankings))
+        else:
+            fetched = await fetches
+        restaurants = {}
+        for city_restaurants in fetched:
+            restaurants.update(city_restaurants)
+        return self.engine.resolve_rankings(rankings, restaurants), missing
+
+    async def test_restaurants(self, user_id, k=4):
+        """
+        Pick the test page restaurants of a user from their k closest restaurants.
+
+        The user's precomputed recommendations are used while they are current (see
+        RecommendationEngine.saved_rows); otherwise the user is ranked and the picks (see
+        RecommendationEngine.pick_test_rows) are fetched with one query while the k closest
+        are saved as their recommendations.
+
+        Args:
+            user_id (str): The user ID.
+            k (int): Number of recommendations to save.
+
+        Returns:
+            list or None: The picked restaurant documents in that order (without the picks
+            that are not available), or None if the user has no profile.
+
+        Raises:
+            bson.errors.InvalidId: If the user ID is not a valid ObjectId.
+            ValueError: If the user has no preferences, profile averages or known city.
+        """
+        user_id = str(ObjectId(user_id))
+        user = await self.user_repository.get_user(user_id, TEST_USER_PROJECTION)
+        if not user or "profile" not in user:
+            return None
+        selected_ids = user["profile"].get("selected_restaurants", [])
+        # Checking the saved rows may reload the city's feature store (see rank_users)
+        saved = await asyncio.to_thread(self.engine.saved_rows, user)
+        if saved is not None:
+            store, rows = saved
+            picks = self.engine.pick_test_rows(store, rows, selected_ids)
+            restaurants = await self.fetch_restaurants(store, picks)
+        else:
+            preferences = await self.user_repository.get_user_preferences(user_id)
+            rankings, _ = await self.rank_users([user_id], [user], [preferences] if preferences else [], k)
+            if user_id not in rankings:
+                raise ValueError("User preferences not found.")
+            store, rows, _ = rankings[user_id]
+            picks = self.engine.pick_test_rows(store, rows, selected_ids)
+            restaurants, _ = await asyncio.gather(self.fetch_restaurants(store, picks), self.save_rankings(rankings))
+        return [restaurants[store.ids[row]] for row in picks if store.ids[row] in restaurants]
+
+    async def saved_recommendations(self, user):
+        """
+        Resolve a user's precomputed `4_rec_restaurants` into restaurant documents.
+
+        Args:
+            user (dict): User document.
+
+        Returns:
+            list: Sanitized restaurant documents in ranking order, each with its `score`
+            (see RecommendationEngine.saved_recommendations).
+        """
+        saved = user.get(REC_FIELD) or []
+        city = user.get("profile", {}).get("city")
+        if not self.engine.saved_as_ids(saved, city):
+            return sanitize_data(saved)
+        restaurants = await self.restaurant_repository.find_by_ids([entry["_id"] for entry in saved], city)
+        return self.engine.resolve_saved(saved, restaurants)
+
+async_recommendation_engine = AsyncRecommendationEngine()
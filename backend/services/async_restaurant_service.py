@@ -0,0 +1,95 @@
+import asyncio
+import logging
+from pymongo.errors import PyMongoError
+from database.repositories.async_restaurant_repository import async_restaurant_repository
+from services.search_service import search_service
+from utils.clustering import combination_cache, combination_cache_key, combination_key, combination_links
+from utils.data_sanitizer import RESTAURANT_CLEAN_FIELDS, sanitize_data
+from utils.metrics import timed
+from utils.search_index import search_backend
+
+"""
+Async service layer for restaurant selection and search, used by the ASGI app.
+
+Resolves combinations through the same combination cache as utils.clustering and searches
+names with the same per-city indexes as SearchService, awaiting the MongoDB lookups on the
+async client.
+
+Usage:
+Import and use the async_restaurant_service singleton:
+    await async_restaurant_service.get_top_restaurants(city, types, diets, features, ranking)
+    await async_restaurant_service.search("Rome", "trat", limit=10)
+"""
+
+logger = logging.getLogger(__name__)
+
+class AsyncRestaurantService:
+    def __init__(self):
+        self.restaurant_repository = async_restaurant_repository
+
+    async def get_top_restaurants(self, city, chosen_types, chosen_diets, chosen_features, rating_rank_dict, projection=None):
+        """
+        Retrieve the top restaurants for a city based on user-selected types, diets, features, and ranking priorities.
+
+        Args:
+            city (str): The city name.
+            chosen_types (list): List of cuisine types selected by the user.
+            chosen_diets (list): List of dietary preferences selected by the user.
+            chosen_features (list): List of additional features selected by the user.
+            rating_rank_dict (dict): Dictionary of rating priorities.
+            projection (dict, optional): Projection limiting the returned restaurant fields.
+
+        Returns:
+            list: Sanitized list of top restaurant documents.
+        """
+        with timed("clustering.select_top_restaurants"):
+            key = combination_key(chosen_types, chosen_diets, chosen_features, rating_rank_dict)
+            versions = await asyncio.gather(
+                self.restaurant_repository.data_version(city), self.restaurant_repository.combinations_version(city)
+            )
+            cache_key = combination_cache_key(city, key, projection, tuple(versions))
+            restaurants = combination_cache.get(cache_key)
+            if restaurants is None:
+                document = await self.restaurant_repository.find_combination(city, key)
+                restaurants = await self.restaurant_repository.find_by_links(city, combination_links(document), projection)
+                combination_cache.set(cache_key, restaurants)
+        # The documents are shared with the combination cache, so they are copied, not sanitized in place
+        return sanitize_data(list(restaurants), clean_fields=RESTAURANT_CLEAN_FIELDS)
+
+    async def search(self, city, query, limit=10, projection=None):
+        """
+        Search a city's restaurants by name (see SearchService.search).
+
+        Args:
+            city (str): City name.
+            query (str): The text typed by the user.
+            limit (int): Maximum number of restaurants.
+            projection (dict, optional): Projection limiting the returned fields.
+
+        Returns:
+            list: Restaurant documents with string `_id`s, best match first.
+
+        Raises:
+            ValueError: If the city is unknown.
+        """
+        self.restaurant_repository.require_collection(city)
+        if search_backend() == "text":
+            if not query.strip():
+                return []
+            try:
+                restaurants = await self.restaurant_repository.search_text(city, query, limit, projection)
+            except PyMongoError as e:
+                logger.error("Error running text search for city %s: %s", city, e)
+                return []
+        else:
+            # Building a city's index scans its restaurants, so it runs in a worker thread
+            index = await asyncio.to_thread(search_service.get_index, city)
+            ids = index.search(query, limit)
+            if not ids:
+                return []
+            restaurants = await self.restaurant_repository.find_many_by_ids(ids, city, projection)
+        for restaurant in restaurants:
+            restaurant["_id"] = str(restaurant["_id"])
+        return restaurants
+
+async_restaurant_service = AsyncRestaurantService()
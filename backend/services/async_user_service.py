@@ -0,0 +1,107 @@
+import asyncio
+from datetime import datetime, timezone
+from database.repositories.async_user_repository import async_user_repository
+from database.repositories.async_restaurant_repository import async_restaurant_repository
+from services.user_service import (
+    PROFILE_PROJECTION, SELECTION_ATTEMPTS, build_profile, change_deltas, rebuilt_selection, selection_changes
+)
+from utils.profile_vectors import profile_averages
+
+"""
+Async service layer for user-related business logic, used by the ASGI app.
+
+Provides the profile creation and incremental selection updates of UserService as
+coroutines on the async client, with independent queries run concurrently.
+
+Usage:
+Import and use the async_user_service singleton for user operations.
+"""
+
+class AsyncUserService:
+    def __init__(self):
+        self.user_repository = async_user_repository
+        self.restaurant_repository = async_restaurant_repository
+
+    async def create_user_profile(self, user_id, selected_restaurants, city):
+        """
+        Create (or fully rebuild) a user profile based on the selected restaurants.
+
+        Args:
+            user_id (ObjectId or str): The user's unique identifier.
+            selected_restaurants (list): List of restaurant IDs selected by the user.
+            city (str): The city for the profile.
+
+        Returns:
+            dict: The created user profile document, with the derived `averages`.
+        """
+        restaurant_details = await self.restaurant_repository.find_by_ids(selected_restaurants, city, PROFILE_PROJECTION)
+        profile = build_profile(user_id, restaurant_details, city)
+        await self.user_repository.update_user(user_id, {"profile": profile})
+        return {**profile, "averages": profile_averages(profile)}
+
+    async def submit_selection(self, user_id, selected_restaurants, city):
+        """
+        Store a user's selected restaurants and create their profile from them.
+
+        The selection is stored while the selected restaurants are fetched.
+
+        Args:
+            user_id (str): The user's unique identifier.
+            selected_restaurants (list): List of restaurant IDs selected by the user.
+            city (str): The city for the profile.
+
+        Returns:
+            dict: The created user profile document, with the derived `averages`.
+        """
+        _, restaurant_details = await asyncio.gather(
+            self.user_repository.add_selected_restaurants(user_id, selected_restaurants, city),
+            self.restaurant_repository.find_by_ids(selected_restaurants, city, PROFILE_PROJECTION),
+        )
+        profile = build_profile(user_id, restaurant_details, city)
+        await self.user_repository.update_user(user_id, {"profile": profile})
+        return {**profile, "averages": profile_averages(profile)}
+
+    async def update_selection(self, user_id, city, add=(), remove=()):
+        """
+        Add restaurants to and remove restaurants from a user's selection incrementally.
+
+        All the changes are applied with a single atomic update (see UserService.update_selection).
+
+        Args:
+            user_id (str): The user's unique identifier.
+            city (str): The city of the profile.
+            add (Iterable[str]): Restaurant IDs to add.
+            remove (Iterable[str]): Restaurant IDs to remove.
+
+        Returns:
+            int: Number of restaurants added or removed.
+        """
+        add = [str(rid) for rid in add]
+        remove = [str(rid) for rid in remove]
+        restaurants = {
+            str(r["_id"]): r
+            for r in await self.restaurant_repository.find_by_ids(add + remove, city, PROFILE_PROJECTION)
+        }
+
+        updated_at = datetime.now(timezone.utc)
+        pending_add, pending_remove = selection_changes(add, remove, restaurants)
+        for _ in range(SELECTION_ATTEMPTS):
+            if not pending_add and not pending_remove:
+                return 0
+            sum_deltas, count_delta = change_deltas(pending_add, pending_remove, restaurants)
+            if await self.user_repository.update_selection(
+                user_id, pending_add, pending_remove, sum_deltas, count_delta, updated_at
+            ):
+                return len(pending_add) + len(pending_remove)
+            profile = ((await self.user_repository.get_user(user_id, {"profile": 1})) or {}).get("profile")
+            if profile is None:
+                return 0
+            if "sums" not in profile:
+                await self.create_user_profile(user_id, rebuilt_selection(profile, restaurants, remove), city)
+                return len(restaurants)
+            pending_add, pending_remove = selection_changes(
+                pending_add, pending_remove, restaurants, profile.get("selected_restaurants", [])
+            )
+        return 0
+
+async_user_service = AsyncUserService()
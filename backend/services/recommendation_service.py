@@ -0,0 +1,451 @@
+from datetime import datetime, timezone
+import numpy as np
+from bson import ObjectId
+from config.cities import city_config
+from database.repositories.user_repository import user_repository
+from database.repositories.restaurant_repository import restaurant_repository
+from utils.data_sanitizer import RESTAURANT_CLEAN_FIELDS, sanitize_data
+from utils.feature_store import feature_store
+from utils.preference_filter import preference_bits
+from utils.profile_vectors import profile_averages
+from utils.metrics import timed
+from utils.sampler import TOP_RATING, sample_row
+
+"""
+Service layer for profile-based restaurant recommendations.
+
+Scores users against their city's feature store: profiles and preferences of a whole batch
+are fetched with one `$in` query each, users are grouped by city, and each group is ranked
+with a few chunked matrix multiplies against the city matrix before the chosen restaurants
+are fetched with one `$in` query per city. Saved recommendations are restaurant IDs and scores,
+resolved into documents when the home page is rendered.
+
+Usage:
+Import and use the recommendation_engine singleton:
+    recommendation_engine.recommend(user_id, k=4)
+    recommendation_engine.recommend_many(user_ids, k=4, save=True)
+    recommendation_engine.test_restaurants(user_id)
+    recommendation_engine.saved_recommendations(user)
+"""
+
+REC_FIELD = '4_rec_restaurants'
+
+# User fields read by the test page: the profile and the precomputed recommendations with their freshness
+TEST_USER_PROJECTION = {"profile": 1, REC_FIELD: 1, "recs_computed_at": 1, "recs_data_version": 1}
+
+def _profile_city(user, preferences):
+    """
+    Return the city a user's recommendations come from.
+
+    Args:
+        user (dict): User document.
+        preferences (dict): The user's preference document.
+
+    Returns:
+        str or None: The registered city name, or None if it is missing or unknown.
+    """
+    city = user.get("profile", {}).get("city") or preferences.get("city")
+    if isinstance(city, list):
+        city = city[0] if city else None
+    return city_config.normalize(city)
+
+def restaurants_by_id(restaurants):
+    """
+    Sanitize fetched restaurant documents in place and key them by their ID.
+
+    Args:
+        restaurants (list): Restaurant documents as fetched.
+
+    Returns:
+        dict: Mapping of restaurant ID string to sanitized document with a string `_id`.
+    """
+    for restaurant in restaurants:
+        restaurant["_id"] = str(restaurant["_id"])
+    sanitize_data(restaurants, clean_fields=RESTAURANT_CLEAN_FIELDS, in_place=True)
+    return {restaurant["_id"]: restaurant for restaurant in restaurants}
+
+class RecommendationEngine:
+    def __init__(self):
+        self.user_repository = user_repository
+        self.restaurant_repository = restaurant_repository
+
+    def get_store(self, city):
+        """
+        Return the feature store of a city, loading it on first use and reloading it when the
+        city's data version changed, so rows and ids match the current restaurants.
+
+        Args:
+            city (str): City name.
+
+        Returns:
+            CityFeatureStore or None: The city's feature store, or None for an unknown city.
+        """
+        city = city_config.normalize(city)
+        if city is None:
+            return None
+        collection = self.restaurant_repository.collection(city)
+        store = feature_store.get(city, collection)
+        if store is None:
+            store = feature_store.load(city, collection)
+        return store
+
+    def candidate_rows(self, store, preferences, exclude_ids=()):
+        """
+        Return the rows matching a user's preferences, minus excluded restaurants.
+
+        Args:
+            store (CityFeatureStore): The city's feature store.
+            preferences (dict): The user's preference document.
+            exclude_ids (Iterable): Restaurant IDs to leave out (e.g. already selected).
+
+        Returns:
+            np.ndarray: Candidate row indices.
+        """
+        rows = store.filter_rows(*preference_bits(preferences))
+        excluded = store.rows_for_ids(exclude_ids)
+        return np.setdiff1d(rows, excluded) if excluded.size else rows
+
+    def fetch_restaurants(self, store, rows):
+        """
+        Fetch the sanitized documents of feature-store rows with one query.
+
+        Args:
+            store (CityFeatureStore): The city's feature store.
+            rows (Iterable[int]): Row indices to fetch.
+
+        Returns:
+            dict: Mapping of restaurant ID string to sanitized document with a string `_id`.
+        """
+        row_ids = [store.ids[row] for row in rows]
+        if not row_ids:
+            return {}
+        return restaurants_by_id(self.restaurant_repository.find_by_ids(row_ids, store.city))
+
+    @timed("recommendations.rank_many")
+    def rank_many(self, user_ids, k=4):
+        """
+        Rank the k closest restaurants to the profiles of several users, without fetching them.
+
+        Args:
+            user_ids (list): User ID strings.
+            k (int): Number of restaurants per user.
+
+        Returns:
+            tuple: (rankings, missing) where rankings maps each user ID to a (store, rows, scores)
+            tuple and missing lists the users without a profile, preferences or known city.
+
+        Raises:
+            bson.errors.InvalidId: If a user ID is not a valid ObjectId.
+        """
+        user_ids = list(dict.fromkeys(str(ObjectId(uid)) for uid in user_ids))
+        users = self.user_repository.get_users_by_ids(user_ids, {"profile": 1})
+        preferences = self.user_repository.get_preferences_by_ids(user_ids)
+        return self.rank_users(user_ids, users, preferences, k)
+
+    def rank_users(self, user_ids, users, preferences, k=4):
+        """
+        Rank the k closest restaurants to the profiles of users whose documents are already fetched.
+
+        Args:
+            user_ids (list): Distinct user ID strings.
+            users (Iterable[dict]): The users' documents, with at least their `profile`.
+            preferences (Iterable[dict]): The users' preference documents.
+            k (int): Number of restaurants per user.
+
+        Returns:
+            tuple: (rankings, missing), as returned by rank_many.
+        """
+        users = {str(user["_id"]): user for user in users}
+        preferences = {str(pref["_id"]): pref for pref in preferences}
+
+        # Group the users by city
+        groups = {}
+        missing = []
+        for uid in user_ids:
+            user = users.get(uid)
+            pref = preferences.get(uid)
+            if not user or profile_averages(user.get("profile", {})) is None or not pref:
+                missing.append(uid)
+                continue
+            city = _profile_city(user, pref)
+            if self.get_store(city) is None:
+                missing.append(uid)
+                continue
+            groups.setdefault(city, []).append(uid)
+
+        rankings = {}
+        for city, city_user_ids in groups.items():
+            store = self.get_store(city)
+            rows_list = [
+                self.candidate_rows(store, preferences[uid], users[uid]["profile"].get("selected_restaurants", []))
+                for uid in city_user_ids
+            ]
+            averages_list = [profile_averages(users[uid]["profile"]) for uid in city_user_ids]
+            ranked = store.top_k_many(averages_list, k, rows_list)
+            for uid, (rows, scores) in zip(city_user_ids, ranked):
+                rankings[uid] = (store, rows, scores)
+        return rankings, missing
+
+    def save_rankings(self, rankings):
+        """
+        Store rankings as each user's `4_rec_restaurants` restaurant IDs and scores.
+
+        The data version the city's feature store was loaded at and the computation time are
+        stored with them, so the precompute job can tell which users are stale.
+
+        Args:
+            rankings (dict): Mapping of user ID to a (store, rows, scores) tuple, as returned by rank_many.
+
+        Returns:
+            int: Number of users modified.
+        """
+        return self.user_repository.update_users(self.ranking_updates(rankings))
+
+    @staticmethod
+    def ranking_updates(rankings):
+        """
+        Build the per-user fields that save_rankings stores.
+
+        Args:
+            rankings (dict): Mapping of user ID to a (store, rows, scores) tuple, as returned by rank_many.
+
+        Returns:
+            dict: Mapping of user ID string to the fields to set.
+        """
+        computed_at = datetime.now(timezone.utc)
+        updates = {}
+        for uid, (store, rows, scores) in rankings.items():
+            updates[uid] = {
+                REC_FIELD: [
+                    {"_id": store.ids[row], "score": round(float(score), 6)}
+                    for row, score in zip(rows, scores)
+                ],
+                "recs_computed_at": computed_at,
+                "recs_data_version": store.version,
+            }
+        return updates
+
+    def recommend_many(self, user_ids, k=4, save=False):
+        """
+        Recommend the k closest restaurants to the profiles of several users.
+
+        Args:
+            user_ids (list): User ID strings.
+            k (int): Number of restaurants per user.
+            save (bool): Store the restaurant IDs and scores as each user's `4_rec_restaurants`.
+
+        Returns:
+            tuple: (recommendations, missing) where recommendations maps each user ID to its
+            ranked restaurant documents and missing lists the users without a profile,
+            preferences or known city.
+
+        Raises:
+            bson.errors.InvalidId: If a user ID is not a valid ObjectId.
+        """
+        rankings, missing = self.rank_many(user_ids, k)
+        if save:
+            self.save_rankings(rankings)
+
+        # Fetch the restaurants of each city's users with one query
+        restaurants = {}
+        for store, rows in self.rows_by_city(rankings):
+            restaurants.update(self.fetch_restaurants(store, rows))
+        return self.resolve_rankings(rankings, restaurants), missing
+
+    @staticmethod
+    def rows_by_city(rankings):
+        """
+        Collect the distinct ranked rows of each city.
+
+        Args:
+            rankings (dict): Mapping of user ID to a (store, rows, scores) tuple, as returned by rank_many.
+
+        Returns:
+            list: (store, rows) tuples, one per city.
+        """
+        by_city = {}
+        for store, rows, _ in rankings.values():
+            by_city.setdefault(store.city, (store, []))[1].append(rows)
+        return [(store, np.unique(np.concatenate(rows_list))) for store, rows_list in by_city.values()]
+
+    @staticmethod
+    def resolve_rankings(rankings, restaurants):
+        """
+        Replace the ranked rows of each user with the fetched restaurant documents.
+
+        Args:
+            rankings (dict): Mapping of user ID to a (store, rows, scores) tuple, as returned by rank_many.
+            restaurants (dict): Mapping of restaurant ID string to document.
+
+        Returns:
+            dict: Mapping of user ID to its ranked restaurant documents.
+        """
+        recommendations = {}
+        for uid, (store, rows, scores) in rankings.items():
+            recommendations[uid] = [
+                restaurants[store.ids[row]] for row in rows if store.ids[row] in restaurants
+            ]
+        return recommendations
+
+    def recommend(self, user_id, k=4, save=False):
+        """
+        Recommend the k closest restaurants to one user's profile.
+
+        Args:
+            user_id (str): The user ID.
+            k (int): Number of restaurants.
+            save (bool): Store the restaurant IDs and scores as the user's `4_rec_restaurants`.
+
+        Returns:
+            list or None: Ranked restaurant documents, or None if the user has no profile,
+            preferences or known city.
+        """
+        recommendations, _ = self.recommend_many([user_id], k, save)
+        return recommendations.get(str(user_id))
+
+    @staticmethod
+    def pick_test_rows(store, rows, selected_ids):
+        """
+        Pick the test page rows: the 2 closest to the profile, a random one and a 5-star one.
+
+        The random and 5-star rows are sampled from the in-memory id arrays, leaving out the
+        rows already picked and the restaurants the user selected.
+
+        Args:
+            store (CityFeatureStore): The city's feature store.
+            rows (np.ndarray): The user's ranked rows, closest first.
+            selected_ids (Iterable): IDs of the restaurants the user selected.
+
+        Returns:
+            list: Row indices in that order, without the picks that are not available.
+        """
+        picks = [int(row) for row in rows[:2]]
+        excluded_rows = np.union1d(picks, store.rows_for_ids(selected_ids))
+        random_row = sample_row(store, excluded_rows)
+        if random_row is not None:
+            picks.append(random_row)
+            excluded_rows = np.append(excluded_rows, random_row)
+        top_rated_row = sample_row(store, excluded_rows, rating=TOP_RATING)
+        if top_rated_row is not None:
+            picks.append(top_rated_row)
+        return picks
+
+    def saved_rows(self, user):
+        """
+        Return the feature-store rows of a user's precomputed recommendations if they are current.
+
+        They are current if they were computed against the city's current data version and
+        after the user's profile was last updated, the same criteria the precompute job uses.
+
+        Args:
+            user (dict): User document with its profile and `4_rec_restaurants`,
+                `recs_computed_at` and `recs_data_version` fields.
+
+        Returns:
+            tuple or None: (store, rows) with the rows closest first, or None if the
+            recommendations must be recomputed.
+        """
+        saved = user.get(REC_FIELD) or []
+        profile = user.get("profile", {})
+        city = profile.get("city")
+        computed_at = user.get("recs_computed_at")
+        if not self.saved_as_ids(saved, city) or computed_at is None:
+            return None
+        if profile.get("updated_at") is not None and profile["updated_at"] > computed_at:
+            return None
+        store = self.get_store(city)
+        if store is None or user.get("recs_data_version") != store.version:
+            return None
+        rows = store.rows_for_ids([entry["_id"] for entry in saved])
+        return (store, rows) if len(rows) == len(saved) else None
+
+    def test_restaurants(self, user_id, k=4):
+        """
+        Pick the test page restaurants of a user from their k closest restaurants.
+
+        The user's precomputed recommendations are used while they are current (see
+        saved_rows); otherwise the user is ranked and the k closest are saved as their
+        recommendations. The picks (see pick_test_rows) are fetched with one query.
+
+        Args:
+            user_id (str): The user ID.
+            k (int): Number of recommendations to save.
+
+        Returns:
+            list or None: The picked restaurant documents in order, or None if the user has
+            no profile.
+
+        Raises:
+            bson.errors.InvalidId: If the user ID is not a valid ObjectId.
+            ValueError: If the user has no preferences, profile averages or known city.
+        """
+        user_id = str(ObjectId(user_id))
+        user = self.user_repository.get_user(user_id, TEST_USER_PROJECTION)
+        if not user or "profile" not in user:
+            return None
+        saved = self.saved_rows(user)
+        if saved is not None:
+            store, rows = saved
+        else:
+            preferences = self.user_repository.get_user_preferences(user_id)
+            rankings, _ = self.rank_users([user_id], [user], [preferences] if preferences else [], k)
+            if user_id not in rankings:
+                raise ValueError("User preferences not found.")
+            store, rows, _ = rankings[user_id]
+            self.save_rankings(rankings)
+        picks = self.pick_test_rows(store, rows, user["profile"].get("selected_restaurants", []))
+        restaurants = self.fetch_restaurants(store, picks)
+        return [restaurants[store.ids[row]] for row in picks if store.ids[row] in restaurants]
+
+    def saved_recommendations(self, user):
+        """
+        Resolve a user's precomputed `4_rec_restaurants` into restaurant documents.
+
+        Args:
+            user (dict): User document.
+
+        Returns:
+            list: Sanitized restaurant documents in ranking order, each with its `score`.
+            Entries saved as whole documents by older versions are returned as they are.
+        """
+        saved = user.get(REC_FIELD) or []
+        city = user.get("profile", {}).get("city")
+        if not self.saved_as_ids(saved, city):
+            return sanitize_data(saved)
+        restaurants = self.restaurant_repository.find_by_ids([entry["_id"] for entry in saved], city)
+        return self.resolve_saved(saved, restaurants)
+
+    def saved_as_ids(self, saved, city):
+        """
+        Tell whether saved recommendations are restaurant IDs to resolve in a known city.
+
+        Args:
+            saved (list): The user's `4_rec_restaurants` entries.
+            city (str): The city of the user's profile.
+
+        Returns:
+            bool: False if there is nothing to resolve.
+        """
+        return bool(saved) and "restaurant_name" not in saved[0] and self.restaurant_repository.collection(city) is not None
+
+    @staticmethod
+    def resolve_saved(saved, restaurants):
+        """
+        Combine saved recommendation entries with their fetched restaurant documents.
+
+        Args:
+            saved (list): The user's `4_rec_restaurants` entries.
+            restaurants (Iterable[dict]): The fetched restaurant documents.
+
+        Returns:
+            list: Sanitized restaurant documents in ranking order, each with its `score`.
+        """
+        restaurants = {str(restaurant["_id"]): restaurant for restaurant in restaurants}
+        resolved = []
+        for entry in saved:
+            restaurant = restaurants.get(entry["_id"])
+            if restaurant is not None:
+                resolved.append({**restaurant, "_id": entry["_id"], "score": entry.get("score")})
+        return sanitize_data(resolved, clean_fields=RESTAURANT_CLEAN_FIELDS, in_place=True)
+
+recommendation_engine = RecommendationEngine()
@@ -1,5 +1,5 @@
 from utils.clustering import select_top_restaurants
-from utils.data_sanitizer import sanitize_data
+from utils.data_sanitizer import RESTAURANT_CLEAN_FIELDS, sanitize_data
 
 """
 Service layer for restaurant-related business logic.
@@ -11,7 +11,7 @@ Import and use the restaurant_service singleton for restaurant operations.
 """
 
 class RestaurantService:
-    def get_top_restaurants(self, city, chosen_types, chosen_diets, chosen_features, rating_rank_dict):
+    def get_top_restaurants(self, city, chosen_types, chosen_diets, chosen_features, rating_rank_dict, projection=None):
         """
         Retrieve the top restaurants for a city based on user-selected types, diets, features, and ranking priorities.
 
@@ -21,6 +21,7 @@ class RestaurantService:
             chosen_diets (list): List of dietary preferences selected by the user.
             chosen_features (list): List of additional features selected by the user.
             rating_rank_dict (dict): Dictionary of rating priorities.
+            projection (dict, optional): Projection limiting the returned restaurant fields.
 
         Returns:
             list: Sanitized list of top restaurant documents.
@@ -30,8 +31,10 @@ class RestaurantService:
             chosen_types,
             chosen_diets,
             chosen_features,
-            rating_rank_dict
+            rating_rank_dict,
+            projection
         )
-        return sanitize_data(top_restaurants_df)
+        # The documents are shared with the combination cache, so they are copied, not sanitized in place
+        return sanitize_data(top_restaurants_df, clean_fields=RESTAURANT_CLEAN_FIELDS)
 
 restaurant_service = RestaurantService() 
\ No newline at end of file
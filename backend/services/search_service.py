@@ -0,0 +1,99 @@
+import logging
+from pymongo.errors import PyMongoError
+from database.repositories.restaurant_repository import restaurant_repository
+from utils.data_version import get_data_version
+from utils.search_index import NameSearchIndex, search_backend
+
+"""
+Service layer for restaurant name search.
+
+The default `memory` backend answers from a per-city NameSearchIndex (accent-folded token
+and whole-name prefix lookup), built on the first search of a city and rebuilt when the
+city's data version changes, then fetches the matching documents by ID. The optional `text`
+backend uses a MongoDB text index on `restaurant_name` instead (whole, stemmed words rather
+than prefixes, ranked by text score); select it with SEARCH_BACKEND=text, which also makes
+ensure_indexes create the text indexes.
+
+Usage:
+Import and use the search_service singleton:
+    search_service.search("Rome", "trat", limit=10)
+"""
+
+logger = logging.getLogger(__name__)
+
+class SearchService:
+    def __init__(self):
+        self.restaurant_repository = restaurant_repository
+        self._indexes = {}
+
+    def get_index(self, city):
+        """
+        Return the name index of a city, building it on first use or after a data change.
+
+        Args:
+            city (str): City name.
+
+        Returns:
+            NameSearchIndex or None: The index, or None for an unknown city.
+        """
+        collection = self.restaurant_repository.collection(city)
+        if collection is None:
+            return None
+        version = get_data_version(collection.database, city)
+        index = self._indexes.get(city)
+        if index is None or index.version != version:
+            index = NameSearchIndex.from_collection(city, collection)
+            index.version = version
+            self._indexes[city] = index
+        return index
+
+    def search(self, city, query, limit=10, projection=None):
+        """
+        Search a city's restaurants by name.
+
+        Args:
+            city (str): City name.
+            query (str): The text typed by the user.
+            limit (int): Maximum number of restaurants.
+            projection (dict, optional): Projection limiting the returned fields.
+
+        Returns:
+            list: Restaurant documents with string `_id`s, best match first.
+
+        Raises:
+            ValueError: If the city is unknown.
+        """
+        self.restaurant_repository.require_collection(city)
+        if search_backend() == "text":
+            restaurants = self._search_text(city, query, limit, projection)
+        else:
+            ids = self.get_index(city).search(query, limit)
+            if not ids:
+                return []
+            restaurants = self.restaurant_repository.find_many_by_ids(ids, city, projection)
+        for restaurant in restaurants:
+            restaurant["_id"] = str(restaurant["_id"])
+        return restaurants
+
+    def _search_text(self, city, query, limit, projection):
+        if not query.strip():
+            return []
+        try:
+            return self.restaurant_repository.search_text(city, query, limit, projection)
+        except PyMongoError as e:
+            logger.error("Error running text search for city %s: %s", city, e)
+            return []
+
+    def clear(self, city=None):
+        """
+        Drop the built index of a city, or of all cities.
+
+        Args:
+            city (str, optional): City name. Clears every city if omitted.
+        """
+        if city is None:
+            self._indexes.clear()
+        else:
+            self._indexes.pop(city, None)
+
+search_service = SearchService()
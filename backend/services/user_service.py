@@ -1,16 +1,101 @@
-from bson import ObjectId
+from datetime import datetime, timezone
 from database.repositories.user_repository import user_repository
 from database.repositories.restaurant_repository import restaurant_repository
+from utils.profile_vectors import PROFILE_COLUMNS, profile_averages, profile_sums, selection_deltas
 
 """
 Service layer for user-related business logic.
 
-Provides methods to create user profiles, save preferences, and retrieve preferences.
+Provides methods to create user profiles, update their selections incrementally, save
+preferences, and retrieve preferences.
 
 Usage:
 Import and use the user_service singleton for user operations.
 """
 
+# Only the feature columns are read from the selected restaurants
+PROFILE_PROJECTION = {col: 1 for col in PROFILE_COLUMNS}
+
+# Selection updates tried before giving up on a profile that keeps changing concurrently
+SELECTION_ATTEMPTS = 3
+
+def build_profile(user_id, restaurant_details, city):
+    """
+    Build a profile document from the fetched selected restaurants.
+
+    Args:
+        user_id (ObjectId or str): The user's unique identifier.
+        restaurant_details (list): The selected restaurants, with at least the profile columns.
+        city (str): The city for the profile.
+
+    Returns:
+        dict: The profile, with the running sums and count of the restaurants' features.
+    """
+    sums, count = profile_sums(restaurant_details)
+    return {
+        "user_id": str(user_id),
+        "city": city,
+        "selected_restaurants": [str(r["_id"]) for r in restaurant_details],
+        "sums": sums,
+        "count": count,
+        # Marks the precomputed recommendations as stale (see utils.precompute_recommendations)
+        "updated_at": datetime.now(timezone.utc),
+    }
+
+def selection_changes(add, remove, restaurants, selected=None):
+    """
+    Return the selection changes to apply to a profile.
+
+    Args:
+        add (Iterable[str]): Restaurant IDs to add.
+        remove (Iterable[str]): Restaurant IDs to remove.
+        restaurants (dict): The fetched restaurants, keyed by ID; other IDs are skipped.
+        selected (Iterable[str], optional): The profile's current selection, to skip the
+            changes already applied.
+
+    Returns:
+        tuple: (add, remove) as distinct IDs; an ID both added and removed is left out.
+    """
+    add = [rid for rid in dict.fromkeys(add) if rid in restaurants]
+    remove = [rid for rid in dict.fromkeys(remove) if rid in restaurants]
+    both = set(add) & set(remove)
+    add = [rid for rid in add if rid not in both]
+    remove = [rid for rid in remove if rid not in both]
+    if selected is not None:
+        selected = set(selected)
+        add = [rid for rid in add if rid not in selected]
+        remove = [rid for rid in remove if rid in selected]
+    return add, remove
+
+def change_deltas(add, remove, restaurants):
+    """
+    Return the change of a profile's sums and count for selection changes (see selection_deltas).
+
+    Args:
+        add (list): Restaurant IDs to add.
+        remove (list): Restaurant IDs to remove.
+        restaurants (dict): The fetched restaurants, keyed by ID.
+
+    Returns:
+        tuple: (sum deltas, count delta).
+    """
+    return selection_deltas([restaurants[rid] for rid in add], [restaurants[rid] for rid in remove])
+
+def rebuilt_selection(profile, restaurants, remove):
+    """
+    Return the selection to rebuild a profile without running sums from.
+
+    Args:
+        profile (dict): The stored profile.
+        restaurants (dict): The fetched restaurants being added or removed, keyed by ID.
+        remove (list): Restaurant IDs being removed.
+
+    Returns:
+        list: Restaurant IDs of the new selection.
+    """
+    selected = set(profile.get("selected_restaurants", [])) | set(restaurants)
+    return list(selected - set(remove))
+
 class UserService:
     def __init__(self):
         self.user_repository = user_repository
@@ -18,7 +103,11 @@ class UserService:
 
     def create_user_profile(self, user_id, selected_restaurants, city):
         """
-        Create a user profile based on the selected restaurants.
+        Create (or fully rebuild) a user profile based on the selected restaurants.
+
+        The profile stores the running per-feature sums of the selected restaurants and
+        their count, computed in one vectorized pass, so later selection changes can be
+        applied incrementally with update_selection.
 
         Args:
             user_id (ObjectId or str): The user's unique identifier.
@@ -26,48 +115,58 @@ class UserService:
             city (str): The city for the profile.
 
         Returns:
-            dict: The created user profile document.
+            dict: The created user profile document, with the derived `averages`.
         """
-        user_id_str = str(user_id)
-
-        restaurant_details = self.restaurant_repository.find_by_ids(selected_restaurants, city)
-
-        normalized_rating_fields = [
-            "food_rating_norm", "service_rating_norm",
-            "value_rating_norm", "atmosphere_rating_norm",
-        ]
-        binary_fields = []
-        if restaurant_details:
-            binary_fields = [key for key in restaurant_details[0] if key.startswith("is_")]
-
-        field_totals = {field: 0 for field in normalized_rating_fields + binary_fields}
-        restaurant_count = len(restaurant_details)
-
-        for restaurant in restaurant_details:
-            for field in normalized_rating_fields:
-                field_totals[field] += restaurant.get(field, 0)
-            for field in binary_fields:
-                field_totals[field] += int(restaurant.get(field, 0))
-
-        averages = {}
-        if restaurant_count > 0:
-            averages = {
-                field: round(field_totals[field] / restaurant_count, 3)
-                for field in normalized_rating_fields + binary_fields
-            }
-        else:
-            for field in normalized_rating_fields + binary_fields:
-                averages[field] = 0.0
-
-        profile = {
-            "user_id": user_id_str,
-            "city": city,
-            "selected_restaurants": [str(r["_id"]) for r in restaurant_details],
-            "averages": averages,
+        restaurant_details = self.restaurant_repository.find_by_ids(selected_restaurants, city, PROFILE_PROJECTION)
+        profile = build_profile(user_id, restaurant_details, city)
+        self.user_repository.update_user(user_id, {"profile": profile})
+        return {**profile, "averages": profile_averages(profile)}
+
+    def update_selection(self, user_id, city, add=(), remove=()):
+        """
+        Add restaurants to and remove restaurants from a user's selection incrementally.
+
+        The deltas of all the changes are summed and applied with a single atomic update of
+        the profile's selection, running sums and count (see selection_update), with no
+        read-modify-write of the profile. If the update does not apply, the profile is read:
+        changes already applied (e.g. by a repeated request) are dropped and the rest is
+        retried, and profiles created before running sums were stored are rebuilt instead.
+
+        Args:
+            user_id (str): The user's unique identifier.
+            city (str): The city of the profile.
+            add (Iterable[str]): Restaurant IDs to add.
+            remove (Iterable[str]): Restaurant IDs to remove.
+
+        Returns:
+            int: Number of restaurants added or removed.
+        """
+        add = [str(rid) for rid in add]
+        remove = [str(rid) for rid in remove]
+        restaurants = {
+            str(r["_id"]): r for r in self.restaurant_repository.find_by_ids(add + remove, city, PROFILE_PROJECTION)
         }
 
-        self.user_repository.update_user(user_id, {"profile": profile})
-        return profile
+        updated_at = datetime.now(timezone.utc)
+        pending_add, pending_remove = selection_changes(add, remove, restaurants)
+        for _ in range(SELECTION_ATTEMPTS):
+            if not pending_add and not pending_remove:
+                return 0
+            sum_deltas, count_delta = change_deltas(pending_add, pending_remove, restaurants)
+            if self.user_repository.update_selection(
+                user_id, pending_add, pending_remove, sum_deltas, count_delta, updated_at
+            ):
+                return len(pending_add) + len(pending_remove)
+            profile = (self.user_repository.get_user(user_id, {"profile": 1}) or {}).get("profile")
+            if profile is None:
+                return 0
+            if "sums" not in profile:
+                self.create_user_profile(user_id, rebuilt_selection(profile, restaurants, remove), city)
+                return len(restaurants)
+            pending_add, pending_remove = selection_changes(
+                pending_add, pending_remove, restaurants, profile.get("selected_restaurants", [])
+            )
+        return 0
 
     def save_user_preferences(self, data):
         """
@@ -1,66 +1,308 @@
+from datetime import timezone
+import click
+import numpy as np
+from bson import ObjectId
+from pymongo import UpdateOne
+from config.cities import city_config
+from database.connection import db_connection
+
 """
-Script to calculate and evaluate user rating results for restaurant recommendations.
+Evaluation of the user ratings of the test recommendations.
+
+Each `user_ratings` document ranks the restaurants a user was shown: the two of our
+recommendations ('ours'), a random one and a highly rated one. For every rating, an
+aggregation pipeline extracts the 'ours' ranks and the random and highly rated ranks
+server-side, and the results are streamed in fixed-size batches into preallocated NumPy
+arrays (the median of the 'ours' ranks is taken per batch), so only a few numbers per user
+are held in memory. The averages are reported overall or per city, optionally for a date
+range, with bootstrap confidence intervals computed on resampled index matrices.
 
-Connects to MongoDB, aggregates user rating statistics, and prints evaluation metrics.
+Ratings store their city and creation time since they are submitted with them; older
+ratings get their city from the user's profile with --backfill, and are dated by their
+ObjectId.
 
 Usage:
-Run as a standalone script to print evaluation results.
+    flask evaluate [--city Rome] [--by-city] [--start 2025-01-01] [--end 2025-02-01] [--bootstrap 1000]
+    python -m utils.calculate_results [same options]
 """
-from pymongo import MongoClient
-import numpy as np
 
-# Connect to MongoDB
-client = MongoClient("mongodb://localhost:27017/")
-db = client['restaurant_db']
-collection = db['user_ratings']
-
-# Retrieve all user ratings
-data = collection.find()
-
-# Initialize lists for rankings
-median_ours_list = []
-average_random_list = []
-average_highly_rated_list = []
-
-# Counter for the number of users
-num_users = 0
-
-# Process each user's ratings
-for entry in data:
-    rated_restaurants = entry['rated_restaurants']
-
-    # Extract ranks based on categories
-    ours_ranks = [r['rank'] for r in rated_restaurants if r['category'] == 'ours']
-    random_rank = next(r['rank'] for r in rated_restaurants if r['category'] == 'random')
-    highly_rated_rank = next(r['rank'] for r in rated_restaurants if r['category'] == 'highly rated')
-
-    # Calculate median of 'ours' rankings
-    median_ours = np.median(ours_ranks)
-    median_ours_list.append(median_ours)
-
-    # Add random and highly rated ranks to respective lists
-    average_random_list.append(random_rank)
-    average_highly_rated_list.append(highly_rated_rank)
-
-    # Increment user counter
-    num_users += 1
-
-# Calculate results
-average_of_median_ours = np.mean(median_ours_list)
-average_random = np.mean(average_random_list)
-average_highly_rated = np.mean(average_highly_rated_list)
-
-# Display the results
-print("Results:")
-print(f"Number of Users: {num_users}")
-print(f"Average of Median Rankings (Ours): {average_of_median_ours:.2f}")
-print(f"Average Rankings (Random): {average_random:.2f}")
-print(f"Average Rankings (Highly Rated): {average_highly_rated:.2f}")
-
-# Determine success levels
-partial_success = average_of_median_ours < average_random
-complete_success = average_of_median_ours < average_random and average_of_median_ours < average_highly_rated
-
-print("\nEvaluation:")
-print(f"Partial Success: {'Yes' if partial_success else 'No'}")
-print(f"Complete Success: {'Yes' if complete_success else 'No'}")
\ No newline at end of file
+RATINGS_COLLECTION = 'user_ratings'
+
+OURS = 'ours'
+RANDOM = 'random'
+HIGHLY_RATED = 'highly rated'
+
+UNKNOWN_CITY = 'Unknown'
+
+def _ranks_of(category):
+    return {"$map": {
+        "input": {"$filter": {"input": "$rated_restaurants", "as": "r", "cond": {"$eq": ["$$r.category", category]}}},
+        "as": "r",
+        "in": "$$r.rank",
+    }}
+
+def ratings_query(city=None, start=None, end=None):
+    """
+    Build the query selecting the ratings of a city and date range.
+
+    Args:
+        city (str, optional): City name as stored on the ratings.
+        start (datetime, optional): Earliest submission time (inclusive, UTC if naive).
+        end (datetime, optional): Latest submission time (exclusive, UTC if naive).
+
+    Returns:
+        dict: The MongoDB query.
+    """
+    query = {}
+    if city:
+        query["city"] = city
+    # The ObjectId embeds the insertion time, so legacy ratings without created_at are dated too
+    if start or end:
+        query["_id"] = {}
+        if start:
+            query["_id"]["$gte"] = ObjectId.from_datetime(start)
+        if end:
+            query["_id"]["$lt"] = ObjectId.from_datetime(end)
+    return query
+
+def ranks_pipeline(query):
+    """
+    Build the aggregation pipeline extracting the ranks of each rating.
+
+    Args:
+        query (dict): Query selecting the ratings (see ratings_query).
+
+    Returns:
+        list: Pipeline producing {city, ours, random, highly_rated} per complete rating.
+    """
+    return [
+        {"$match": query},
+        {"$project": {
+            "_id": 0,
+            "city": {"$ifNull": ["$city", UNKNOWN_CITY]},
+            "ours": _ranks_of(OURS),
+            "random": {"$arrayElemAt": [_ranks_of(RANDOM), 0]},
+            "highly_rated": {"$arrayElemAt": [_ranks_of(HIGHLY_RATED), 0]},
+        }},
+        # Ratings missing a category cannot be compared
+        {"$match": {"ours.0": {"$exists": True}, "random": {"$ne": None}, "highly_rated": {"$ne": None}}},
+    ]
+
+def load_ranks(collection, query, batch_size=10000):
+    """
+    Stream the ranks of the selected ratings into NumPy arrays.
+
+    Args:
+        collection (Collection): The user ratings collection.
+        query (dict): Query selecting the ratings (see ratings_query).
+        batch_size (int): Ratings fetched and converted per batch.
+
+    Returns:
+        tuple: (ranks, cities, city_names) where ranks is a float64 array of shape (n, 3)
+        holding each rating's median 'ours' rank, random rank and highly rated rank, cities
+        an int32 array of city codes and city_names the names indexed by code.
+    """
+    capacity = collection.count_documents(query)
+    ranks = np.empty((capacity, 3), dtype=np.float64)
+    cities = np.empty(capacity, dtype=np.int32)
+    city_codes = {}
+    filled = 0
+
+    cursor = collection.aggregate(ranks_pipeline(query), allowDiskUse=True, batchSize=batch_size)
+    batch = []
+    for record in cursor:
+        batch.append(record)
+        if len(batch) == batch_size:
+            filled = _fill_batch(batch, ranks, cities, city_codes, filled)
+            batch = []
+    if batch:
+        filled = _fill_batch(batch, ranks, cities, city_codes, filled)
+
+    city_names = sorted(city_codes, key=city_codes.get)
+    return ranks[:filled], cities[:filled], city_names
+
+def _fill_batch(batch, ranks, cities, city_codes, offset):
+    # Ratings inserted after the count was taken are left for the next run
+    batch = batch[:len(ranks) - offset]
+    if not batch:
+        return offset
+    width = max(len(record["ours"]) for record in batch)
+    ours = np.full((len(batch), width), np.nan)
+    for i, record in enumerate(batch):
+        ours[i, :len(record["ours"])] = record["ours"]
+    end = offset + len(batch)
+    ranks[offset:end, 0] = np.nanmedian(ours, axis=1)
+    ranks[offset:end, 1] = [record["random"] for record in batch]
+    ranks[offset:end, 2] = [record["highly_rated"] for record in batch]
+    cities[offset:end] = [city_codes.setdefault(record["city"], len(city_codes)) for record in batch]
+    return end
+
+def bootstrap_means(values, n_bootstrap=1000, confidence=0.95, seed=0, max_cells=10_000_000):
+    """
+    Compute bootstrap confidence intervals of column means.
+
+    Resamples are drawn as index matrices, in chunks of at most max_cells indices, and each
+    column is averaged with one contiguous gather per chunk.
+
+    Args:
+        values (np.ndarray): Array of shape (n, columns).
+        n_bootstrap (int): Number of resamples.
+        confidence (float): Confidence level of the intervals.
+        seed (int): Random seed.
+        max_cells (int): Maximum number of indices drawn at once.
+
+    Returns:
+        np.ndarray: Array of shape (columns, 2) with the lower and upper bounds.
+    """
+    n = len(values)
+    if not n or n_bootstrap <= 0:
+        return np.full((values.shape[1], 2), np.nan)
+    rng = np.random.default_rng(seed)
+    columns = np.ascontiguousarray(values.T)
+    means = np.empty((n_bootstrap, len(columns)))
+    chunk = max(1, max_cells // n)
+    for start in range(0, n_bootstrap, chunk):
+        stop = min(start + chunk, n_bootstrap)
+        indices = rng.integers(n, size=(stop - start, n), dtype=np.int64 if n > 2**31 - 1 else np.int32)
+        for j, column in enumerate(columns):
+            means[start:stop, j] = np.take(column, indices).mean(axis=1)
+    tail = (1 - confidence) / 2 * 100
+    return np.percentile(means, [tail, 100 - tail], axis=0).T
+
+def summarize(ranks, n_bootstrap=1000, seed=0):
+    """
+    Summarize the ranks of a group of ratings.
+
+    Args:
+        ranks (np.ndarray): Array of shape (n, 3) as returned by load_ranks.
+        n_bootstrap (int): Number of bootstrap resamples (0 to skip the intervals).
+        seed (int): Random seed.
+
+    Returns:
+        dict: Number of users, the three average ranks with their confidence intervals,
+        the confidence intervals of the differences of ours to random and to highly rated,
+        and the partial and complete success flags.
+    """
+    ours, random, highly_rated = ranks.mean(axis=0) if len(ranks) else (np.nan,) * 3
+    # Columns: ours, random, highly rated, ours - random, ours - highly rated
+    columns = np.column_stack([ranks, ranks[:, 0] - ranks[:, 1], ranks[:, 0] - ranks[:, 2]])
+    intervals = bootstrap_means(columns, n_bootstrap, seed=seed).tolist()
+    return {
+        'users': len(ranks),
+        'ours': ours,
+        'random': random,
+        'highly_rated': highly_rated,
+        'ci': dict(zip(['ours', 'random', 'highly_rated', 'ours_minus_random', 'ours_minus_highly_rated'], intervals)),
+        'partial_success': bool(ours < random),
+        'complete_success': bool(ours < random and ours < highly_rated),
+    }
+
+def evaluate(db=None, city=None, start=None, end=None, by_city=False, n_bootstrap=1000, batch_size=10000, seed=0):
+    """
+    Evaluate the user ratings, overall or per city.
+
+    Args:
+        db (Database, optional): The MongoDB database object. Defaults to the app's database.
+        city (str, optional): Only evaluate this city's ratings.
+        start (datetime, optional): Earliest submission time (inclusive).
+        end (datetime, optional): Latest submission time (exclusive).
+        by_city (bool): Also summarize each city separately.
+        n_bootstrap (int): Number of bootstrap resamples (0 to skip the intervals).
+        batch_size (int): Ratings streamed per batch.
+        seed (int): Random seed of the bootstrap.
+
+    Returns:
+        dict: Mapping of 'All' (and each city with by_city) to its summarize result.
+    """
+    db = db if db is not None else db_connection.get_db()
+    ranks, cities, city_names = load_ranks(db[RATINGS_COLLECTION], ratings_query(city, start, end), batch_size)
+    results = {'All': summarize(ranks, n_bootstrap, seed)}
+    if by_city:
+        for code, name in enumerate(city_names):
+            results[name] = summarize(ranks[cities == code], n_bootstrap, seed)
+    return results
+
+def backfill_rating_cities(db=None, batch_size=1000):
+    """
+    Store the city of the ratings submitted before ratings recorded it, from the users' profiles.
+
+    Args:
+        db (Database, optional): The MongoDB database object. Defaults to the app's database.
+        batch_size (int): Ratings updated per bulk write.
+
+    Returns:
+        int: Number of ratings updated.
+    """
+    db = db if db is not None else db_connection.get_db()
+    collection = db[RATINGS_COLLECTION]
+    cursor = collection.find({"city": {"$exists": False}}, {"user_id": 1})
+    updated = 0
+    batch = []
+    for rating in cursor:
+        batch.append(rating)
+        if len(batch) == batch_size:
+            updated += _backfill_batch(db, collection, batch)
+            batch = []
+    if batch:
+        updated += _backfill_batch(db, collection, batch)
+    return updated
+
+def _backfill_batch(db, collection, batch):
+    user_ids = {rating.get("user_id") for rating in batch if ObjectId.is_valid(rating.get("user_id"))}
+    users = db["users"].find({"_id": {"$in": [ObjectId(uid) for uid in user_ids]}}, {"profile.city": 1})
+    cities = {str(user["_id"]): user.get("profile", {}).get("city") for user in users}
+    operations = [
+        UpdateOne({"_id": rating["_id"]}, {"$set": {"city": cities.get(rating.get("user_id")) or UNKNOWN_CITY}})
+        for rating in batch
+    ]
+    return collection.bulk_write(operations, ordered=False).modified_count
+
+def print_results(results):
+    """
+    Print evaluation results as returned by evaluate.
+
+    Args:
+        results (dict): Mapping of group name to summary.
+    """
+    for name, summary in results.items():
+        ci = summary['ci']
+        print(f"Results ({name}):")
+        print(f"Number of Users: {summary['users']}")
+        print(f"Average of Median Rankings (Ours): {summary['ours']:.2f} [{ci['ours'][0]:.2f}, {ci['ours'][1]:.2f}]")
+        print(f"Average Rankings (Random): {summary['random']:.2f} [{ci['random'][0]:.2f}, {ci['random'][1]:.2f}]")
+        print(f"Average Rankings (Highly Rated): {summary['highly_rated']:.2f} "
+              f"[{ci['highly_rated'][0]:.2f}, {ci['highly_rated'][1]:.2f}]")
+        print(f"Ours - Random: [{ci['ours_minus_random'][0]:.2f}, {ci['ours_minus_random'][1]:.2f}]")
+        print(f"Ours - Highly Rated: [{ci['ours_minus_highly_rated'][0]:.2f}, {ci['ours_minus_highly_rated'][1]:.2f}]")
+        print("Evaluation:")
+        print(f"Partial Success: {'Yes' if summary['partial_success'] else 'No'}")
+        print(f"Complete Success: {'Yes' if summary['complete_success'] else 'No'}")
+        print()
+
+@click.command('evaluate')
+@click.option('--city', default=None, help='Only evaluate this city.')
+@click.option('--by-city', is_flag=True, help='Also report each city separately.')
+@click.option('--start', type=click.DateTime(), default=None, help='Earliest submission date (UTC).')
+@click.option('--end', type=click.DateTime(), default=None, help='Submission date to stop before (UTC).')
+@click.option('--bootstrap', 'n_bootstrap', default=1000, show_default=True, help='Bootstrap resamples (0 to skip).')
+@click.option('--batch-size', default=10000, show_default=True, help='Ratings streamed per batch.')
+@click.option('--backfill', is_flag=True, help="First store the city of older ratings from the users' profiles.")
+def evaluate_command(city, by_city, start, end, n_bootstrap, batch_size, backfill):
+    """Evaluate the user ratings of the test recommendations."""
+    if city is not None and city_config.normalize(city) is None:
+        raise click.BadParameter(f"Unknown city: {city}", param_hint="'--city'")
+    if backfill:
+        print(f"Backfilled the city of {backfill_rating_cities()} ratings")
+    start = start.replace(tzinfo=timezone.utc) if start else None
+    end = end.replace(tzinfo=timezone.utc) if end else None
+    print_results(evaluate(
+        city=city_config.normalize(city) if city else None,
+        start=start,
+        end=end,
+        by_city=by_city,
+        n_bootstrap=n_bootstrap,
+        batch_size=batch_size,
+    ))
+
+if __name__ == '__main__':
+    evaluate_command()
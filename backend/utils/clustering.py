@@ -1,9 +1,19 @@
-from utils.data_sanitizer import sanitize_data
-from database.connection import db_connection
-import ast
+import logging
+import os
+from database.repositories.restaurant_repository import restaurant_repository
+from utils.literal_parser import parse_list
+from utils.metrics import timed
+from utils.ttl_cache import TTLCache
 
-# MongoDB setup
-db = db_connection.get_db()
+logger = logging.getLogger(__name__)
+
+# Resolved restaurant lists per (city, combination, projection, data versions). The key holds
+# the city's restaurant and combinations versions, so every process stops serving entries
+# once an ingest bumps either of them; older entries are then evicted as unused.
+combination_cache = TTLCache(
+    maxsize=int(os.getenv('COMBINATION_CACHE_SIZE', '2048')),
+    ttl=float(os.getenv('COMBINATION_CACHE_TTL', '3600')),
+)
 
 """
 Clustering utilities for restaurant recommendation system.
@@ -14,19 +24,34 @@ Usage:
 Call select_top_restaurants to retrieve top matches for a user.
 """
 
-def select_top_restaurants(city, chosen_types, chosen_diets, chosen_features, rating_rank_dict):
+def invalidate_combination_cache(city=None):
     """
-    Retrieve the top 10 restaurants matching a specific combination key.
+    Drop cached combination lookups of this process, e.g. to free memory after an ingest
+    (other processes notice the new data versions instead).
+
+    Args:
+        city (str, optional): City name. Drops every city if omitted.
+
+    Returns:
+        int: Number of cache entries dropped.
+    """
+    if city is None:
+        return combination_cache.invalidate()
+    city_key = city.lower()
+    return combination_cache.invalidate(lambda key: key[0] == city_key)
+
+def combination_key(chosen_types, chosen_diets, chosen_features, rating_rank_dict):
+    """
+    Build the key a combination of user choices is stored under in `<city>_combinations`.
 
     Args:
-        city (str): City name.
         chosen_types (list): List of cuisine types selected by the user.
-        chosen_diets (list): List of dietary preferences selected by the user.
-        chosen_features (list): List of additional features selected by the user.
+        chosen_diets (list or str): Dietary preferences selected by the user.
+        chosen_features (list or str): Additional features selected by the user.
         rating_rank_dict (dict): Dictionary of rating priorities.
 
     Returns:
-        list: List of top restaurant documents matching the combination.
+        str: The combination key.
     """
     # Ensure inputs are lists, not strings
     if isinstance(chosen_diets, str):
@@ -56,34 +81,76 @@ def select_top_restaurants(city, chosen_types, chosen_diets, chosen_features, ra
         "features": sorted_features,
         "ranking": ranking_str,
     }
-    combination_key = str(combination_data)  # Use str() to match the database's Python dictionary string format
-    print(f"DEBUG: Generated combination_key: {combination_key}")
+    return str(combination_data)  # Use str() to match the database's Python dictionary string format
+
+def combination_cache_key(city, key, projection=None, versions=None):
+    """
+    Return the combination_cache key of a combination lookup.
+
+    Args:
+        city (str): City name.
+        key (str): The combination key.
+        projection (dict, optional): Projection limiting the returned restaurant fields.
+        versions (tuple, optional): The city's restaurant and combinations data versions.
+
+    Returns:
+        tuple: The cache key.
+    """
+    return (city.lower(), key, tuple(sorted(projection.items())) if projection else None, versions)
 
-    # Connect to the city-specific collection
-    city_collection_name = f"{city.lower()}_combinations"
-    city_collection = db[city_collection_name]
-    print(f"DEBUG: Searching in collection: {city_collection_name}")
+def combination_links(document):
+    """
+    Return the ranked restaurant links of a combination document.
 
-    query = {"combination": combination_key}
-    document = city_collection.find_one(query)
-    print(f"DEBUG: Document found: {document}")
+    Args:
+        document (dict or None): The combination document, if one was found.
 
+    Returns:
+        list: The restaurant links, or an empty list without a document or links.
+    """
     if document and "restaurant_links" in document:
     # Parse the stringified list into a Python list
-        restaurant_links = ast.literal_eval(document["restaurant_links"])
-        print(f"DEBUG: Parsed restaurant_links: {restaurant_links}")
+        restaurant_links = parse_list(document["restaurant_links"])
+        logger.debug("Parsed restaurant_links: %s", restaurant_links)
     else:
         restaurant_links = []  # Default to an empty list if no document or field is found
-        print("DEBUG: No document found or 'restaurant_links' not in document, setting empty list.")
-    restaurant_list = []
-    for link in restaurant_links:
-        # Debugging: Print the link being searched for
-        print(f"DEBUG: Searching for restaurant_link: {link}")
-        # Add single quotes around the link to match the database's stored format
-        query = {"restaurant_link": f"'{link}'"}
-        print(f"DEBUG: Constructed restaurant query: {query}")
-        restaurant = db[city.lower() + "_restaurants"].find_one(query)
-        if restaurant:
-            restaurant_list.append(sanitize_data(restaurant)) # Sanitize each restaurant
+        logger.debug("No document found or 'restaurant_links' not in document, setting empty list.")
+    return restaurant_links
+
+@timed("clustering.select_top_restaurants")
+def select_top_restaurants(city, chosen_types, chosen_diets, chosen_features, rating_rank_dict, projection=None):
+    """
+    Retrieve the top 10 restaurants matching a specific combination key.
+
+    Args:
+        city (str): City name.
+        chosen_types (list): List of cuisine types selected by the user.
+        chosen_diets (list): List of dietary preferences selected by the user.
+        chosen_features (list): List of additional features selected by the user.
+        rating_rank_dict (dict): Dictionary of rating priorities.
+        projection (dict, optional): Projection limiting the returned restaurant fields.
+
+    Returns:
+        list: List of top restaurant documents matching the combination, in ranking order.
+        Documents are returned unsanitized and shared with the combination cache, so
+        callers must not modify them in place.
+    """
+    key = combination_key(chosen_types, chosen_diets, chosen_features, rating_rank_dict)
+    logger.debug("Generated combination_key: %s", key)
+
+    versions = (restaurant_repository.data_version(city), restaurant_repository.combinations_version(city))
+    cache_key = combination_cache_key(city, key, projection, versions)
+    cached = combination_cache.get(cache_key)
+    if cached is not None:
+        return list(cached)
+
+    document = restaurant_repository.find_combination(city, key)
+    logger.debug("Document found: %s", document)
+
+    restaurant_links = combination_links(document)
+    # Fetch all linked restaurants in one round-trip, preserving the combination's ranking order
+    restaurant_list = restaurant_repository.find_by_links(city, restaurant_links, projection)
+    logger.debug("Found %d of %d linked restaurants", len(restaurant_list), len(restaurant_links))
+    combination_cache.set(cache_key, restaurant_list)
     # Return the matched restaurants
-    return restaurant_list
\ No newline at end of file
+    return list(restaurant_list)
@@ -1,34 +1,162 @@
+import itertools
 import math
 from bson import ObjectId
+from pymongo import UpdateOne
+from config.features import binary_float_columns
 
 """
 Utility for sanitizing data for JSON serialization.
 
-Provides a recursive function to clean data structures for safe JSON output.
+Provides a recursive function to clean data structures for safe JSON output: ObjectIds
+become strings, and NaN floats and "nan"/"none" strings become None. Values are dispatched
+on their exact type through a lookup table, sentinel strings are matched without
+allocating, documents with a known schema skip the fields that can never need cleaning,
+and freshly fetched documents can be cleaned in place instead of copied.
 
 Usage:
-Call sanitize_data on any data before returning as JSON.
+Call sanitize_data on any data before returning as JSON, e.g.
+    sanitize_data(restaurants, clean_fields=RESTAURANT_CLEAN_FIELDS, in_place=True)
+for restaurant documents that are not shared with a cache. RESTAURANT_CLEAN_FIELDS only holds
+for collections written by `flask ingest` or passed through enforce_clean_fields, which
+materialize_all runs on every restaurant collection at startup.
 """
 
-def sanitize_data(data):
+# Every capitalization of "nan" and "none", so sentinels are found by hash lookup instead of .lower()
+_SENTINELS = frozenset(
+    "".join(chars)
+    for word in ("nan", "none")
+    for chars in itertools.product(*((c, c.upper()) for c in word))
+)
+_SENTINEL_LENGTHS = frozenset(len(word) for word in _SENTINELS)
+
+# Restaurant fields stored as ints (or null) by ingest and enforce_clean_fields, which so never need sanitizing
+RESTAURANT_CLEAN_FIELDS = frozenset(
+    [col for col in binary_float_columns if col.startswith("is_")] + ["num_reviews", "positive_count"]
+)
+
+def _clean_value(field, value):
+    """
+    Convert a stored clean-field value to an int, or to the missing value of the field.
+    """
+    missing = 0 if field.startswith("is_") else None
+    if isinstance(value, str) and value.strip().lower() in ("nan", "none", ""):
+        return missing
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return missing
+    return missing if number != number else int(number)
+
+def enforce_clean_fields(collection, clean_fields=RESTAURANT_CLEAN_FIELDS, batch_size=500):
+    """
+    Store the clean fields of a collection's documents as ints, so sanitize_data may skip them.
+
+    Collections loaded before `flask ingest` can hold floats (NaN included) and "nan"/"none"
+    strings in these fields; they are converted like ingest does, with missing `is_*` flags
+    stored as 0 and other missing values as null.
+
+    Args:
+        collection (Collection): A city's restaurant collection.
+        clean_fields (Iterable[str]): The fields to enforce.
+        batch_size (int): Number of updates per bulk write.
+
+    Returns:
+        int: Number of documents updated.
+    """
+    query = {"$or": [{field: {"$type": kind}} for field in clean_fields for kind in ("double", "string")]}
+    projection = {field: 1 for field in clean_fields}
+    updates = []
+    updated = 0
+    for document in collection.find(query, projection):
+        fields = {
+            field: _clean_value(field, value)
+            for field, value in document.items()
+            if field in projection and isinstance(value, (float, str))
+        }
+        updates.append(UpdateOne({"_id": document["_id"]}, {"$set": fields}))
+        if len(updates) >= batch_size:
+            updated += collection.bulk_write(updates, ordered=False).modified_count
+            updates = []
+    if updates:
+        updated += collection.bulk_write(updates, ordered=False).modified_count
+    return updated
+
+def _sanitize_float(value, clean_fields, in_place):
+    return None if value != value else value
+
+def _sanitize_str(value, clean_fields, in_place):
+    return None if len(value) in _SENTINEL_LENGTHS and value in _SENTINELS else value
+
+def _sanitize_object_id(value, clean_fields, in_place):
+    return str(value)
+
+def _sanitize_dict(value, clean_fields, in_place):
+    target = value if in_place else {}
+    for key, item in value.items():
+        handler = _HANDLERS.get(type(item), _sanitize_other)
+        if handler is None or (clean_fields is not None and key in clean_fields):
+            if not in_place:
+                target[key] = item
+        else:
+            # Nested values are sanitized without the document schema
+            target[key] = handler(item, None, in_place)
+    return target
+
+def _sanitize_list(value, clean_fields, in_place):
+    target = value if in_place else [None] * len(value)
+    for index, item in enumerate(value):
+        handler = _HANDLERS.get(type(item), _sanitize_other)
+        if handler is None:
+            if not in_place:
+                target[index] = item
+        else:
+            # A list of documents shares the documents' schema
+            target[index] = handler(item, clean_fields if handler is _sanitize_dict else None, in_place)
+    return target
+
+def _sanitize_other(value, clean_fields, in_place):
+    """
+    Sanitize values of subclasses of the dispatched types (e.g. numpy floats, SON documents).
+    """
+    if isinstance(value, dict):
+        return _sanitize_dict(value, clean_fields, in_place)
+    if isinstance(value, list):
+        return _sanitize_list(value, clean_fields, in_place)
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, str):
+        return _sanitize_str(value, clean_fields, in_place)
+    return value
+
+# Handler per exact type; None marks types that never need sanitizing, and any other type
+# goes through the isinstance fallback
+_HANDLERS = {
+    dict: _sanitize_dict,
+    list: _sanitize_list,
+    str: _sanitize_str,
+    float: _sanitize_float,
+    ObjectId: _sanitize_object_id,
+    int: None,
+    bool: None,
+    type(None): None,
+}
+
+def sanitize_data(data, clean_fields=None, in_place=False):
     """
     Recursively sanitize data for JSON serialization.
 
     Args:
         data (Any): The data to sanitize (dict, list, ObjectId, float, str, etc.).
+        clean_fields (frozenset, optional): Top-level document fields known never to need
+            sanitizing (e.g. RESTAURANT_CLEAN_FIELDS); applies to `data` itself if it is a
+            dict, or to each dict directly in `data` if it is a list.
+        in_place (bool): Modify dicts and lists in place instead of building copies. Only
+            use it on data that is not shared (e.g. with a cache).
 
     Returns:
         Any: Sanitized data suitable for JSON serialization.
     """
-    if isinstance(data, dict):
-        return {k: sanitize_data(v) for k, v in data.items()}
-    elif isinstance(data, list):
-        return [sanitize_data(v) for v in data]
-    elif isinstance(data, ObjectId):
-        return str(data)
-    elif isinstance(data, float) and math.isnan(data):
-        return None  # Replace NaN with None (or any default value like 0 or "N/A")
-    elif isinstance(data, str) and (data.lower() == "nan" or data.lower() == "none"):
-        return None # Convert string "nan" or "none" to None
-    else:
-        return data 
\ No newline at end of file
+    handler = _HANDLERS.get(type(data), _sanitize_other)
+    return data if handler is None else handler(data, clean_fields, in_place)
@@ -0,0 +1,106 @@
+import os
+from datetime import datetime, timezone
+from pymongo import ReturnDocument
+from utils.ttl_cache import TTLCache
+
+"""
+Per-city restaurant data versions.
+
+Each city has an integer version in the `data_versions` collection that is bumped
+whenever its restaurant data changes (ingestion, positive-count materialization).
+Snapshots and caches are keyed on it. Its clustering combinations have a separate
+version, bumped when they are reloaded, so loading new combinations does not rebuild the
+feature snapshots. Lookups are cached in-process for a few seconds, so checking a version
+does not cost a MongoDB round-trip per request.
+
+Usage:
+Call get_data_version(db, city) (or get_data_version_async on the async client) to read and
+bump_data_version(db, city) after changing data; pass kind=COMBINATIONS for the combinations.
+"""
+
+VERSIONS_COLLECTION = 'data_versions'
+
+# Version kinds, stored as fields of a city's document
+RESTAURANTS = 'version'
+COMBINATIONS = 'combinations_version'
+KINDS = (RESTAURANTS, COMBINATIONS)
+
+_version_cache = TTLCache(maxsize=64, ttl=float(os.getenv('DATA_VERSION_TTL', '10')))
+
+def _city_key(city):
+    return city.lower()
+
+def _versions(document):
+    return tuple(document.get(kind) if document else None for kind in KINDS)
+
+def get_data_version(db, city, kind=RESTAURANTS):
+    """
+    Return the current data version of a city.
+
+    Args:
+        db (Database): The MongoDB database object.
+        city (str): City name.
+        kind (str): RESTAURANTS or COMBINATIONS.
+
+    Returns:
+        int or None: The version, or None if the city's data has never been versioned.
+    """
+    key = _city_key(city)
+    versions = _version_cache.get(key)
+    if versions is None:
+        versions = _versions(db[VERSIONS_COLLECTION].find_one({"_id": key}))
+        _version_cache.set(key, versions)
+    return versions[KINDS.index(kind)]
+
+async def get_data_version_async(db, city, kind=RESTAURANTS):
+    """
+    Return the current data version of a city through an async database (see get_data_version).
+
+    Args:
+        db (AsyncDatabase): The async MongoDB database object.
+        city (str): City name.
+        kind (str): RESTAURANTS or COMBINATIONS.
+
+    Returns:
+        int or None: The version, or None if the city's data has never been versioned.
+    """
+    key = _city_key(city)
+    versions = _version_cache.get(key)
+    if versions is None:
+        versions = _versions(await db[VERSIONS_COLLECTION].find_one({"_id": key}))
+        _version_cache.set(key, versions)
+    return versions[KINDS.index(kind)]
+
+def bump_data_version(db, city, kind=RESTAURANTS):
+    """
+    Increment a city's data version after its restaurant data or combinations changed.
+
+    Args:
+        db (Database): The MongoDB database object.
+        city (str): City name.
+        kind (str): RESTAURANTS or COMBINATIONS.
+
+    Returns:
+        int: The new version.
+    """
+    key = _city_key(city)
+    document = db[VERSIONS_COLLECTION].find_one_and_update(
+        {"_id": key},
+        {"$inc": {kind: 1}, "$set": {"updated_at": datetime.now(timezone.utc)}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    _version_cache.set(key, _versions(document))
+    return document[kind]
+
+def city_for_collection(collection_name):
+    """
+    Return the city key of a `<city>_restaurants` collection name.
+
+    Args:
+        collection_name (str): The collection name.
+
+    Returns:
+        str: The lowercase city name.
+    """
+    return collection_name[:-len("_restaurants")]
@@ -0,0 +1,375 @@
+import logging
+import math
+import threading
+import numpy as np
+from bson import ObjectId
+from config.features import binary_float_columns
+from utils.preference_filter import FLAG_FIELDS, pack_flags, match_rows
+from utils.data_version import get_data_version
+from utils.snapshot import read_snapshot, write_snapshot
+from utils.retrieval_index import ExactIndex, build_index, index_kind
+from utils.metrics import timed
+
+"""
+In-memory per-city feature store for recommendation scoring.
+
+Holds a contiguous float32 matrix of restaurant feature vectors (one row per
+restaurant, columns in binary_float_columns order) with pre-normalized rows, so
+cosine similarity against a user vector is a single matrix-vector product, plus a
+uint32 preference-flag bitmask per restaurant for vectorized filtering. Top-k queries go
+through the city's retrieval index (exact by default, see utils.retrieval_index).
+
+Stores are memory-mapped from the city's on-disk snapshot (see utils.snapshot) when one
+exists for the current data version, and are otherwise built from MongoDB and snapshotted.
+A store is reloaded when its city's data version changes (e.g. after `flask ingest` in
+another process), which is checked through the in-process version cache of
+utils.data_version, so at most once per city every few seconds.
+
+Usage:
+Call feature_store.load(city, collection) once at startup and
+feature_store.get(city, collection) when scoring.
+"""
+
+logger = logging.getLogger(__name__)
+
+def to_float(value):
+    """
+    Convert a stored feature value to a float, treating missing or invalid values as 0.
+
+    Args:
+        value (Any): The raw value from the restaurant document.
+
+    Returns:
+        float: The numeric feature value.
+    """
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if math.isnan(number) else number
+
+def normalize_rows(matrix):
+    """
+    Scale each row of a matrix to unit length, leaving all-zero rows untouched.
+
+    Args:
+        matrix (np.ndarray): 2D float array.
+
+    Returns:
+        np.ndarray: Contiguous float32 array with L2-normalized rows.
+    """
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+class CityFeatureStore:
+    """
+    Normalized feature matrix, flag bitmasks, rating columns and id index for the restaurants of one city.
+    """
+    def __init__(self, city, ids, matrix, masks, general_ratings, positive_counts, columns=binary_float_columns):
+        """
+        Args:
+            city (str): City name.
+            ids (list): Restaurant ID strings, one per matrix row.
+            matrix (np.ndarray): Row-normalized float32 feature matrix.
+            masks (np.ndarray): uint32 preference-flag bitmask per row.
+            general_ratings (np.ndarray): float32 general_rating per row (NaN if missing).
+            positive_counts (np.ndarray): int32 positive_count per row (-1 if missing).
+            columns (list): Feature column names, in matrix column order.
+        """
+        self.city = city
+        self.ids = list(ids)
+        self.columns = list(columns)
+        self.matrix = matrix
+        self.masks = masks
+        self.general_ratings = general_ratings
+        self.positive_counts = positive_counts
+        self.id_to_row = {rid: row for row, rid in enumerate(self.ids)}
+        self._rating_rows = {}
+        # Data version the store was loaded at (set by FeatureStore.load)
+        self.version = None
+        self.index = ExactIndex(self.matrix)
+
+    @classmethod
+    def from_documents(cls, city, documents, columns=binary_float_columns):
+        """
+        Build a feature store from an iterable of restaurant documents.
+
+        Args:
+            city (str): City name.
+            documents (Iterable[dict]): Restaurant documents containing `_id` and the feature columns.
+            columns (list): Feature column names.
+
+        Returns:
+            CityFeatureStore: The populated store.
+        """
+        ids = []
+        rows = []
+        masks = []
+        general_ratings = []
+        positive_counts = []
+        for document in documents:
+            ids.append(str(document["_id"]))
+            rows.append([to_float(document.get(col, 0)) for col in columns])
+            masks.append(pack_flags(document))
+            general_rating = document.get("general_rating")
+            general_ratings.append(general_rating if isinstance(general_rating, (int, float)) else np.nan)
+            positive_count = document.get("positive_count")
+            positive_counts.append(positive_count if isinstance(positive_count, int) else -1)
+        matrix = np.array(rows, dtype=np.float32).reshape(len(rows), len(columns))
+        return cls(
+            city,
+            ids,
+            normalize_rows(matrix),
+            np.array(masks, dtype=np.uint32),
+            np.array(general_ratings, dtype=np.float32),
+            np.array(positive_counts, dtype=np.int32),
+            columns
+        )
+
+    @classmethod
+    def from_collection(cls, city, collection, columns=binary_float_columns):
+        """
+        Build a feature store from a city's restaurant collection, fetching only the numeric columns.
+
+        Args:
+            city (str): City name.
+            collection (Collection): The city's restaurant collection.
+            columns (list): Feature column names.
+
+        Returns:
+            CityFeatureStore: The populated store.
+        """
+        projection = {col: 1 for col in list(columns) + FLAG_FIELDS + ["general_rating", "positive_count"]}
+        return cls.from_documents(city, collection.find({}, projection), columns)
+
+    @classmethod
+    def from_snapshot(cls, city, arrays, columns=binary_float_columns):
+        """
+        Build a feature store over memory-mapped snapshot arrays.
+
+        Args:
+            city (str): City name.
+            arrays (dict): Arrays returned by utils.snapshot.read_snapshot.
+            columns (list): Feature column names.
+
+        Returns:
+            CityFeatureStore: The store, sharing the mapped arrays.
+        """
+        ids = [rid.decode() for rid in arrays["ids"]]
+        return cls(
+            city,
+            ids,
+            arrays["features"],
+            arrays["masks"],
+            arrays["general_rating"],
+            arrays["positive_count"],
+            columns
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def rows_for_ids(self, restaurant_ids):
+        """
+        Map restaurant IDs to matrix rows, skipping IDs that are not in the store.
+
+        Args:
+            restaurant_ids (Iterable): Restaurant IDs (str or ObjectId).
+
+        Returns:
+            np.ndarray: Array of row indices.
+        """
+        rows = [self.id_to_row.get(str(rid)) for rid in restaurant_ids]
+        return np.array([row for row in rows if row is not None], dtype=np.intp)
+
+    def rows_with_rating(self, rating):
+        """
+        Return the rows whose general_rating equals a value, computed once per rating.
+
+        Args:
+            rating (float): The general rating.
+
+        Returns:
+            np.ndarray: Matching row indices.
+        """
+        rows = self._rating_rows.get(rating)
+        if rows is None:
+            rows = np.flatnonzero(self.general_ratings == rating)
+            self._rating_rows[rating] = rows
+        return rows
+
+    def filter_rows(self, cuisine_bits, required_bits):
+        """
+        Return the rows matching a user's preference bitmasks.
+
+        Args:
+            cuisine_bits (int): Bits of the acceptable cuisines.
+            required_bits (int): Bits that must all be set.
+
+        Returns:
+            np.ndarray: Matching row indices, in collection order.
+        """
+        return match_rows(self.masks, cuisine_bits, required_bits)
+
+    def user_vector(self, averages):
+        """
+        Build the normalized query vector for a user's profile averages.
+
+        Args:
+            averages (dict): Mapping of feature column to the user's average value.
+
+        Returns:
+            np.ndarray: Unit-length float32 vector (all zeros if the profile is empty).
+        """
+        vector = np.array([to_float(averages.get(col, 0)) for col in self.columns], dtype=np.float32)
+        return normalize_rows(vector.reshape(1, -1))[0]
+
+    def use_index(self, kind, **params):
+        """
+        Switch the retrieval backend used by top_k and top_k_many.
+
+        Args:
+            kind (str): 'exact', 'lsh' or 'ivf' (see utils.retrieval_index).
+            **params: Backend parameters.
+
+        Returns:
+            ExactIndex: The new index.
+        """
+        self.index = build_index(kind, self.matrix, **params)
+        return self.index
+
+    @timed("feature_store.top_k")
+    def top_k(self, averages, k, rows=None):
+        """
+        Return the k rows most similar to a user's profile by cosine similarity.
+
+        Args:
+            averages (dict): The user's profile averages.
+            k (int): Number of rows to return.
+            rows (np.ndarray, optional): Candidate rows to rank. Defaults to all rows.
+
+        Returns:
+            tuple: (rows, scores) as arrays, sorted by descending similarity.
+        """
+        return self.index.search(self.user_vector(averages), k, rows)
+
+    @timed("feature_store.top_k_many")
+    def top_k_many(self, averages_list, k, rows_list):
+        """
+        Return the top k rows for several users; the exact backend scores them with chunked matrix multiplies.
+
+        Args:
+            averages_list (list): Profile averages of each user.
+            k (int): Number of rows to return per user.
+            rows_list (list): Candidate rows of each user.
+
+        Returns:
+            list: One (rows, scores) tuple per user, sorted by descending similarity.
+        """
+        if not averages_list:
+            return []
+        vectors = normalize_rows(np.array(
+            [[to_float(averages.get(col, 0)) for col in self.columns] for averages in averages_list],
+            dtype=np.float32
+        ))
+        return self.index.search_many(vectors, k, rows_list)
+
+class FeatureStore:
+    """
+    Registry of per-city feature stores.
+    """
+    def __init__(self):
+        self._stores = {}
+        # Serializes reloads, so concurrent requests don't build the same city twice
+        self._lock = threading.Lock()
+
+    def load(self, city, collection):
+        """
+        Load (or reload) the feature store for a city.
+
+        Memory-maps the snapshot for the city's current data version if there is one, and
+        otherwise builds the store from the restaurant collection and writes a snapshot.
+
+        Args:
+            city (str): City name.
+            collection (Collection): The city's restaurant collection.
+
+        Returns:
+            CityFeatureStore: The loaded store.
+        """
+        version = get_data_version(collection.database, city)
+        arrays = read_snapshot(city, version, binary_float_columns) if version is not None else None
+        if arrays is not None and not self._matches_collection(arrays, collection):
+            arrays = None  # Left over from a database that was reset and re-versioned
+        if arrays is not None:
+            store = CityFeatureStore.from_snapshot(city, arrays)
+        else:
+            store = CityFeatureStore.from_collection(city, collection)
+            if version is not None:
+                try:
+                    write_snapshot(store, version)
+                except OSError as e:
+                    logger.error("Error writing feature snapshot for city %s: %s", city, e)
+        store.version = version
+        store.use_index(index_kind(city))
+        self._stores[city] = store
+        return store
+
+    @staticmethod
+    def _matches_collection(arrays, collection):
+        """
+        Cheaply check that snapshot arrays belong to the collection's current documents.
+
+        Args:
+            arrays (dict): Arrays returned by utils.snapshot.read_snapshot.
+            collection (Collection): The city's restaurant collection.
+
+        Returns:
+            bool: True if the document count matches and the first and last ids exist.
+        """
+        ids = arrays["ids"]
+        if len(ids) != collection.estimated_document_count():
+            return False
+        if not len(ids):
+            return True
+        probe = [ObjectId(ids[0].decode()), ObjectId(ids[-1].decode())]
+        return len(collection.distinct("_id", {"_id": {"$in": probe}})) == len(set(probe))
+
+    def get(self, city, collection=None):
+        """
+        Get the loaded feature store for a city, reloading it if the city's data changed.
+
+        Args:
+            city (str): City name.
+            collection (Collection, optional): The city's restaurant collection. Without it the
+                store is returned as loaded, without checking its data version.
+
+        Returns:
+            CityFeatureStore or None: The store, or None if it has not been loaded.
+        """
+        store = self._stores.get(city)
+        if store is None or collection is None or store.version == get_data_version(collection.database, city):
+            return store
+        with self._lock:
+            store = self._stores.get(city)
+            if store.version != get_data_version(collection.database, city):
+                logger.info("Reloading feature store for city %s: data version %s -> %s",
+                            city, store.version, get_data_version(collection.database, city))
+                store = self.load(city, collection)
+        return store
+
+    def clear(self, city=None):
+        """
+        Drop the loaded store for a city, or for all cities.
+
+        Args:
+            city (str, optional): City name. Clears every city if omitted.
+        """
+        if city is None:
+            self._stores.clear()
+        else:
+            self._stores.pop(city, None)
+
+feature_store = FeatureStore()
@@ -0,0 +1,202 @@
+import functools
+import gzip
+import hashlib
+import inspect
+import os
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; responses are gzip-compressed without it
+    brotli = None
+
+"""
+HTTP caching and compression for the API responses.
+
+conditional_get makes a read-only GET view conditional: its strong ETag is built from the
+data version of the city it reads (see utils.data_version) and the request's path and query
+parameters, and an If-None-Match carrying it is answered with a 304 before the view runs,
+so no MongoDB query is made (the data version is cached in-process). Successful responses
+get the ETag and a public Cache-Control with HTTP_CACHE_MAX_AGE.
+
+init_compression compresses large text bodies (JSON, HTML) with brotli, when installed and
+accepted, or gzip. Compressed responses get the coding appended to their ETag ("<etag>-br",
+"<etag>-gzip"), since a strong ETag names one exact representation; not_modified accepts
+those variants. Set HTTP_CACHE_SALT to a new value when a deploy changes a response format
+without changing the data.
+
+Usage:
+    @bp.route('/api/search')
+    @conditional_get(lambda args: restaurant_repository.data_version(args.get('city', 'Rome')))
+    def search(): ...
+
+    init_compression(app)        # Flask
+    init_async_compression(app)  # Quart
+"""
+
+# Seconds clients and proxies may reuse a conditional response without revalidating it
+DEFAULT_MAX_AGE = int(os.getenv('HTTP_CACHE_MAX_AGE', '60'))
+CACHE_SALT = os.getenv('HTTP_CACHE_SALT', '')
+
+# Bodies smaller than this are sent uncompressed
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))
+GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', '6'))
+# Brotli quality 4 compresses better than gzip -6 at a similar speed; 11 is too slow per request
+BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', '4'))
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/javascript', 'image/svg+xml',
+    'text/html', 'text/plain', 'text/css', 'text/csv', 'text/javascript',
+}
+CODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+def request_etag(request, version, extra=None):
+    """
+    Build the strong ETag of a GET request's response.
+
+    Args:
+        request (Request): The Flask or Quart request.
+        version: Data version the response is computed from (e.g. the city's).
+        extra (optional): Other values the response depends on, e.g. the search backend.
+
+    Returns:
+        str: The ETag value, without quotes.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    args = sorted(request.args.items(multi=True))
+    digest.update(repr((CACHE_SALT, request.path, args, version, extra)).encode())
+    return digest.hexdigest()
+
+def not_modified(request, etag):
+    """
+    Return the tag of a request's If-None-Match matching an ETag or its compressed variants.
+
+    Args:
+        request (Request): The Flask or Quart request.
+        etag (str): The ETag of the uncompressed response.
+
+    Returns:
+        str or None: The matching tag to send back with a 304, or None.
+    """
+    if_none_match = request.if_none_match
+    if not if_none_match:
+        return None
+    for tag in (etag, *(f"{etag}-{coding}" for coding in CODINGS)):
+        if if_none_match.contains(tag):
+            return tag
+    return None
+
+def _cache_headers(response, etag, max_age):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'public, max-age={max_age}'
+    return response
+
+def conditional_get(data_version, max_age=None, extra=None):
+    """
+    Decorate a read-only GET view with ETag validation and Cache-Control headers.
+
+    Args:
+        data_version (callable): Called with the request's query parameters; returns the
+            data version the response depends on (may be a coroutine for async views).
+        max_age (int, optional): Cache-Control max-age. Defaults to HTTP_CACHE_MAX_AGE.
+        extra (callable, optional): Called without arguments; returns other values the
+            response depends on (e.g. configuration), included in the ETag.
+
+    Returns:
+        callable: The decorator. Sync views are served by Flask, coroutine views by Quart.
+    """
+    max_age = DEFAULT_MAX_AGE if max_age is None else max_age
+
+    def decorator(view):
+        if inspect.iscoroutinefunction(view):
+            from quart import current_app, request
+
+            @functools.wraps(view)
+            async def async_wrapper(*args, **kwargs):
+                version = data_version(request.args)
+                if inspect.isawaitable(version):
+                    version = await version
+                etag = request_etag(request, version, extra() if extra else None)
+                matched = not_modified(request, etag)
+                if matched is not None:
+                    return _cache_headers(current_app.response_class(status=304), matched, max_age)
+                response = await current_app.make_response(await view(*args, **kwargs))
+                return _cache_headers(response, etag, max_age) if response.status_code == 200 else response
+            return async_wrapper
+
+        from flask import current_app, request
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = request_etag(request, data_version(request.args), extra() if extra else None)
+            matched = not_modified(request, etag)
+            if matched is not None:
+                return _cache_headers(current_app.response_class(status=304), matched, max_age)
+            response = current_app.make_response(view(*args, **kwargs))
+            return _cache_headers(response, etag, max_age) if response.status_code == 200 else response
+        return wrapper
+    return decorator
+
+def _coding(request, response, in_memory):
+    """
+    Return the content coding to compress a response with, or None to send it as it is.
+    """
+    if (
+        not in_memory
+        or response.status_code != 200
+        or 'Content-Encoding' in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return None
+    return request.accept_encodings.best_match(CODINGS)
+
+def _compress(response, body, coding):
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+    if coding == 'br':
+        compressed = brotli.compress(body, quality=BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = coding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{coding}", weak)
+    return response
+
+def init_compression(app):
+    """
+    Compress a Flask app's large text responses with brotli or gzip.
+
+    Args:
+        app (Flask): The Flask application.
+    """
+    from flask import request
+
+    @app.after_request
+    def compress_response(response):
+        # The body depends on Accept-Encoding even when it is sent uncompressed
+        if response.mimetype in COMPRESSIBLE_MIMETYPES:
+            response.vary.add('Accept-Encoding')
+        # Streamed and file responses are sent as they are
+        coding = _coding(request, response, not (response.direct_passthrough or response.is_streamed))
+        if coding is None:
+            return response
+        return _compress(response, response.get_data(), coding)
+
+def init_async_compression(app):
+    """
+    Compress a Quart app's large text responses with brotli or gzip (see init_compression).
+
+    Args:
+        app (Quart): The Quart application.
+    """
+    from quart import request
+    from quart.wrappers.response import DataBody
+
+    @app.after_request
+    async def compress_response(response):
+        if response.mimetype in COMPRESSIBLE_MIMETYPES:
+            response.vary.add('Accept-Encoding')
+        coding = _coding(request, response, isinstance(response.response, DataBody))
+        if coding is None:
+            return response
+        return _compress(response, await response.get_data(), coding)
@@ -0,0 +1,256 @@
+import os
+import time
+import click
+import openpyxl
+from pymongo import UpdateOne
+from config.cities import city_config
+from database.connection import db_connection
+from utils.literal_parser import parse_list
+from utils.positive_feedback import positive_fields
+from utils.clustering import invalidate_combination_cache
+from utils.data_version import COMBINATIONS, bump_data_version
+
+"""
+Bulk ingestion of the FeatureExtraction and clustering spreadsheets into MongoDB.
+
+Streams rows out of the shipped workbooks in read-only mode, coerces them to native types
+(0/1 ints for `is_*` flags, floats for `*_rating_norm`, real arrays for the stringified
+list columns) and writes them with batched, unordered `bulk_write` upserts keyed on each
+row's natural key, so re-running is idempotent. Progress is checkpointed per source in the
+`ingestion_state` collection, so an interrupted load resumes where it stopped. Loading new
+restaurant rows bumps the city's data version, so feature snapshots are rebuilt, and loading
+new combinations bumps its combinations version; the web processes' caches are keyed on both.
+
+Usage:
+    flask ingest [--city Rome] [--only restaurants|combinations] [--force]
+    python -m utils.ingest [same options]
+"""
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CITIES = [city.lower() for city in city_config.CITIES]
+STATE_COLLECTION = 'ingestion_state'
+
+# Per source kind: workbook path (relative to the backend directory), target collection and upsert key
+SOURCES = {
+    'restaurants': {
+        'path': os.path.join('data', 'data from FeatureExtraction', '{city}_processed_restaurants_data.xlsx'),
+        'collection': city_config.restaurants_collection,
+        'key': 'restaurant_link',
+    },
+    'combinations': {
+        'path': os.path.join('clustering results', '{city}_restaurant_links_by_combination.xlsx'),
+        'collection': city_config.combinations_collection,
+        'key': 'combination',
+    },
+}
+
+LIST_COLUMNS = ('restaurant_links', 'image_urls')
+
+def _is_missing(value):
+    """
+    Check whether a cell value represents a missing value.
+
+    Args:
+        value (Any): The cell value.
+
+    Returns:
+        bool: True for empty cells, NaN and "nan"/"none" strings.
+    """
+    if value is None:
+        return True
+    if isinstance(value, float):
+        return value != value
+    return isinstance(value, str) and value.strip().lower() in ('nan', 'none', '')
+
+def coerce_row(row):
+    """
+    Convert a spreadsheet row to a MongoDB document with native types.
+
+    Args:
+        row (dict): Column name to cell value.
+
+    Returns:
+        dict: The coerced document.
+    """
+    document = {}
+    for column, value in row.items():
+        if column is None:
+            continue
+        if column.startswith('is_'):
+            try:
+                document[column] = 0 if _is_missing(value) else int(float(value))
+            except (TypeError, ValueError):
+                document[column] = 0
+        elif column.endswith('_rating_norm'):
+            document[column] = None if _is_missing(value) else float(value)
+        elif _is_missing(value):
+            document[column] = None
+        elif column in LIST_COLUMNS:
+            try:
+                document[column] = parse_list(value)
+            except ValueError:
+                document[column] = value
+        else:
+            document[column] = value
+
+    if 'top_pairs_total' in row:
+        # Store the parsed review pairs as an array along with the materialized positive count
+        fields = positive_fields(row, store_pairs=True)
+        document['positive_count'] = fields['positive_count']
+        if 'top_pairs_parsed' in fields and document.get('top_pairs_total') is not None:
+            document['top_pairs_total'] = fields['top_pairs_parsed']
+    return document
+
+def iter_rows(path, skip=0):
+    """
+    Stream the data rows of a workbook's first sheet as dicts.
+
+    Args:
+        path (str): Path to the .xlsx file.
+        skip (int): Number of data rows to skip (already ingested).
+
+    Yields:
+        dict: Column name to cell value.
+    """
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        for index, values in enumerate(rows):
+            if index < skip:
+                continue
+            yield dict(zip(header, values))
+    finally:
+        workbook.close()
+
+def _source_signature(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime': int(stat.st_mtime)}
+
+def ingest_source(db, city, kind, data_dir=BACKEND_DIR, batch_size=1000, force=False):
+    """
+    Load one city's workbook of the given kind into its collection.
+
+    Args:
+        db (Database): The MongoDB database object.
+        city (str): Lowercase city name.
+        kind (str): 'restaurants' or 'combinations'.
+        data_dir (str): Directory the source paths are relative to.
+        batch_size (int): Number of upserts per bulk write.
+        force (bool): Ignore any checkpoint and reload every row.
+
+    Returns:
+        dict: Rows written, rows skipped from a previous run, and elapsed seconds.
+    """
+    source = SOURCES[kind]
+    path = os.path.join(data_dir, source['path'].format(city=city))
+    collection = db[source['collection'](city)]
+    key = source['key']
+    state_collection = db[STATE_COLLECTION]
+    state_id = f"{collection.name}:{os.path.basename(path)}"
+    signature = _source_signature(path)
+
+    state = None if force else state_collection.find_one({'_id': state_id})
+    if state and state.get('signature') != signature:
+        state = None  # The workbook changed since the checkpoint; start over
+    if state and state.get('completed'):
+        return {'rows': 0, 'skipped': state.get('rows_done', 0), 'seconds': 0.0}
+    rows_done = state.get('rows_done', 0) if state else 0
+    skipped = rows_done
+
+    start = time.perf_counter()
+    updates = []
+    pending_rows = 0
+
+    def flush():
+        nonlocal rows_done, updates, pending_rows
+        if not pending_rows:
+            return
+        if updates:
+            collection.bulk_write(updates, ordered=False)
+        # Rows without a key are counted too, so resuming skips exactly the rows already handled
+        rows_done += pending_rows
+        updates = []
+        pending_rows = 0
+        state_collection.update_one(
+            {'_id': state_id},
+            {'$set': {'signature': signature, 'rows_done': rows_done, 'completed': False}},
+            upsert=True
+        )
+
+    for row in iter_rows(path, skip=rows_done):
+        document = coerce_row(row)
+        pending_rows += 1
+        if document.get(key) is not None:
+            updates.append(UpdateOne({key: document[key]}, {'$set': document}, upsert=True))
+        if pending_rows >= batch_size:
+            flush()
+    flush()
+
+    state_collection.update_one(
+        {'_id': state_id},
+        {'$set': {'signature': signature, 'rows_done': rows_done, 'completed': True}},
+        upsert=True
+    )
+    return {'rows': rows_done - skipped, 'skipped': skipped, 'seconds': time.perf_counter() - start}
+
+def ingest(db, cities=CITIES, kinds=tuple(SOURCES), data_dir=BACKEND_DIR, batch_size=1000, force=False):
+    """
+    Load the workbooks of several cities and kinds, printing throughput per source.
+
+    Args:
+        db (Database): The MongoDB database object.
+        cities (Iterable[str]): City names.
+        kinds (Iterable[str]): Source kinds to load.
+        data_dir (str): Directory the source paths are relative to.
+        batch_size (int): Number of upserts per bulk write.
+        force (bool): Ignore checkpoints and reload every row.
+
+    Returns:
+        dict: Mapping of (city, kind) to the ingest_source result.
+    """
+    results = {}
+    total_rows = 0
+    total_start = time.perf_counter()
+    for city in cities:
+        city = city.lower()
+        for kind in kinds:
+            result = ingest_source(db, city, kind, data_dir, batch_size, force)
+            results[(city, kind)] = result
+            total_rows += result['rows']
+            rate = result['rows'] / result['seconds'] if result['seconds'] else 0.0
+            print(f"{city} {kind}: {result['rows']} rows in {result['seconds']:.2f}s "
+                  f"({rate:.0f} rows/s, {result['skipped']} already loaded)")
+        # Caches in every process are keyed on these versions, so bumping them invalidates them
+        if results.get((city, 'restaurants'), {}).get('rows'):
+            bump_data_version(db, city)
+        if results.get((city, 'combinations'), {}).get('rows'):
+            bump_data_version(db, city, COMBINATIONS)
+        invalidate_combination_cache(city)
+
+    elapsed = time.perf_counter() - total_start
+    rate = total_rows / elapsed if elapsed else 0.0
+    print(f"Total: {total_rows} rows in {elapsed:.2f}s ({rate:.0f} rows/s)")
+    return results
+
+@click.command('ingest')
+@click.option('--city', 'cities', multiple=True, help='City to load (repeatable). Defaults to all cities.')
+@click.option('--only', 'kinds', multiple=True, type=click.Choice(list(SOURCES)), help='Source kind to load (repeatable).')
+@click.option('--data-dir', default=BACKEND_DIR, show_default=True, help='Directory containing the data folders.')
+@click.option('--batch-size', default=1000, show_default=True, help='Upserts per bulk write.')
+@click.option('--force', is_flag=True, help='Ignore checkpoints and reload every row.')
+def ingest_command(cities, kinds, data_dir, batch_size, force):
+    """Load the FeatureExtraction and clustering spreadsheets into MongoDB."""
+    ingest(
+        db_connection.get_db(),
+        cities=cities or CITIES,
+        kinds=kinds or tuple(SOURCES),
+        data_dir=data_dir,
+        batch_size=batch_size,
+        force=force,
+    )
+
+if __name__ == '__main__':
+    ingest_command()
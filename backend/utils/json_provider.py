@@ -0,0 +1,138 @@
+import json
+import numpy as np
+from bson import ObjectId
+from flask.json.provider import DefaultJSONProvider
+from utils.data_sanitizer import sanitize_data
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simplejson
+except ImportError:
+    simplejson = None
+
+"""
+JSON provider encoding API responses in a single pass.
+
+ObjectIds are written as strings, NaN floats as null, NumPy scalars and arrays as their
+Python values, and dates like Flask's default provider does, so documents can be passed
+to jsonify without being copied by sanitize_data first. The "nan"/"none" sentinel strings
+of legacy-loaded documents are still left to sanitize_data, which the services apply to
+restaurant documents when they fetch them.
+
+The fastest installed backend is used: orjson, then simplejson, then the standard library,
+which encodes with allow_nan=False and only sanitizes the payload when it contains NaN.
+
+Usage:
+Install on the app in create_app with `app.json = FastJSONProvider(app)`.
+"""
+
+if orjson is not None:
+    JSON_BACKEND = "orjson"
+elif simplejson is not None:
+    JSON_BACKEND = "simplejson"
+else:
+    JSON_BACKEND = "json"
+
+def _default(o):
+    """
+    Convert the values the JSON backends cannot encode natively.
+
+    Args:
+        o (Any): The value to convert.
+
+    Returns:
+        Any: A value the backend can encode.
+    """
+    if isinstance(o, ObjectId):
+        return str(o)
+    if isinstance(o, np.generic):
+        value = o.item()
+        return None if isinstance(value, float) and value != value else value
+    if isinstance(o, np.ndarray):
+        if o.dtype.kind == "f" and np.isnan(o).any():
+            return np.where(np.isnan(o), None, o).tolist()
+        return o.tolist()
+    # Dates, decimals, UUIDs and dataclasses as Flask's default provider encodes them
+    return DefaultJSONProvider.default(o)
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider encoding ObjectId, NaN, NumPy and datetime values natively.
+    """
+    default = staticmethod(_default)
+    backend = JSON_BACKEND
+
+    def dumps_bytes(self, obj, sort_keys=None, indent=None):
+        """
+        Serialize data as UTF-8 JSON bytes.
+
+        Args:
+            obj (Any): The data to serialize.
+            sort_keys (bool, optional): Sort object keys. Defaults to the provider's sort_keys.
+            indent (int, optional): Pretty-print with this indentation.
+
+        Returns:
+            bytes: The JSON document.
+        """
+        sort_keys = self.sort_keys if sort_keys is None else sort_keys
+        if self.backend == "orjson":
+            option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+            if sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            if indent:
+                option |= orjson.OPT_INDENT_2
+            return orjson.dumps(obj, default=_default, option=option)
+        return self.dumps(obj, sort_keys=sort_keys, indent=indent).encode("utf-8")
+
+    def dumps(self, obj, **kwargs):
+        """
+        Serialize data as a JSON string.
+
+        Args:
+            obj (Any): The data to serialize.
+            **kwargs: sort_keys and indent, as for json.dumps.
+
+        Returns:
+            str: The JSON document.
+        """
+        sort_keys = kwargs.get("sort_keys", self.sort_keys)
+        indent = kwargs.get("indent")
+        if self.backend == "orjson":
+            return self.dumps_bytes(obj, sort_keys, indent).decode("utf-8")
+        if self.backend == "simplejson":
+            return simplejson.dumps(
+                obj, default=_default, ignore_nan=True, sort_keys=sort_keys, indent=indent,
+                ensure_ascii=self.ensure_ascii
+            )
+        try:
+            return json.dumps(
+                obj, default=_default, allow_nan=False, sort_keys=sort_keys, indent=indent,
+                ensure_ascii=self.ensure_ascii
+            )
+        except ValueError as e:
+            if "Out of range float" not in str(e):
+                raise
+        # The standard library cannot write NaN as null, so payloads containing NaN are sanitized first
+        return json.dumps(
+            sanitize_data(obj), default=_default, allow_nan=False, sort_keys=sort_keys, indent=indent,
+            ensure_ascii=self.ensure_ascii
+        )
+
+    def response(self, *args, **kwargs):
+        """
+        Serialize data as JSON and wrap it in a response with the application/json mimetype.
+
+        Args:
+            *args: A single value to serialize, or several to serialize as a list.
+            **kwargs: Key-value pairs to serialize as an object.
+
+        Returns:
+            Response: The JSON response.
+        """
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = 2 if (self.compact is None and self._app.debug) or self.compact is False else None
+        return self._app.response_class(self.dumps_bytes(obj, indent=indent) + b"\n", mimetype=self.mimetype)
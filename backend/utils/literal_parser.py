@@ -0,0 +1,169 @@
+import ast
+import math
+import re
+from functools import lru_cache
+
+"""
+Shared parser for the stringified Python-literal columns of the restaurant data.
+
+Columns such as `top_pairs_total`, `restaurant_links` and `image_urls` are stored as the
+Python repr of a list (e.g. "[('great food', 2, 0.29), ...]"). This module parses them
+without eval:
+
+- a fast path that validates and extracts the two common shapes (a list of strings and a
+  list of (phrase, count, sentiment) tuples) with precompiled regular expressions,
+- a safe fallback that walks the `ast` parse tree and only accepts literals, mapping the
+  bare names None/none/null/nan/NaN to None,
+- an LRU cache keyed on the string, so repeated parses of the same field are free across
+  requests.
+
+Parsed values are cached, so parse_literal returns immutable tuples; use parse_list when a
+mutable list is needed.
+
+Usage:
+Call parse_list(restaurant['image_urls']) or parse_literal(text).
+"""
+
+CACHE_SIZE = 4096
+
+_STR = r"""'[^'\\]*'|"[^"\\]*\""""
+_NUM = r"[-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?|nan|NaN|None|none|null"
+_TUPLE = rf"\(\s*({_STR})\s*,\s*({_NUM})\s*,\s*({_NUM})\s*\)"
+_TUPLE_NC = rf"\(\s*(?:{_STR})\s*,\s*(?:{_NUM})\s*,\s*(?:{_NUM})\s*\)"
+
+_STRING_LIST_RE = re.compile(rf"\[\s*(?:(?:{_STR})\s*(?:,\s*(?:{_STR})\s*)*,?\s*)?\]")
+_STRING_RE = re.compile(_STR)
+_TUPLE_LIST_RE = re.compile(rf"\[\s*(?:{_TUPLE_NC}\s*(?:,\s*{_TUPLE_NC}\s*)*,?\s*)?\]")
+_TUPLE_RE = re.compile(_TUPLE)
+
+# Bare names found in the scraped data, and the values they stand for
+_NAMES = {"None": None, "none": None, "null": None, "nan": None, "NaN": None, "True": True, "False": False}
+
+def _number(token):
+    """
+    Convert a numeric token matched by the fast path.
+
+    Args:
+        token (str): The token text.
+
+    Returns:
+        int, float or None: The number, or None for None/nan tokens.
+    """
+    if token in _NAMES:
+        return None
+    try:
+        return int(token)
+    except ValueError:
+        number = float(token)
+        return None if math.isnan(number) else number
+
+def _parse_fast(text):
+    """
+    Parse the common list shapes with regular expressions.
+
+    Args:
+        text (str): The stripped literal text.
+
+    Returns:
+        tuple or None: The parsed items, or None if the text isn't one of the fast-path shapes.
+    """
+    if _STRING_LIST_RE.fullmatch(text):
+        return tuple(token[1:-1] for token in _STRING_RE.findall(text))
+    if _TUPLE_LIST_RE.fullmatch(text):
+        return tuple(
+            (phrase[1:-1], _number(count), _number(sentiment))
+            for phrase, count, sentiment in _TUPLE_RE.findall(text)
+        )
+    return None
+
+def _from_node(node):
+    """
+    Convert a literal AST node into an immutable Python value.
+
+    Args:
+        node (ast.AST): The node to convert.
+
+    Returns:
+        Any: The literal value (lists and tuples become tuples).
+
+    Raises:
+        ValueError: If the node is not a literal.
+    """
+    if isinstance(node, ast.Constant):
+        value = node.value
+        return None if isinstance(value, float) and math.isnan(value) else value
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        return tuple(_from_node(element) for element in node.elts)
+    if isinstance(node, ast.Dict):
+        return {_from_node(key): _from_node(value) for key, value in zip(node.keys, node.values)}
+    if isinstance(node, ast.Name) and node.id in _NAMES:
+        return _NAMES[node.id]
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        operand = _from_node(node.operand)
+        if isinstance(operand, (int, float)) and not isinstance(operand, bool):
+            return -operand if isinstance(node.op, ast.USub) else operand
+    raise ValueError(f"Unsupported literal node: {type(node).__name__}")
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _parse_cached(text):
+    stripped = text.strip()
+    parsed = _parse_fast(stripped)
+    if parsed is not None:
+        return parsed
+    try:
+        tree = ast.parse(stripped, mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Malformed literal: {e}") from e
+    return _from_node(tree.body)
+
+def parse_literal(text):
+    """
+    Parse a stringified Python literal safely, with caching.
+
+    Args:
+        text (str): The literal text.
+
+    Returns:
+        Any: The parsed value. Lists and tuples are returned as (cached) tuples.
+
+    Raises:
+        ValueError: If the text is not a valid literal.
+    """
+    return _parse_cached(text)
+
+def parse_list(value):
+    """
+    Parse a list-valued column that may be stored as a string or already as a list.
+
+    Args:
+        value (str, list, tuple or None): The stored value.
+
+    Returns:
+        list: A new list of the parsed items (empty for None).
+
+    Raises:
+        ValueError: If a string value is not a valid list literal.
+    """
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    parsed = parse_literal(value)
+    if not isinstance(parsed, tuple):
+        raise ValueError(f"Expected a list literal, got {type(parsed).__name__}")
+    return list(parsed)
+
+def cache_info():
+    """
+    Return the parse cache statistics.
+
+    Returns:
+        CacheInfo: hits, misses, maxsize and currsize of the parse cache.
+    """
+    return _parse_cached.cache_info()
+
+def clear_cache():
+    """
+    Clear the parse cache.
+    """
+    _parse_cached.cache_clear()
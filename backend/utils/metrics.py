@@ -0,0 +1,464 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import wraps
+import bson
+from flask import g, request
+from pymongo import monitoring
+
+"""
+In-process request and hot-path instrumentation.
+
+Keeps latency histograms (fixed log-scale buckets, so recording is a bisect and an
+increment) per route, per named timer and per MongoDB command, along with counters of the
+queries, documents and (with METRICS_QUERY_BYTES=1) reply bytes of each route. Code
+sections are timed with the `timed` context manager or decorator; MongoDB commands are
+counted by QueryListener and the connection pools' utilization by PoolListener, which are
+attached to the shared MongoClient.
+The statistics of the request being served are kept in a context variable, so they can be
+reported per request in the Server-Timing header.
+
+Usage:
+    with timed("feature_store.top_k"):
+        ...
+
+    @timed("recommendations.filter_restaurants_by_preferences")
+    def filter_restaurants_by_preferences(...):
+        ...
+
+    init_metrics(app) in create_app; metrics.snapshot() returns everything recorded.
+"""
+
+# Reply sizes are measured by re-encoding each reply, which costs as much as decoding it,
+# so they are only counted with METRICS_QUERY_BYTES=1 (otherwise they are reported as 0)
+COUNT_QUERY_BYTES = os.getenv('METRICS_QUERY_BYTES', '0') == '1'
+
+class Histogram:
+    """
+    Latency histogram over fixed buckets from 100 µs to about 52 s, doubling each step.
+    """
+    BOUNDS = tuple(1e-4 * 2 ** i for i in range(20))
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        """
+        Record one duration.
+
+        Args:
+            seconds (float): The duration in seconds.
+        """
+        self.counts[bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        """
+        Estimate a percentile as the upper bound of the bucket it falls in.
+
+        Args:
+            q (float): Percentile between 0 and 100.
+
+        Returns:
+            float or None: The estimate in seconds (the maximum for the last bucket), or
+            None if nothing was recorded.
+        """
+        if not self.count:
+            return None
+        rank = q / 100 * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(self.BOUNDS[bucket], self.max) if bucket < len(self.BOUNDS) else self.max
+        return self.max
+
+    def to_dict(self):
+        """
+        Summarize the histogram.
+
+        Returns:
+            dict: Count, mean, p50/p95/p99 and max in milliseconds, and the non-empty
+            buckets keyed by their upper bound in milliseconds.
+        """
+        def ms(seconds):
+            return None if seconds is None else round(seconds * 1e3, 3)
+        return {
+            'count': self.count,
+            'mean_ms': ms(self.sum / self.count if self.count else None),
+            'p50_ms': ms(self.percentile(50)),
+            'p95_ms': ms(self.percentile(95)),
+            'p99_ms': ms(self.percentile(99)),
+            'max_ms': ms(self.max if self.count else None),
+            'buckets': {
+                (f"{bound * 1e3:g}" if bucket < len(self.BOUNDS) else "inf"): count
+                for bucket, (bound, count) in enumerate(zip(self.BOUNDS + (None,), self.counts)) if count
+            },
+        }
+
+class RequestStats:
+    """
+    MongoDB and timer statistics of the request being served.
+    """
+    __slots__ = ('queries', 'documents', 'bytes', 'db_seconds', 'timings')
+
+    def __init__(self):
+        self.queries = 0
+        self.documents = 0
+        self.bytes = 0
+        self.db_seconds = 0.0
+        self.timings = {}
+
+_current_request = ContextVar('request_stats', default=None)
+
+def current_request_stats():
+    """
+    Return the statistics of the request being served.
+
+    Returns:
+        RequestStats or None: The statistics, or None outside a request.
+    """
+    return _current_request.get()
+
+class MetricsRegistry:
+    """
+    Thread-safe store of the recorded histograms and counters.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Drop everything recorded.
+        """
+        with self._lock:
+            self.routes = {}
+            self.timers = {}
+            self.commands = {}
+
+    @staticmethod
+    def _entry(group, name, **counters):
+        entry = group.get(name)
+        if entry is None:
+            entry = group[name] = {'latency': Histogram(), **counters}
+        return entry
+
+    def record_request(self, route, seconds, status, stats):
+        """
+        Record a served request.
+
+        Args:
+            route (str): Method and URL rule, e.g. "GET /api/search".
+            seconds (float): Time to build the response.
+            status (int): HTTP status code.
+            stats (RequestStats): The request's MongoDB statistics.
+        """
+        with self._lock:
+            entry = self._entry(self.routes, route, requests=0, errors=0, queries=0, documents=0, bytes=0, db_ms=0.0)
+            entry['latency'].observe(seconds)
+            entry['requests'] += 1
+            entry['errors'] += status >= 500
+            entry['queries'] += stats.queries
+            entry['documents'] += stats.documents
+            entry['bytes'] += stats.bytes
+            entry['db_ms'] += stats.db_seconds * 1e3
+
+    def record_timer(self, name, seconds):
+        """
+        Record the duration of a timed section.
+
+        Args:
+            name (str): Timer name.
+            seconds (float): The duration.
+        """
+        with self._lock:
+            self._entry(self.timers, name)['latency'].observe(seconds)
+
+    def record_command(self, command, seconds, documents, size, failed=False):
+        """
+        Record a MongoDB command.
+
+        Args:
+            command (str): Command name, e.g. "find".
+            seconds (float): Server round-trip time.
+            documents (int): Documents returned or written.
+            size (int): Reply size in bytes (0 if not measured).
+            failed (bool): Whether the command failed.
+        """
+        with self._lock:
+            entry = self._entry(self.commands, command, documents=0, bytes=0, failures=0)
+            entry['latency'].observe(seconds)
+            entry['documents'] += documents
+            entry['bytes'] += size
+            entry['failures'] += failed
+
+    def snapshot(self):
+        """
+        Return everything recorded, with the histograms summarized.
+
+        Returns:
+            dict: 'routes', 'timers' and 'mongo' sections keyed by name.
+        """
+        def summarize(group):
+            return {
+                name: {key: (value.to_dict() if isinstance(value, Histogram) else value) for key, value in entry.items()}
+                for name, entry in sorted(group.items())
+            }
+        with self._lock:
+            return {'routes': summarize(self.routes), 'timers': summarize(self.timers), 'mongo': summarize(self.commands)}
+
+metrics = MetricsRegistry()
+
+class timed:
+    """
+    Context manager and decorator recording the duration of a code section.
+
+    The duration goes to the named timer histogram and, during a request, to the request's
+    Server-Timing breakdown.
+    """
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        metrics.record_timer(self.name, elapsed)
+        stats = _current_request.get()
+        if stats is not None:
+            stats.timings[self.name] = stats.timings.get(self.name, 0.0) + elapsed
+        return False
+
+    def __call__(self, func):
+        name = self.name
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            # A new timer per call, so concurrent calls do not share a start time
+            with timed(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+def _reply_documents(reply):
+    cursor = reply.get('cursor')
+    if isinstance(cursor, dict):
+        return len(cursor.get('firstBatch') or cursor.get('nextBatch') or ())
+    return reply.get('n', 0) or 0
+
+class QueryListener(monitoring.CommandListener):
+    """
+    pymongo command listener counting the queries, documents and reply bytes of each request.
+    """
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        seconds = event.duration_micros / 1e6
+        documents = _reply_documents(event.reply)
+        size = len(bson.encode(event.reply)) if COUNT_QUERY_BYTES else 0
+        metrics.record_command(event.command_name, seconds, documents, size)
+        stats = _current_request.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.documents += documents
+            stats.bytes += size
+            stats.db_seconds += seconds
+
+    def failed(self, event):
+        seconds = event.duration_micros / 1e6
+        metrics.record_command(event.command_name, seconds, 0, 0, failed=True)
+        stats = _current_request.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += seconds
+
+query_listener = QueryListener()
+
+class PoolListener(monitoring.ConnectionPoolListener):
+    """
+    pymongo connection pool listener keeping the pool utilization of this process, per server.
+
+    Counts open, in-use and waiting connections (with their peaks), checkouts and checkout
+    failures by reason, and the time spent waiting for a connection. The counts are gauges
+    of the current pools, so metrics.reset() does not clear them; reset() is called in
+    child processes, whose client starts with empty pools.
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """
+        Drop the statistics of every pool.
+        """
+        self._lock = threading.Lock()
+        self._pools = {}
+
+    def _pool(self, address):
+        pool = self._pools.get(address)
+        if pool is None:
+            pool = self._pools[address] = {
+                'open': 0, 'in_use': 0, 'waiting': 0, 'max_open': 0, 'max_in_use': 0, 'max_waiting': 0,
+                'checkouts': 0, 'failures': {}, 'cleared': 0, 'wait': Histogram(),
+            }
+        return pool
+
+    def _update(self, address, **deltas):
+        with self._lock:
+            pool = self._pool(address)
+            for name, delta in deltas.items():
+                pool[name] += delta
+                peak = 'max_' + name
+                if peak in pool and pool[name] > pool[peak]:
+                    pool[peak] = pool[name]
+
+    def pool_created(self, event):
+        with self._lock:
+            self._pool(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._update(event.address, cleared=1)
+
+    def pool_closed(self, event):
+        with self._lock:
+            self._pools.pop(event.address, None)
+
+    def connection_created(self, event):
+        self._update(event.address, open=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._update(event.address, open=-1)
+
+    def connection_check_out_started(self, event):
+        self._update(event.address, waiting=1)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool['waiting'] -= 1
+            pool['failures'][event.reason] = pool['failures'].get(event.reason, 0) + 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool['waiting'] -= 1
+            pool['in_use'] += 1
+            pool['max_in_use'] = max(pool['max_in_use'], pool['in_use'])
+            pool['checkouts'] += 1
+            if event.duration is not None:
+                pool['wait'].observe(event.duration)
+
+    def connection_checked_in(self, event):
+        self._update(event.address, in_use=-1)
+
+    def snapshot(self, max_pool_size=None):
+        """
+        Return the statistics of every pool.
+
+        Args:
+            max_pool_size (int, optional): The pools' size limit, to report utilization.
+
+        Returns:
+            dict: Per "host:port", the connection counts and peaks, checkouts, failures by
+            reason, the checkout wait histogram and, with max_pool_size, the in-use and peak
+            in-use fractions of the limit.
+        """
+        with self._lock:
+            pools = {}
+            for address, pool in sorted(self._pools.items(), key=lambda item: str(item[0])):
+                stats = {name: (value.to_dict() if isinstance(value, Histogram) else value) for name, value in pool.items()}
+                stats['failures'] = dict(pool['failures'])
+                if max_pool_size:
+                    stats['utilization'] = round(pool['in_use'] / max_pool_size, 3)
+                    stats['max_utilization'] = round(pool['max_in_use'] / max_pool_size, 3)
+                pools[f"{address[0]}:{address[1]}" if isinstance(address, tuple) else str(address)] = stats
+            return pools
+
+pool_listener = PoolListener()
+
+def _record_response(served_request, response, elapsed, stats):
+    """
+    Record a served request and add its Server-Timing header.
+    """
+    rule = served_request.url_rule
+    route = f"{served_request.method} {rule.rule if rule else '<unmatched>'}"
+    metrics.record_request(route, elapsed, response.status_code, stats)
+    timings = [f"total;dur={elapsed * 1e3:.2f}", f"db;dur={stats.db_seconds * 1e3:.2f};desc=\"{stats.queries} queries\""]
+    timings += [f"{name.replace('.', '-')};dur={seconds * 1e3:.2f}" for name, seconds in stats.timings.items()]
+    response.headers['Server-Timing'] = ", ".join(timings)
+
+def init_metrics(app):
+    """
+    Record the latency and MongoDB statistics of every request served by an app.
+
+    Each response also carries a Server-Timing header with the total, MongoDB and timed
+    section durations of its request.
+
+    Args:
+        app (Flask): The Flask app.
+    """
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_start = time.perf_counter()
+        g.metrics_token = _current_request.set(RequestStats())
+
+    @app.after_request
+    def record_request_metrics(response):
+        start = g.pop('metrics_start', None)
+        stats = _current_request.get()
+        if start is None or stats is None:
+            return response
+        _record_response(request, response, time.perf_counter() - start, stats)
+        return response
+
+    @app.teardown_request
+    def end_request_metrics(exc):
+        token = g.pop('metrics_token', None)
+        if token is not None:
+            _current_request.reset(token)
+
+def init_async_metrics(app):
+    """
+    Record the latency and MongoDB statistics of every request served by the async app.
+
+    Counterpart of init_metrics for Quart (see async_app). The hooks are coroutines, so they
+    run in the request's task and the statistics are seen by its views and by QueryListener;
+    Quart would run plain functions in a worker thread with a copy of the context. Each
+    request runs in its own task, so the statistics need no reset when it ends.
+
+    Args:
+        app (Quart): The Quart app.
+    """
+    from quart import g as quart_g, request as quart_request
+
+    @app.before_request
+    async def start_request_metrics():
+        quart_g.metrics_start = time.perf_counter()
+        _current_request.set(RequestStats())
+
+    @app.after_request
+    async def record_request_metrics(response):
+        start = quart_g.pop('metrics_start', None)
+        stats = _current_request.get()
+        if start is not None and stats is not None:
+            _record_response(quart_request, response, time.perf_counter() - start, stats)
+        return response
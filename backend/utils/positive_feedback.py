@@ -0,0 +1,154 @@
+import logging
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+from utils.literal_parser import parse_literal
+from utils.data_sanitizer import enforce_clean_fields
+from utils.data_version import bump_data_version, city_for_collection
+
+"""
+Positive-feedback scoring for restaurants.
+
+Parses the `top_pairs_total` review pairs of each restaurant once and stores the number
+of positive expressions as a numeric `positive_count` field (optionally with the parsed
+pairs as `top_pairs_parsed`), so ranking restaurants by positive feedback is an indexed
+sort instead of re-parsing every restaurant per request.
+
+Usage:
+Call materialize_all(db) at startup, or run as a script to recompute every restaurant:
+    python -m utils.positive_feedback [--store-pairs]
+"""
+
+logger = logging.getLogger(__name__)
+
+# A pair counts as positive when it was mentioned at least this often with at least this sentiment
+MIN_PAIR_COUNT = 2
+MIN_PAIR_SENTIMENT = 0.15
+
+def parse_top_pairs(top_pairs_total):
+    """
+    Parse a `top_pairs_total` value into [phrase, count, sentiment] items.
+
+    Args:
+        top_pairs_total (str or list): The stored review pairs.
+
+    Returns:
+        list: Parsed pairs with count as int and sentiment as float.
+
+    Raises:
+        ValueError: If the string cannot be parsed.
+    """
+    if isinstance(top_pairs_total, str):
+        feedback_raw = parse_literal(top_pairs_total)
+    elif isinstance(top_pairs_total, (list, tuple)):
+        feedback_raw = top_pairs_total
+    else:
+        return []
+
+    feedback = []
+    for item in feedback_raw:
+        if isinstance(item, (list, tuple)) and len(item) == 3:
+            try:
+                phrase = item[0]
+                count = int(item[1]) if item[1] is not None else 0
+                sentiment = float(item[2]) if item[2] is not None else 0.0
+                feedback.append([phrase, count, sentiment])
+            except (ValueError, TypeError):
+                # If conversion fails, default to 0 for count and 0.0 for sentiment
+                feedback.append([item[0], 0, 0.0])
+    return feedback
+
+def count_positive(feedback):
+    """
+    Count the positive expressions in parsed review pairs.
+
+    Args:
+        feedback (list): Parsed [phrase, count, sentiment] items.
+
+    Returns:
+        int: Number of positive expressions.
+    """
+    return sum(1 for item in feedback if item[1] >= MIN_PAIR_COUNT and item[2] > MIN_PAIR_SENTIMENT)
+
+def positive_fields(restaurant, store_pairs=False):
+    """
+    Compute the materialized positive-feedback fields for a restaurant.
+
+    Args:
+        restaurant (dict): Restaurant document with `top_pairs_total`.
+        store_pairs (bool): Whether to include the parsed pairs.
+
+    Returns:
+        dict: Fields to set. `positive_count` is None when the pairs cannot be parsed,
+        which keeps the restaurant out of the positive-feedback ranking.
+    """
+    try:
+        feedback = parse_top_pairs(restaurant.get('top_pairs_total'))
+    except ValueError:
+        return {"positive_count": None}
+
+    fields = {"positive_count": count_positive(feedback)}
+    if store_pairs:
+        fields["top_pairs_parsed"] = feedback
+    return fields
+
+def materialize_positive_counts(collection, store_pairs=False, recompute=False, batch_size=500):
+    """
+    Store `positive_count` on the restaurants of a collection.
+
+    Args:
+        collection (Collection): A city's restaurant collection.
+        store_pairs (bool): Also store the parsed pairs as `top_pairs_parsed`.
+        recompute (bool): Recompute every restaurant instead of only those missing the field.
+        batch_size (int): Number of updates per bulk write.
+
+    Returns:
+        int: Number of restaurants updated.
+    """
+    query = {} if recompute else {"positive_count": {"$exists": False}}
+    updates = []
+    updated = 0
+    for restaurant in collection.find(query, {"top_pairs_total": 1}):
+        updates.append(UpdateOne({"_id": restaurant["_id"]}, {"$set": positive_fields(restaurant, store_pairs)}))
+        if len(updates) >= batch_size:
+            updated += collection.bulk_write(updates, ordered=False).modified_count
+            updates = []
+    if updates:
+        updated += collection.bulk_write(updates, ordered=False).modified_count
+    return updated
+
+def materialize_all(db, store_pairs=False, recompute=False):
+    """
+    Materialize `positive_count` on all `*_restaurants` collections, and store the fields
+    sanitize_data skips as ints in collections loaded before `flask ingest`.
+
+    Args:
+        db (Database): The MongoDB database object.
+        store_pairs (bool): Also store the parsed pairs as `top_pairs_parsed`.
+        recompute (bool): Recompute every restaurant instead of only those missing the field.
+
+    Returns:
+        dict: Mapping of collection name to the number of restaurants updated.
+    """
+    updated = {}
+    try:
+        for name in db.list_collection_names():
+            if name.endswith("_restaurants"):
+                updated[name] = materialize_positive_counts(db[name], store_pairs, recompute)
+                if updated[name]:
+                    logger.info("Materialized positive_count for %d restaurants in %s", updated[name], name)
+                cleaned = enforce_clean_fields(db[name])
+                if cleaned:
+                    logger.info("Converted the clean fields of %d restaurants in %s to ints", cleaned, name)
+                    updated[name] += cleaned
+                if updated[name]:
+                    bump_data_version(db, city_for_collection(name))
+    except PyMongoError as e:
+        logger.error("Error materializing positive counts: %s", e)
+    return updated
+
+if __name__ == '__main__':
+    import sys
+    from database.connection import db_connection
+
+    logging.basicConfig(level=logging.INFO)
+    materialize_all(db_connection.get_db(), store_pairs='--store-pairs' in sys.argv, recompute=True)
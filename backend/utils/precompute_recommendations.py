@@ -0,0 +1,150 @@
+import multiprocessing
+import os
+import time
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import click
+from config.cities import city_config
+from database.repositories.user_repository import user_repository
+from services.recommendation_service import recommendation_engine
+from utils.feature_store import feature_store
+
+"""
+Offline job recomputing the users' precomputed `4_rec_restaurants`.
+
+A user's recommendations are stale when they were never computed, when their profile was
+updated after they were computed (`profile.updated_at`), or when they were computed against
+an older data version of the city. The job ranks the stale users of each city in batches
+with RecommendationEngine.rank_many and writes the restaurant IDs and scores back with
+unordered bulk writes. Users that cannot be ranked (no preferences or profile averages) are
+marked as computed at the current data version, so later runs skip them until their profile
+or the city's data changes. Cities are processed in parallel worker processes, each printing
+its progress and throughput.
+
+Usage:
+    flask precompute [--city Rome] [--workers 3] [--force]
+    python -m utils.precompute_recommendations [same options]
+"""
+
+CITIES = city_config.CITIES
+
+def stale_users_query(city, version, force=False):
+    """
+    Build the query selecting the users of a city whose recommendations must be recomputed.
+
+    Args:
+        city (str): City name as stored in the user profiles.
+        version (int or None): The city's current data version.
+        force (bool): Select every user of the city with a profile.
+
+    Returns:
+        dict: The MongoDB query.
+    """
+    # Profiles store running sums, or averages if they were created before sums were stored
+    conditions = [{"$or": [{"profile.sums": {"$exists": True}}, {"profile.averages": {"$exists": True}}]}]
+    if not force:
+        conditions.append({"$or": [
+            {"recs_computed_at": {"$exists": False}},
+            {"recs_data_version": {"$ne": version}},
+            {"$expr": {"$gt": ["$profile.updated_at", "$recs_computed_at"]}},
+        ]})
+    return {"profile.city": city, "$and": conditions}
+
+def precompute_city(city, k=4, batch_size=500, force=False):
+    """
+    Recompute the recommendations of a city's stale users.
+
+    Args:
+        city (str): City name.
+        k (int): Number of restaurants per user.
+        batch_size (int): Users ranked and written per batch.
+        force (bool): Recompute every user of the city.
+
+    Returns:
+        dict: City, number of users processed, updated and skipped (not rankable), and
+        elapsed seconds.
+    """
+    start = time.perf_counter()
+    # Reload so the rankings use the city's current data version
+    store = feature_store.load(city, recommendation_engine.restaurant_repository.require_collection(city))
+    query = stale_users_query(city, store.version, force)
+    user_ids = [str(user["_id"]) for user in user_repository.users_collection.find(query, {"_id": 1})]
+
+    updated = skipped = 0
+    for offset in range(0, len(user_ids), batch_size):
+        batch = user_ids[offset:offset + batch_size]
+        rankings, missing = recommendation_engine.rank_many(batch, k)
+        updated += recommendation_engine.save_rankings(rankings)
+        if missing:
+            computed_at = datetime.now(timezone.utc)
+            user_repository.update_users({
+                uid: {"recs_computed_at": computed_at, "recs_data_version": store.version} for uid in missing
+            })
+            skipped += len(missing)
+        done = offset + len(batch)
+        elapsed = time.perf_counter() - start
+        print(f"{city}: {done}/{len(user_ids)} users ({done / elapsed if elapsed else 0.0:.0f} users/s)", flush=True)
+
+    return {
+        'city': city, 'users': len(user_ids), 'updated': updated, 'skipped': skipped,
+        'seconds': time.perf_counter() - start,
+    }
+
+def precompute_all(cities=CITIES, workers=None, k=4, batch_size=500, force=False):
+    """
+    Recompute the stale recommendations of several cities, one worker process per city.
+
+    Args:
+        cities (Iterable[str]): City names.
+        workers (int, optional): Maximum number of worker processes. Defaults to the CPU count;
+            1 runs in the current process.
+        k (int): Number of restaurants per user.
+        batch_size (int): Users ranked and written per batch.
+        force (bool): Recompute every user.
+
+    Returns:
+        list: The precompute_city result of each city.
+    """
+    cities = list(cities)
+    workers = min(workers or os.cpu_count() or 1, len(cities))
+    total_start = time.perf_counter()
+    results = []
+    if workers <= 1:
+        results = [precompute_city(city, k, batch_size, force) for city in cities]
+    else:
+        # Spawned workers open their own MongoDB connections instead of inheriting the parent's
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            futures = [pool.submit(precompute_city, city, k, batch_size, force) for city in cities]
+            for future in as_completed(futures):
+                results.append(future.result())
+
+    total_users = sum(result['users'] for result in results)
+    elapsed = time.perf_counter() - total_start
+    for result in results:
+        print(f"{result['city']}: {result['users']} stale users, {result['updated']} updated, "
+              f"{result['skipped']} skipped in {result['seconds']:.2f}s")
+    print(f"Total: {total_users} users in {elapsed:.2f}s ({total_users / elapsed if elapsed else 0.0:.0f} users/s)")
+    return results
+
+@click.command('precompute')
+@click.option('--city', 'cities', multiple=True, help='City to recompute (repeatable). Defaults to all cities.')
+@click.option('--workers', type=int, default=None, help='Worker processes. Defaults to the CPU count.')
+@click.option('--k', default=4, show_default=True, help='Restaurants per user.')
+@click.option('--batch-size', default=500, show_default=True, help='Users per bulk write.')
+@click.option('--force', is_flag=True, help='Recompute every user, not only stale ones.')
+def precompute_command(cities, workers, k, batch_size, force):
+    """Recompute the users' precomputed recommendations."""
+    names = [city_config.normalize(city) for city in cities]
+    if None in names:
+        raise click.BadParameter(f"Unknown city: {cities[names.index(None)]}", param_hint="'--city'")
+    precompute_all(
+        cities=names or CITIES,
+        workers=workers,
+        k=k,
+        batch_size=batch_size,
+        force=force,
+    )
+
+if __name__ == '__main__':
+    precompute_command()
@@ -0,0 +1,105 @@
+import numpy as np
+from config.features import FIELD_MAPPING
+
+"""
+Bitmask preference filter engine.
+
+Packs the restaurant flag fields referenced by FIELD_MAPPING (cuisines, dietary options
+and WiFi) into one uint32 bitmask per restaurant, so preference filtering over a whole
+city is a couple of vectorized bitwise operations instead of per-document dict scans.
+
+Usage:
+Build masks with pack_flags when loading a city, then call match_rows with the bits
+returned by preference_bits for a user's preferences.
+"""
+
+# One bit per flag field, in FIELD_MAPPING order
+FLAG_FIELDS = list(dict.fromkeys(FIELD_MAPPING.values()))
+FLAG_BITS = {field: 1 << bit for bit, field in enumerate(FLAG_FIELDS)}
+
+def _as_list(value):
+    """
+    Normalize a preference value that may be stored as a single label, a list, or empty.
+
+    Args:
+        value (Any): The stored preference value.
+
+    Returns:
+        list: The preference labels.
+    """
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return list(value)
+
+def pack_flags(restaurant):
+    """
+    Pack a restaurant's flag fields into a single integer bitmask.
+
+    Args:
+        restaurant (dict): Restaurant document.
+
+    Returns:
+        int: Bitmask with a bit set for every flag field equal to 1.
+    """
+    mask = 0
+    for field, bit in FLAG_BITS.items():
+        try:
+            if float(restaurant.get(field, 0)) == 1:
+                mask |= bit
+        except (TypeError, ValueError):
+            pass
+    return mask
+
+def preference_fields(user_preferences):
+    """
+    Map a user's preferences to restaurant flag fields.
+
+    Args:
+        user_preferences (dict): User preferences document.
+
+    Returns:
+        tuple: (cuisine_fields, required_fields) where at least one cuisine field must be set
+        and every required (dietary and WiFi) field must be set.
+    """
+    cuisine_fields = {FIELD_MAPPING[c] for c in _as_list(user_preferences.get('cuisine_preferences')) if c in FIELD_MAPPING}
+    required_fields = {FIELD_MAPPING[d] for d in _as_list(user_preferences.get('dietary_preferences')) if d in FIELD_MAPPING}
+    required_fields |= {FIELD_MAPPING[w] for w in _as_list(user_preferences.get('wifi')) if w in FIELD_MAPPING}
+    return cuisine_fields, required_fields
+
+def preference_bits(user_preferences):
+    """
+    Convert a user's preferences into bitmasks for match_rows.
+
+    Args:
+        user_preferences (dict): User preferences document.
+
+    Returns:
+        tuple: (cuisine_bits, required_bits) as integers.
+    """
+    cuisine_fields, required_fields = preference_fields(user_preferences)
+    cuisine_bits = 0
+    for field in cuisine_fields:
+        cuisine_bits |= FLAG_BITS[field]
+    required_bits = 0
+    for field in required_fields:
+        required_bits |= FLAG_BITS[field]
+    return cuisine_bits, required_bits
+
+def match_rows(masks, cuisine_bits, required_bits):
+    """
+    Return the rows whose flags match at least one cuisine and all required flags.
+
+    Args:
+        masks (np.ndarray): uint32 bitmask per restaurant.
+        cuisine_bits (int): Bits of the acceptable cuisines.
+        required_bits (int): Bits that must all be set.
+
+    Returns:
+        np.ndarray: Matching row indices, in ascending order.
+    """
+    cuisine_bits = np.uint32(cuisine_bits)
+    required_bits = np.uint32(required_bits)
+    matches = ((masks & cuisine_bits) != 0) & ((masks & required_bits) == required_bits)
+    return np.flatnonzero(matches)
@@ -0,0 +1,82 @@
+import numpy as np
+from config.features import binary_float_columns
+from utils.feature_store import to_float
+
+"""
+User-profile vectors over the shared restaurant feature schema.
+
+A profile stores the running per-feature `sums` of its selected restaurants and their
+`count`, over the columns of binary_float_columns, so adding and removing selections is a
+single update of O(features) values. The averages are derived on read; since the
+recommendations use cosine similarity, the sums could be used as they are.
+
+Usage:
+Call profile_sums(restaurants) to rebuild a profile, selection_deltas(added, removed) for an
+incremental update, and profile_averages(profile) to read one.
+"""
+
+PROFILE_COLUMNS = binary_float_columns
+
+def restaurant_vectors(restaurants, columns=PROFILE_COLUMNS):
+    """
+    Stack the feature values of several restaurants into a matrix.
+
+    Args:
+        restaurants (list): Restaurant documents.
+        columns (list): Feature column names.
+
+    Returns:
+        np.ndarray: float64 array of shape (len(restaurants), len(columns)); missing and NaN values are 0.
+    """
+    return np.array(
+        [[to_float(restaurant.get(col, 0)) for col in columns] for restaurant in restaurants],
+        dtype=np.float64
+    ).reshape(len(restaurants), len(columns))
+
+def profile_sums(restaurants, columns=PROFILE_COLUMNS):
+    """
+    Compute the per-feature sums and count of a full selection in one vectorized pass.
+
+    Args:
+        restaurants (list): The selected restaurant documents.
+        columns (list): Feature column names.
+
+    Returns:
+        tuple: (sums, count) with sums as a dict of column to float.
+    """
+    sums = restaurant_vectors(restaurants, columns).sum(axis=0)
+    return dict(zip(columns, sums.tolist())), len(restaurants)
+
+def selection_deltas(added, removed, columns=PROFILE_COLUMNS):
+    """
+    Compute the change of a profile's sums and count when restaurants are added and removed.
+
+    Args:
+        added (list): The added restaurant documents.
+        removed (list): The removed restaurant documents.
+        columns (list): Feature column names.
+
+    Returns:
+        tuple: (sum deltas, count delta) with the sum deltas as a dict of column to float.
+    """
+    deltas = restaurant_vectors(added, columns).sum(axis=0) - restaurant_vectors(removed, columns).sum(axis=0)
+    return dict(zip(columns, deltas.tolist())), len(added) - len(removed)
+
+def profile_averages(profile, columns=PROFILE_COLUMNS):
+    """
+    Return the per-feature averages of a profile.
+
+    Args:
+        profile (dict): The user profile, with `sums` and `count` or, for profiles created
+            before running sums were stored, `averages`.
+        columns (list): Feature column names.
+
+    Returns:
+        dict or None: Column to average (all 0.0 for an empty selection), or None if the
+        profile has neither sums nor averages.
+    """
+    if "sums" in profile:
+        count = profile.get("count") or 0
+        sums = profile["sums"]
+        return {col: (to_float(sums.get(col, 0)) / count if count > 0 else 0.0) for col in columns}
+    return profile.get("averages")
@@ -0,0 +1,84 @@
+import hashlib
+from jinja2 import TemplateNotFound
+
+"""
+Conditional rendering of the server-rendered restaurant pages.
+
+Pages get an ETag over everything they are rendered from: the user, the city's data
+versions and the page template source (not the templates it includes or extends). The
+ETag is built from these cheap inputs and compared with If-None-Match before the page's
+restaurants are selected or rendered (see utils.http_cache.not_modified), so repeat visits
+get a 304 without any of that work.
+
+Usage:
+    etag = page_etag(template_version(env, page), user_id, versions, bson.encode(preferences))
+    matched = not_modified(request, etag)
+    if matched is not None:
+        return page_response(app.response_class(status=304), matched)
+"""
+
+# Pages depend on the user, so browsers keep them but revalidate them on every visit
+PAGE_CACHE_CONTROL = 'private, no-cache'
+
+# (environment, template names) -> (version, uptodate callables)
+_template_versions = {}
+
+def template_version(env, *names):
+    """
+    Return a digest of the source of templates, recomputed when a template changes.
+
+    Args:
+        env (Environment): The app's Jinja environment.
+        *names (str): Template names. Missing templates are part of the digest as missing.
+
+    Returns:
+        str: The digest.
+    """
+    key = (id(env), names)
+    cached = _template_versions.get(key)
+    if cached is not None and all(uptodate() for uptodate in cached[1]):
+        return cached[0]
+    digest = hashlib.blake2b(digest_size=8)
+    uptodates = []
+    for name in names:
+        try:
+            source, _, uptodate = env.loader.get_source(env, name)
+        except TemplateNotFound:
+            source, uptodate = '', None
+        digest.update(f"{name}\0{source}\0".encode())
+        if uptodate is not None:
+            uptodates.append(uptodate)
+    version = digest.hexdigest()
+    _template_versions[key] = (version, uptodates)
+    return version
+
+def page_etag(*parts):
+    """
+    Build a page's ETag from everything it is rendered from.
+
+    Args:
+        *parts: Strings, bytes (e.g. a BSON-encoded document) or values with a stable repr.
+
+    Returns:
+        str: The ETag value, without quotes.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else repr(part).encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+def page_response(response, etag):
+    """
+    Set a page response's ETag and revalidation policy.
+
+    Args:
+        response (Response): The rendered page, or an empty 304 response.
+        etag (str): The page's ETag (see page_etag).
+
+    Returns:
+        Response: The response.
+    """
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = PAGE_CACHE_CONTROL
+    return response
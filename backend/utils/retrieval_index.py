@@ -0,0 +1,308 @@
+import os
+import numpy as np
+
+"""
+Pluggable top-k retrieval indexes over a city's normalized feature matrix.
+
+Every backend answers the same queries: the k rows with the highest cosine similarity to a
+unit-length user vector, optionally restricted to candidate rows (the preference filter).
+
+- ExactIndex: brute-force matrix-vector product over the candidates (the reference).
+- LSHIndex: random-hyperplane locality-sensitive hashing; rows sharing a hash bucket with
+  the query in any table (probing neighbouring buckets too) are scored exactly.
+- IVFIndex: inverted file over spherical k-means centroids; the rows of the `n_probe`
+  closest centroids are scored exactly.
+
+Approximate backends apply the preference filter either before scoring (`pre`: candidates
+are intersected with the allowed rows) or after it (`post`: an over-fetched unfiltered
+top-k is filtered), and fall back to the exact path when fewer than k rows survive, so a
+query always returns min(k, len(rows)) rows.
+
+Usage:
+Pick a backend per city with the RETRIEVAL_INDEX (default) and RETRIEVAL_INDEX_<CITY>
+environment variables ('exact', 'lsh' or 'ivf'), or call build_index(kind, matrix).
+Compare backends with `python -m benchmarks.bench_retrieval`.
+"""
+
+def rank_rows(rows, scores, k):
+    """
+    Select the k highest-scoring rows, sorted by score, then by row so ties keep the collection order.
+
+    Args:
+        rows (np.ndarray): Candidate row indices.
+        scores (np.ndarray): Score of each candidate.
+        k (int): Number of rows to return.
+
+    Returns:
+        tuple: (rows, scores) of the top k, sorted by descending score.
+    """
+    if k <= 0 or len(rows) == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+    if k < len(rows):
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(len(rows))
+    order = np.lexsort((rows[top], -scores[top]))
+    top = top[order]
+    return rows[top], scores[top]
+
+class ExactIndex:
+    """
+    Brute-force cosine similarity over all candidate rows.
+    """
+    kind = 'exact'
+
+    # Queries scored per matrix multiply by search_many, which bounds the score matrix to
+    # rows x QUERY_CHUNK_SIZE floats however many queries a batch holds
+    QUERY_CHUNK_SIZE = 64
+
+    def __init__(self, matrix):
+        """
+        Args:
+            matrix (np.ndarray): Row-normalized float32 feature matrix.
+        """
+        self.matrix = matrix
+
+    def _all_rows(self):
+        return np.arange(self.matrix.shape[0], dtype=np.intp)
+
+    def search(self, vector, k, rows=None):
+        """
+        Return the k rows most similar to a query vector.
+
+        Args:
+            vector (np.ndarray): Unit-length float32 query vector.
+            k (int): Number of rows to return.
+            rows (np.ndarray, optional): Candidate rows. Defaults to all rows.
+
+        Returns:
+            tuple: (rows, scores) sorted by descending similarity.
+        """
+        if rows is None:
+            rows = self._all_rows()
+        if k <= 0 or len(rows) == 0:
+            return rank_rows(rows, None, 0)
+        return rank_rows(rows, self.matrix[rows] @ vector, k)
+
+    def search_many(self, vectors, k, rows_list):
+        """
+        Answer several queries, scoring them with one matrix multiply per QUERY_CHUNK_SIZE queries.
+
+        Args:
+            vectors (np.ndarray): Query vectors, one per row.
+            k (int): Number of rows to return per query.
+            rows_list (list): Candidate rows of each query (None for all rows).
+
+        Returns:
+            list: One (rows, scores) tuple per query.
+        """
+        if len(vectors) == 0:
+            return []
+        vectors = np.asarray(vectors, dtype=np.float32)
+        results = []
+        for start in range(0, len(vectors), self.QUERY_CHUNK_SIZE):
+            scores = self.matrix @ vectors[start:start + self.QUERY_CHUNK_SIZE].T
+            for query, rows in enumerate(rows_list[start:start + self.QUERY_CHUNK_SIZE]):
+                if rows is None:
+                    rows = self._all_rows()
+                results.append(rank_rows(rows, scores[rows, query], k) if len(rows) else rank_rows(rows, None, 0))
+        return results
+
+class _ApproximateIndex(ExactIndex):
+    """
+    Base class of the approximate backends: candidate generation plus exact re-scoring.
+    """
+    def __init__(self, matrix, filter_mode='pre', overfetch=4):
+        """
+        Args:
+            matrix (np.ndarray): Row-normalized float32 feature matrix.
+            filter_mode (str): 'pre' to restrict the candidates to the allowed rows before
+                scoring, 'post' to filter an over-fetched unfiltered result.
+            overfetch (int): Result multiple fetched before post-filtering.
+        """
+        super().__init__(matrix)
+        if filter_mode not in ('pre', 'post'):
+            raise ValueError(f"Unknown filter mode: {filter_mode}")
+        self.filter_mode = filter_mode
+        self.overfetch = overfetch
+
+    def candidates(self, vector):
+        """
+        Return the candidate rows for a query vector. Implemented by the backends.
+        """
+        raise NotImplementedError
+
+    def search(self, vector, k, rows=None):
+        if k <= 0 or (rows is not None and len(rows) == 0):
+            return rank_rows(np.empty(0, dtype=np.intp), None, 0)
+        candidates = self.candidates(vector)
+        if rows is None:
+            found_rows, found_scores = rank_rows(candidates, self.matrix[candidates] @ vector, k)
+            required = min(k, self.matrix.shape[0])
+        elif self.filter_mode == 'pre':
+            candidates = candidates[np.isin(candidates, rows, assume_unique=True)]
+            found_rows, found_scores = rank_rows(candidates, self.matrix[candidates] @ vector, k)
+            required = min(k, len(rows))
+        else:
+            found_rows, found_scores = rank_rows(candidates, self.matrix[candidates] @ vector, k * self.overfetch)
+            keep = np.isin(found_rows, rows)
+            found_rows, found_scores = found_rows[keep][:k], found_scores[keep][:k]
+            required = min(k, len(rows))
+
+        if len(found_rows) < required:
+            # Too few candidates survived: answer exactly rather than return a short list
+            return super().search(vector, k, rows)
+        return found_rows, found_scores
+
+    def search_many(self, vectors, k, rows_list):
+        return [self.search(vector, k, rows) for vector, rows in zip(np.asarray(vectors, dtype=np.float32), rows_list)]
+
+class LSHIndex(_ApproximateIndex):
+    """
+    Random-hyperplane LSH: each table hashes a vector to the sign pattern of `n_bits` projections.
+    """
+    kind = 'lsh'
+
+    def __init__(self, matrix, n_bits=10, n_tables=8, n_probes=2, seed=0, filter_mode='pre', overfetch=4):
+        """
+        Args:
+            matrix (np.ndarray): Row-normalized float32 feature matrix.
+            n_bits (int): Hyperplanes (hash bits) per table.
+            n_tables (int): Number of hash tables.
+            n_probes (int): Neighbouring buckets probed per table, obtained by flipping the
+                bits of the hyperplanes closest to the query one at a time.
+            seed (int): Seed of the random hyperplanes.
+            filter_mode (str): 'pre' or 'post' preference filtering.
+            overfetch (int): Result multiple fetched before post-filtering.
+        """
+        super().__init__(matrix, filter_mode, overfetch)
+        self.n_probes = min(n_probes, n_bits)
+        rng = np.random.default_rng(seed)
+        # All tables' hyperplanes side by side, so one product hashes a vector for every table
+        self.planes = rng.standard_normal((matrix.shape[1], n_tables * n_bits)).astype(np.float32)
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.weights = (1 << np.arange(n_bits)).astype(np.int64)
+        # The features are non-negative, so hyperplanes through the origin barely separate
+        # them; hashing the mean-centered vectors spreads the rows over the buckets
+        self.center = matrix.mean(axis=0) if matrix.shape[0] else np.zeros(matrix.shape[1], np.float32)
+        projections = (matrix - self.center) @ self.planes
+        codes = ((projections > 0).reshape(-1, n_tables, n_bits).astype(np.int64) @ self.weights).T
+        self.tables = []
+        for table_codes in codes:
+            order = np.argsort(table_codes, kind='stable')
+            sorted_codes = table_codes[order]
+            starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+            ends = np.r_[starts[1:], len(sorted_codes)]
+            self.tables.append({
+                int(sorted_codes[start]): order[start:end].astype(np.intp)
+                for start, end in zip(starts, ends)
+            })
+
+    def candidates(self, vector):
+        projections = ((vector - self.center) @ self.planes).reshape(self.n_tables, self.n_bits)
+        codes = (projections > 0).astype(np.int64) @ self.weights
+        closest_bits = np.argsort(np.abs(projections), axis=1)[:, :self.n_probes]
+        hit = np.zeros(self.matrix.shape[0], dtype=bool)
+        for table, code, bits in zip(self.tables, codes.tolist(), closest_bits.tolist()):
+            for probe in [code] + [code ^ (1 << bit) for bit in bits]:
+                rows = table.get(probe)
+                if rows is not None:
+                    hit[rows] = True
+        return np.flatnonzero(hit)
+
+class IVFIndex(_ApproximateIndex):
+    """
+    Inverted file index: rows are assigned to their closest spherical k-means centroid.
+    """
+    kind = 'ivf'
+
+    def __init__(self, matrix, n_lists=None, n_probe=8, iterations=10, train_size=64, seed=0, filter_mode='pre', overfetch=4):
+        """
+        Args:
+            matrix (np.ndarray): Row-normalized float32 feature matrix.
+            n_lists (int, optional): Number of centroids. Defaults to about sqrt(rows).
+            n_probe (int): Number of closest centroids whose rows are scored per query.
+            iterations (int): k-means iterations.
+            train_size (int): k-means is trained on a sample of this many rows per centroid.
+            seed (int): Seed of the sample and centroid initialization.
+            filter_mode (str): 'pre' or 'post' preference filtering.
+            overfetch (int): Result multiple fetched before post-filtering.
+        """
+        super().__init__(matrix, filter_mode, overfetch)
+        n_rows = matrix.shape[0]
+        n_lists = max(1, min(n_lists or int(np.sqrt(n_rows)), n_rows))
+        self.n_probe = min(n_probe, n_lists)
+        rng = np.random.default_rng(seed)
+        sample = matrix
+        if n_rows > n_lists * train_size:
+            sample = matrix[np.sort(rng.choice(n_rows, n_lists * train_size, replace=False))]
+        if n_rows:
+            centroids = sample[rng.choice(sample.shape[0], n_lists, replace=False)].copy()
+        else:
+            centroids = np.zeros((1, matrix.shape[1]), np.float32)
+        for _ in range(iterations):
+            centroids = self._update_centroids(sample, centroids)
+        self.centroids = centroids
+
+        assignment = np.argmax(matrix @ centroids.T, axis=1) if n_rows else np.zeros(0, dtype=np.intp)
+        order = np.argsort(assignment, kind='stable')
+        bounds = np.searchsorted(assignment[order], np.arange(len(centroids) + 1))
+        self.lists = [order[bounds[i]:bounds[i + 1]].astype(np.intp) for i in range(len(centroids))]
+
+    @staticmethod
+    def _update_centroids(sample, centroids):
+        """
+        Run one spherical k-means step: assign rows to centroids and re-normalize the member sums.
+        """
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind='stable')
+        members = np.bincount(assignment, minlength=len(centroids))
+        sums = centroids.copy()
+        nonempty = np.flatnonzero(members)
+        # Sum the rows of each non-empty list; a list that lost all its rows keeps its centroid
+        sums[nonempty] = np.add.reduceat(sample[order], np.cumsum(members)[nonempty] - members[nonempty], axis=0)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (sums / norms).astype(np.float32)
+
+    def candidates(self, vector):
+        closest = np.argsort(-(self.centroids @ vector))[:self.n_probe]
+        return np.sort(np.concatenate([self.lists[i] for i in closest]))
+
+INDEX_BACKENDS = {
+    'exact': ExactIndex,
+    'lsh': LSHIndex,
+    'ivf': IVFIndex,
+}
+
+def build_index(kind, matrix, **params):
+    """
+    Build a retrieval index of the given kind over a feature matrix.
+
+    Args:
+        kind (str): 'exact', 'lsh' or 'ivf'.
+        matrix (np.ndarray): Row-normalized float32 feature matrix.
+        **params: Backend parameters.
+
+    Returns:
+        ExactIndex: The index.
+
+    Raises:
+        ValueError: If the kind is unknown.
+    """
+    if kind not in INDEX_BACKENDS:
+        raise ValueError(f"Unknown retrieval index: {kind}")
+    return INDEX_BACKENDS[kind](matrix, **params)
+
+def index_kind(city):
+    """
+    Return the configured retrieval index kind of a city.
+
+    Args:
+        city (str): City name.
+
+    Returns:
+        str: RETRIEVAL_INDEX_<CITY> if set, else RETRIEVAL_INDEX, else 'exact'.
+    """
+    return os.getenv(f"RETRIEVAL_INDEX_{city.upper()}", os.getenv("RETRIEVAL_INDEX", "exact")).lower()
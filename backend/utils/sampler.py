@@ -0,0 +1,48 @@
+import os
+import numpy as np
+
+"""
+Samplers for the exploration slots of the test page (one random and one 5-star restaurant).
+
+Samples a single row from the in-memory feature store arrays (all rows, or the cached rows of
+one rating bucket) with NumPy, so only the chosen document is fetched from MongoDB instead of
+the whole city.
+
+Usage:
+Call sample_row(store, exclude_rows, rating=5) and fetch the document of the returned row.
+"""
+
+TOP_RATING = 5
+
+_rng = np.random.default_rng()
+
+def _reseed_after_fork():
+    # A forked worker would otherwise draw the same sequence as its parent and siblings
+    global _rng
+    _rng = np.random.default_rng()
+
+os.register_at_fork(after_in_child=_reseed_after_fork)
+
+def sample_row(store, exclude_rows=(), rating=None, rng=None):
+    """
+    Pick a random row of a feature store, optionally restricted to one general rating.
+
+    Args:
+        store (CityFeatureStore): The city's feature store.
+        exclude_rows (Iterable[int]): Rows that must not be picked.
+        rating (float, optional): Only pick restaurants with this general_rating.
+        rng (np.random.Generator, optional): Random generator. Defaults to a module-level one.
+
+    Returns:
+        int or None: The chosen row, or None if no row qualifies.
+    """
+    if rating is None:
+        candidates = np.arange(len(store), dtype=np.intp)
+    else:
+        candidates = store.rows_with_rating(rating)
+    exclude_rows = np.asarray(list(exclude_rows), dtype=np.intp)
+    if exclude_rows.size:
+        candidates = candidates[~np.isin(candidates, exclude_rows)]
+    if not candidates.size:
+        return None
+    return int(candidates[(rng or _rng).integers(candidates.size)])
@@ -0,0 +1,189 @@
+import os
+import re
+import unicodedata
+from bisect import bisect_left
+import numpy as np
+from utils.feature_store import to_float
+
+"""
+In-memory prefix index over restaurant names, for search-as-you-type.
+
+Names are normalized (accent-folded and case-folded) and split into word tokens. Each
+city's index keeps two sorted arrays, one of the name tokens and one of the whole names
+with punctuation and spaces removed, so a prefix lookup is two binary searches returning a
+contiguous slice of row numbers. A query matches a restaurant when every query token is a
+prefix of one of the name's tokens, or when the whole query is a prefix of the whole name
+(so "laub" finds "L'Aubergeade"). Matches are ranked whole-name prefixes first, then by
+number of reviews and by name length.
+
+Usage:
+    index = NameSearchIndex.from_collection(city, collection)
+    ids = index.search("trat", limit=10)
+"""
+
+_TOKEN_PATTERN = re.compile(r"[^\W_]+")
+# Sorts after every character, so `prefix + _PREFIX_END` bounds the keys starting with prefix
+_PREFIX_END = "\U0010ffff"
+
+def search_backend():
+    """
+    Return the configured restaurant search backend.
+
+    Returns:
+        str: SEARCH_BACKEND if set ('memory' or 'text'), else 'memory'.
+    """
+    return os.getenv("SEARCH_BACKEND", "memory").lower()
+
+def text_query(query, projection=None):
+    """
+    Build the MongoDB query of a `text` backend search.
+
+    Args:
+        query (str): The text typed by the user.
+        projection (dict, optional): Projection limiting the returned fields.
+
+    Returns:
+        tuple: (filter, projection, sort), with the text score added to the projection.
+    """
+    projection = dict(projection or {})
+    projection["score"] = {"$meta": "textScore"}
+    return {"$text": {"$search": query}}, projection, [("score", {"$meta": "textScore"})]
+
+def normalize(text):
+    """
+    Accent-fold and case-fold a string.
+
+    Args:
+        text (str): The string to normalize.
+
+    Returns:
+        str: The normalized string, e.g. "Sacrée Fleur" -> "sacree fleur".
+    """
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+def tokenize(text):
+    """
+    Split a string into normalized word tokens.
+
+    Args:
+        text (str): The string to split.
+
+    Returns:
+        list: The tokens, e.g. "L'Osteria di Monti" -> ["l", "osteria", "di", "monti"].
+    """
+    return _TOKEN_PATTERN.findall(normalize(text or ""))
+
+class NameSearchIndex:
+    """
+    Sorted-array prefix index over the restaurant names of one city.
+    """
+    def __init__(self, city, ids, names, popularity):
+        self.city = city
+        self.ids = list(ids)
+        self.version = None
+        self.name_lengths = np.array([len(name) for name in names], dtype=np.int32)
+        self.popularity = np.asarray(popularity, dtype=np.float64)
+
+        token_entries, name_entries = [], []
+        for row, name in enumerate(names):
+            tokens = tokenize(name)
+            token_entries.extend((token, row) for token in set(tokens))
+            if tokens:
+                name_entries.append(("".join(tokens), row))
+        self.token_keys, self.token_rows = self._sorted_arrays(token_entries)
+        self.name_keys, self.name_rows = self._sorted_arrays(name_entries)
+
+    @staticmethod
+    def _sorted_arrays(entries):
+        entries.sort()
+        keys = [key for key, _ in entries]
+        rows = np.fromiter((row for _, row in entries), dtype=np.int32, count=len(entries))
+        return keys, rows
+
+    @classmethod
+    def from_documents(cls, city, documents):
+        """
+        Build an index from restaurant documents.
+
+        Args:
+            city (str): City name.
+            documents (Iterable[dict]): Documents with `_id`, `restaurant_name` and `num_reviews`.
+
+        Returns:
+            NameSearchIndex: The index.
+        """
+        ids, names, popularity = [], [], []
+        for document in documents:
+            ids.append(str(document["_id"]))
+            names.append(document.get("restaurant_name") or "")
+            popularity.append(to_float(document.get("num_reviews", 0)))
+        return cls(city, ids, names, popularity)
+
+    @classmethod
+    def from_collection(cls, city, collection):
+        """
+        Build an index from a city's restaurant collection.
+
+        Args:
+            city (str): City name.
+            collection (Collection): The city's restaurant collection.
+
+        Returns:
+            NameSearchIndex: The index.
+        """
+        cursor = collection.find({}, {"restaurant_name": 1, "num_reviews": 1})
+        return cls.from_documents(city, cursor)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def _prefix_rows(keys, rows, prefix):
+        start = bisect_left(keys, prefix)
+        stop = bisect_left(keys, prefix + _PREFIX_END, start)
+        return rows[start:stop]
+
+    def search_rows(self, query, limit=10):
+        """
+        Return the rows of the best-ranked restaurants matching a query.
+
+        Args:
+            query (str): The text typed by the user.
+            limit (int): Maximum number of rows.
+
+        Returns:
+            np.ndarray: Row indices in ranking order.
+        """
+        tokens = tokenize(query)
+        if not tokens or limit <= 0:
+            return np.empty(0, dtype=np.int32)
+
+        name_matches = np.unique(self._prefix_rows(self.name_keys, self.name_rows, "".join(tokens)))
+        # Longest token first, since it usually matches the fewest rows
+        token_matches = None
+        for token in sorted(tokens, key=len, reverse=True):
+            rows = self._prefix_rows(self.token_keys, self.token_rows, token)
+            token_matches = np.unique(rows) if token_matches is None else np.intersect1d(token_matches, rows)
+            if not token_matches.size:
+                break
+
+        rows = np.union1d(name_matches, token_matches)
+        if not rows.size:
+            return rows
+        whole_name = np.isin(rows, name_matches, assume_unique=True)
+        order = np.lexsort((self.name_lengths[rows], -self.popularity[rows], ~whole_name))
+        return rows[order[:limit]]
+
+    def search(self, query, limit=10):
+        """
+        Return the IDs of the best-ranked restaurants matching a query.
+
+        Args:
+            query (str): The text typed by the user.
+            limit (int): Maximum number of IDs.
+
+        Returns:
+            list: Restaurant ID strings in ranking order.
+        """
+        return [self.ids[row] for row in self.search_rows(query, limit)]
@@ -0,0 +1,138 @@
+import json
+import os
+import shutil
+import tempfile
+import click
+import numpy as np
+
+"""
+Columnar on-disk snapshots of the per-city feature stores.
+
+Each city's numeric columns (normalized feature matrix, preference-flag bitmasks,
+general_rating and positive_count) and restaurant ids are written as `.npy` files in a
+directory keyed by the city's data version. Workers memory-map these files at startup,
+so they skip the MongoDB scan and, with several gunicorn workers, share the same pages
+instead of holding N copies of the arrays.
+
+Layout:
+    <SNAPSHOT_DIR>/<city>/v<version>/{ids,features,masks,general_rating,positive_count}.npy
+    <SNAPSHOT_DIR>/<city>/v<version>/meta.json
+
+Usage:
+Call write_snapshot(store, version) after building a store and read_snapshot(city, version)
+at startup; a missing or older-version snapshot returns None. To build the snapshots before
+starting the workers:
+    flask snapshot [--city Rome]
+"""
+
+SNAPSHOT_DIR = os.getenv(
+    'SNAPSHOT_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'snapshots')
+)
+ARRAYS = ('ids', 'features', 'masks', 'general_rating', 'positive_count')
+
+def snapshot_path(city, version, snapshot_dir=None):
+    """
+    Return the directory of a city's snapshot for a data version.
+
+    Args:
+        city (str): City name.
+        version (int): Data version.
+        snapshot_dir (str, optional): Root directory. Defaults to SNAPSHOT_DIR.
+
+    Returns:
+        str: The snapshot directory path.
+    """
+    return os.path.join(snapshot_dir or SNAPSHOT_DIR, city.lower(), f"v{version}")
+
+def write_snapshot(store, version, snapshot_dir=None):
+    """
+    Write a feature store's arrays to disk for a data version, replacing older versions.
+
+    The files are written to a temporary directory and renamed into place, so readers
+    never see a partial snapshot.
+
+    Args:
+        store (CityFeatureStore): The store to export.
+        version (int): The data version the store was built from.
+        snapshot_dir (str, optional): Root directory. Defaults to SNAPSHOT_DIR.
+
+    Returns:
+        str: The snapshot directory path.
+    """
+    target = snapshot_path(store.city, version, snapshot_dir)
+    city_dir = os.path.dirname(target)
+    os.makedirs(city_dir, exist_ok=True)
+
+    staging = tempfile.mkdtemp(prefix=".staging-", dir=city_dir)
+    arrays = {
+        'ids': np.array(store.ids, dtype='S24'),
+        'features': store.matrix,
+        'masks': store.masks,
+        'general_rating': store.general_ratings,
+        'positive_count': store.positive_counts,
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(staging, f"{name}.npy"), np.ascontiguousarray(array))
+    with open(os.path.join(staging, 'meta.json'), 'w') as meta_file:
+        json.dump({'city': store.city, 'version': version, 'columns': store.columns, 'count': len(store)}, meta_file)
+
+    try:
+        os.rename(staging, target)
+    except OSError:
+        # A snapshot of this version already exists: published by another worker, or stale
+        # from a database that was reset. Replace it with the one just built.
+        shutil.rmtree(target, ignore_errors=True)
+        try:
+            os.rename(staging, target)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    # Drop snapshots of older versions; workers that mapped them keep their open mappings
+    for entry in os.listdir(city_dir):
+        path = os.path.join(city_dir, entry)
+        if entry != os.path.basename(target) and entry.startswith('v') and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+    return target
+
+def read_snapshot(city, version, columns, snapshot_dir=None):
+    """
+    Memory-map a city's snapshot arrays if a snapshot for this exact version exists.
+
+    Args:
+        city (str): City name.
+        version (int): The current data version.
+        columns (list): The expected feature columns; a snapshot with other columns is ignored.
+        snapshot_dir (str, optional): Root directory. Defaults to SNAPSHOT_DIR.
+
+    Returns:
+        dict or None: Mapping of array name to read-only memory-mapped array, or None if the
+        snapshot is missing or stale.
+    """
+    path = snapshot_path(city, version, snapshot_dir)
+    try:
+        with open(os.path.join(path, 'meta.json')) as meta_file:
+            meta = json.load(meta_file)
+        if meta.get('version') != version or meta.get('columns') != list(columns):
+            return None
+        return {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r') for name in ARRAYS}
+    except (OSError, ValueError):
+        return None
+
+@click.command('snapshot')
+@click.option('--city', 'cities', multiple=True, help='City to snapshot (repeatable). Defaults to all cities.')
+def snapshot_command(cities):
+    """Write feature snapshots for the current data version of each city."""
+    from config.cities import city_config
+    from database.connection import db_connection
+    from utils.data_version import bump_data_version, get_data_version
+    from utils.feature_store import CityFeatureStore
+
+    db = db_connection.get_db()
+    for city in cities or city_config.CITIES:
+        version = get_data_version(db, city)
+        if version is None:
+            version = bump_data_version(db, city)
+        store = CityFeatureStore.from_collection(city, db[city_config.restaurants_collection(city)])
+        path = write_snapshot(store, version)
+        print(f"{city}: {len(store)} restaurants written to {path}")
@@ -0,0 +1,122 @@
+import threading
+import time
+from collections import OrderedDict
+
+"""
+Bounded in-process LRU cache with per-entry time-to-live.
+
+Provides a thread-safe cache with hit/miss/eviction counters and explicit invalidation,
+for lookups whose data only changes when it is reloaded.
+
+Usage:
+Create a TTLCache(maxsize, ttl) and use get/set, or invalidate when the source data changes.
+"""
+
+_MISSING = object()
+
+class TTLCache:
+    """
+    Least-recently-used cache whose entries also expire after `ttl` seconds.
+    """
+    def __init__(self, maxsize=1024, ttl=3600, timer=time.monotonic):
+        """
+        Args:
+            maxsize (int): Maximum number of entries; the least recently used entry is evicted beyond it.
+            ttl (float): Seconds an entry stays valid. None disables expiry.
+            timer (callable): Clock returning seconds, injectable for tests.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key, default=None):
+        """
+        Return the cached value for a key, or `default` on a miss or expired entry.
+
+        Args:
+            key (Hashable): Cache key.
+            default (Any): Value returned on a miss.
+
+        Returns:
+            Any: The cached value or `default`.
+        """
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= self._timer():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """
+        Store a value, evicting the least recently used entries beyond `maxsize`.
+
+        Args:
+            key (Hashable): Cache key.
+            value (Any): Value to cache.
+        """
+        expires_at = self._timer() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, predicate=None):
+        """
+        Drop cached entries.
+
+        Args:
+            predicate (callable, optional): Called with each key; only entries for which it
+                returns True are dropped. Drops everything if omitted.
+
+        Returns:
+            int: Number of entries dropped.
+        """
+        with self._lock:
+            if predicate is None:
+                keys = list(self._entries)
+            else:
+                keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                del self._entries[key]
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """
+        Return the cache counters.
+
+        Returns:
+            dict: Size, limits and hit/miss/eviction/expiration/invalidation counts.
+        """
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }